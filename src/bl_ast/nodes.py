@@ -2,7 +2,8 @@
 
 
 from abc import ABC
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any
 
 from lark import Token
 from lark.ast_utils import AsList
@@ -46,6 +47,17 @@ class IfElseStmt(_Stmt):
     else_body: _Stmt
 
 
+@dataclass
+class IfChain(_Stmt):
+    """If..else if..else statements, flat to avoid nesting deeply
+
+    Runs the body of the first true condition, or else_body if none."""
+    meta: Meta
+    conditions: list['_Expr']
+    bodies: list[Body]
+    else_body: Body | None
+
+
 @dataclass
 class WhileStmt(_Stmt):
     """While (and do..while) statements"""
@@ -53,6 +65,9 @@ class WhileStmt(_Stmt):
     condition: '_Expr'
     body: Body
     eval_cond_after_body: bool = False
+    # Left to the interpreter for counting iterations and compiling the loop
+    back_edges: int = field(default=0, init=False, repr=False, compare=False)
+    compiled: Any = field(default=None, init=False, repr=False, compare=False)
 
 
 @dataclass(frozen=True)
@@ -112,14 +127,26 @@ class FunctionStmt(_Stmt):
     meta: Meta
     name: Token
     form_args: 'FormArgs'
+    return_annotation: 'Annotation | None'
     body: Body
+    # Left to the interpreter for the code shared by the functions declared
+    code: Any = field(default=None, init=False, repr=False, compare=False)
 
 
 @dataclass(frozen=True)
-class FormArgs(_AstNode, AsList):
+class FormArgs(_AstNode):
     """Formal argument list"""
     meta: Meta
     args: list[Token]
+    # Type annotation of each argument, if any
+    annotations: list['Annotation | None'] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class Annotation(_AstNode):
+    """Type annotation"""
+    meta: Meta
+    name: Token
 
 
 @dataclass(frozen=True)
@@ -153,6 +180,13 @@ class ClassEntries(_AstNode, AsList):
     entries: list[_Stmt]
 
 
+@dataclass(frozen=True)
+class FieldsStmt(_Stmt, AsList):
+    """Field declaration in a class"""
+    meta: Meta
+    names: list[Token]
+
+
 @dataclass(frozen=True)
 class IncludeStmt(_Stmt):
     """Include statement"""
@@ -184,6 +218,15 @@ class Exprs(_Expr, AsList):
 # Assignment expressions and assignment patterns
 
 
+@dataclass(frozen=True)
+class AnnotatedAssign(_Stmt):
+    """Assignment declaring the type of a local"""
+    meta: Meta
+    name: Token
+    annotation: Annotation
+    right: _Expr
+
+
 @dataclass(frozen=True)
 class Assign(_Expr):
     """Assignment"""
@@ -240,6 +283,15 @@ class LogicalOp(_Expr):
     right: _Expr
 
 
+@dataclass(frozen=True)
+class LogicalChain(_Expr):
+    """Chains of the same logical operation (e.g. a || b || c), flat to
+    avoid nesting deeply"""
+    meta: Meta
+    operands: list[_Expr]
+    op: Token
+
+
 @dataclass(frozen=True)
 class BinaryOp(_Expr):
     """Binary operations"""
@@ -249,6 +301,17 @@ class BinaryOp(_Expr):
     right: _Expr
 
 
+@dataclass(frozen=True)
+class BinaryChain(_Expr):
+    """Chains of binary operations on the left operand (e.g. a + b * c - d),
+    flat to avoid nesting deeply
+
+    Evaluated as ((operands[0] ops[0] operands[1]) ops[1] operands[2])..."""
+    meta: Meta
+    operands: list[_Expr]
+    ops: list[Token]
+
+
 @dataclass(frozen=True)
 class Prefix(_Expr):
     """Unary (prefix) operations"""
@@ -294,6 +357,16 @@ class Subscript(_Expr):
     index: _Expr
 
 
+@dataclass(frozen=True)
+class Slice(_Expr):
+    """Slice operator"""
+    meta: Meta
+    subscriptee: _Expr
+    start: _Expr | None
+    stop: _Expr | None
+    step: _Expr | None
+
+
 # Dot access
 
 
@@ -313,6 +386,11 @@ class Var(_Expr):
     """Variable reference"""
     meta: Meta
     name: Token
+    # Left to the interpreter for caching the variable it resolves to
+    cache: list[Any] = field(
+        default_factory=lambda: [None, None, None],
+        init=False, repr=False, compare=False,
+    )
 
 
 @dataclass(frozen=True)
@@ -360,6 +438,8 @@ class FunctionLiteral(_Expr):
     meta: Meta
     form_args: FormArgs
     body: Body
+    # Left to the interpreter for the code shared by the functions created
+    code: Any = field(default=None, init=False, repr=False, compare=False)
 
 
 @dataclass(frozen=True)
@@ -382,3 +462,54 @@ class Pair(_AstNode):
     meta: Meta
     key: _Expr
     value: _Expr
+
+
+# Nodes only produced by static passes, never by the parser
+
+
+@dataclass(frozen=True)
+class BuilderBegin(_Stmt):
+    """Switch string locals to implicit string builders"""
+    meta: Meta
+    names: list[str]
+
+
+@dataclass(frozen=True)
+class BuilderEnd(_Stmt):
+    """Turn implicit string builders back into strings"""
+    meta: Meta
+    names: list[str]
+
+
+@dataclass(frozen=True)
+class BuilderInplace(_Expr):
+    """`+=` on a local that may hold an implicit string builder"""
+    meta: Meta
+    inplace: Inplace
+
+
+@dataclass(frozen=True)
+class NumericExpr(_Expr):
+    """Expression proven to compute on numbers only, giving a value of
+    type type_ ("Int", "Float" or "Bool")"""
+    meta: Meta
+    expr: _Expr
+    type_: str
+
+
+@dataclass(frozen=True)
+class TypeCheck(_Expr):
+    """Expression whose value is checked against a type annotation, where
+    it couldn't be proven to be of that type"""
+    meta: Meta
+    expr: _Expr
+    annotation: Annotation
+    # What the value is, for error messages
+    what: str
+
+
+@dataclass(frozen=True)
+class Constant(_Expr):
+    """Literal whose value has been built ahead of time by the interpreter"""
+    meta: Meta
+    value: Any
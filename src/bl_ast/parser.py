@@ -4,7 +4,7 @@ import ast
 from pathlib import Path
 
 from lark import Lark, ast_utils, v_args, Token
-from lark.visitors import Transformer
+from lark.visitors import Transformer_NonRecursive
 from lark.tree import Meta
 
 from . import nodes
@@ -20,8 +20,12 @@ body_parser = Lark.open(start="body", **common_opts)
 expr_parser = Lark.open(start="expr", **common_opts)
 
 
-class Extras(Transformer):
-    """Transformer for transforming syntactic sugars and tokens"""
+class Extras(Transformer_NonRecursive):
+    """Transformer for transforming syntactic sugars and tokens
+
+    Generated code can nest very deeply, so the transformer isn't recursive,
+    and chains (of else ifs, or of operators) are flattened for the passes
+    after it, which are."""
 
     # pylint: disable=invalid-name
     # pylint: disable=missing-function-docstring
@@ -69,12 +73,73 @@ class Extras(Transformer):
         statements.append(loop)
         return nodes.Body(meta, statements)
 
+    @v_args(meta=True)
+    def if_else_chain(
+        self, meta: Meta, children: list
+    ) -> nodes.IfStmt | nodes.IfElseStmt | nodes.IfChain:
+        *branches, else_body = children
+        conditions = branches[::2]
+        bodies = branches[1::2]
+        if len(conditions) > 1:
+            return nodes.IfChain(meta, conditions, bodies, else_body)
+        if else_body is None:
+            return nodes.IfStmt(meta, conditions[0], bodies[0])
+        return nodes.IfElseStmt(meta, conditions[0], bodies[0], else_body)
+
+    @v_args(inline=True, meta=True)
+    def logical(
+        self, meta: Meta, left: nodes._Expr, op: Token, right: nodes._Expr
+    ) -> nodes.LogicalOp | nodes.LogicalChain:
+        # The operations are associative, so their left-nested chains can be
+        # flattened just like those of binary operations
+        match left:
+            case nodes.LogicalChain(operands=operands, op=op_) if op_ == op:
+                operands.append(right)
+                return nodes.LogicalChain(meta, operands, op)
+            case nodes.LogicalOp(left=first, op=op_, right=second) if (
+                op_ == op
+            ):
+                return nodes.LogicalChain(meta, [first, second, right], op)
+        return nodes.LogicalOp(meta, left, op, right)
+
+    @v_args(inline=True, meta=True)
+    def binary(
+        self, meta: Meta, left: nodes._Expr, op: Token, right: nodes._Expr
+    ) -> nodes.BinaryOp | nodes.BinaryChain:
+        # Nodes are transformed bottom up, and the chain of the left operand
+        # isn't used anywhere else, so it can be extended in place
+        match left:
+            case nodes.BinaryChain(operands=operands, ops=ops):
+                operands.append(right)
+                ops.append(op)
+                return nodes.BinaryChain(meta, operands, ops)
+            case nodes.BinaryOp(left=first, op=first_op, right=second):
+                return nodes.BinaryChain(
+                    meta, [first, second, right], [first_op, op]
+                )
+        return nodes.BinaryOp(meta, left, op, right)
+
     @v_args(inline=True, meta=True)
     def module_var_stmt(
         self, meta: Meta, name: Token, value: nodes._Expr
     ) -> nodes.Assign:
         return nodes.Assign(meta, nodes.VarPattern(meta, name), value)
 
+    @v_args(meta=True)
+    def params(
+        self, meta: Meta, params: list[tuple[Token, nodes.Annotation | None]]
+    ) -> nodes.FormArgs:
+        return nodes.FormArgs(
+            meta, [name for name, _ in params],
+            [annotation for _, annotation in params],
+        )
+
+    @v_args(inline=True)
+    def param(
+        self, name: Token, annotation: nodes.Annotation | None
+    ) -> tuple[Token, nodes.Annotation | None]:
+        return name, annotation
+
     @v_args(inline=True, meta=True)
     def short_fn_literal(
         self, meta: Meta, form_args: nodes.FormArgs, expr: nodes._Expr
@@ -82,6 +147,10 @@ class Extras(Transformer):
         body = nodes.Body(meta, [nodes.ReturnStmt(meta, expr)])
         return nodes.FunctionLiteral(meta, form_args, body)
 
+    def IN_OP(self, token: Token) -> Token:
+        # "not   in" -> "not in"
+        return token.update(value=" ".join(token.split()))
+
     def INT(self, lexeme: str) -> int:
         return int(lexeme)
 
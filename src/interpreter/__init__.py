@@ -5,3 +5,4 @@
 # flake8: noqa: F401
 from .bl_types.essentials import Result, ExpressionResult, BLError, Value, Call
 from .main import ASTInterpreter, Script
+from .profiling import Profile
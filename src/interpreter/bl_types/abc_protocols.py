@@ -17,10 +17,14 @@ if TYPE_CHECKING:
 class Result(ABC):
     """Interpreter result base class"""
 
+    __slots__ = ()
+
 
 class Exit(Result, ABC):
     """Object signaling early exit"""
 
+    __slots__ = ()
+
 
 @runtime_checkable
 class SupportsBLCall(Protocol):
@@ -0,0 +1,509 @@
+"""Binary data types
+
+Bytes values are backed by a memoryview, so slicing them and wrapping data
+coming from Python never copies. ByteBuffer is the mutable, growable
+counterpart, backed by a bytearray. Views into a ByteBuffer see its later
+writes, but once the buffer has to grow it moves to a fresh copy and
+existing views keep the old contents."""
+
+
+import re
+import struct
+from typing import TYPE_CHECKING, override
+
+from lark.tree import Meta
+
+from .essentials import (
+    ExpressionResult, Value, BLError, String, Bool, BOOLS, Null, NULL, Class,
+    PythonFunction, Instance, ObjectClass, ExceptionClass,
+    IncorrectTypeException, new_error,
+)
+from .numbers import Int, Float
+from .colls import (
+    BLList, ListIteratorClass, OutOfRangeException, py_slice,
+)
+
+if TYPE_CHECKING:
+    from ..main import ASTInterpreter
+
+
+_WHITESPACE_RUN = re.compile(rb"\S+")
+
+
+# Helpers
+
+
+def _to_buffer(value: Value) -> memoryview | bytes | None:
+    """Get a buffer out of a Bytes value or a list of integers"""
+    match value:
+        case Bytes():
+            return value.view
+        case BLList(elems=elems):
+            if not all(isinstance(e, Int) for e in elems):
+                return None
+            try:
+                return bytes(e.value for e in elems)
+            except ValueError:
+                return None
+    return None
+
+
+def _byteorder(value: Value) -> str | None:
+    match value:
+        case Null():
+            return "little"
+        case String("little" | "big" as order):
+            return order
+    return None
+
+
+def _box_unpacked(x: int | float | bytes) -> Value:
+    """Box a value produced by struct.unpack"""
+    match x:
+        case bool():
+            return BOOLS[x]
+        case int():
+            return Int(x)
+        case float():
+            return Float(x)
+    return Bytes(memoryview(x))
+
+
+def _encoding(value: Value) -> str | None:
+    match value:
+        case Null():
+            return "utf-8"
+        case String(encoding):
+            return encoding
+    return None
+
+
+def encode(
+    meta: Meta | None, interpreter: "ASTInterpreter", /,
+    string: String, encoding: Value = NULL, *_
+) -> ExpressionResult:
+    """Encode a string with an explicit encoding (UTF-8 by default)"""
+    encoding_ = _encoding(encoding)
+    if encoding_ is None:
+        return new_error(IncorrectTypeException, interpreter, meta)
+    try:
+        return Bytes(memoryview(string.value.encode(encoding_)))
+    except (LookupError, UnicodeError) as e:
+        return new_error(EncodingException, interpreter, meta, str(e))
+
+
+# Bytes
+
+
+def bytes_new(
+    args: list[Value], interpreter: "ASTInterpreter", meta: Meta | None
+) -> ExpressionResult:
+    """Create a new bytes value"""
+    match args:
+        case []:
+            return Bytes(memoryview(b""))
+        case [String() as string, *rest]:
+            return encode(meta, interpreter, string, *rest)
+        case [ByteBuffer(view=view)]:
+            return Bytes(memoryview(bytes(view)))
+        case [Bytes() as arg]:
+            return arg
+        case [BLList() as arg]:
+            data = _to_buffer(arg)
+            if data is not None:
+                return Bytes(memoryview(data))
+            return new_error(OutOfRangeException, interpreter, meta)
+    return new_error(IncorrectTypeException, interpreter, meta)
+
+
+def bytes_pack(
+    meta: Meta | None, interpreter: "ASTInterpreter", this: Instance | None,
+    /, fmt: Value, *values: Value
+) -> ExpressionResult:
+    """Pack numbers into bytes following a Python struct format"""
+    # pylint: disable=unused-argument
+    if not isinstance(fmt, String):
+        return new_error(IncorrectTypeException, interpreter, meta)
+    try:
+        return Bytes(memoryview(struct.pack(
+            fmt.value, *(getattr(v, "value", None) for v in values)
+        )))
+    except struct.error as e:
+        return new_error(IncorrectTypeException, interpreter, meta, str(e))
+
+
+BytesClass = Class(String("Bytes"), ObjectClass, {
+    "pack": PythonFunction(bytes_pack),
+    "__getitem__": PythonFunction(
+        lambda meta, intp, /, this, index, *_: this.get_item(index, intp, meta)
+    ),
+    "__add__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.add(other, intp, meta)
+    ),
+    "__eq__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.is_equal(other, intp, meta)
+    ),
+    "to_bool": PythonFunction(
+        lambda meta, intp, /, this, *_: this.to_bool(intp, meta)
+    ),
+    "dump": PythonFunction(
+        lambda meta, intp, /, this, *_: this.dump(intp, meta)
+    ),
+    "length": PythonFunction(
+        lambda meta, intp, /, this, *_: Int(len(this.view))
+    ),
+    "iter": PythonFunction(
+        lambda meta, intp, /, this, *_: ListIteratorClass.new(
+            [BLList([Int(x) for x in this.view])], intp, meta
+        )
+    ),
+    "slice": PythonFunction(
+        lambda meta, intp, /, this, start, stop=NULL, *_:
+        this.slice(meta, intp, start, stop)
+    ),
+    "find": PythonFunction(
+        lambda meta, intp, /, this, sub, start=Int(0), *_:
+        this.find(meta, intp, sub, start)
+    ),
+    "split": PythonFunction(
+        lambda meta, intp, /, this, sep=NULL, *_: this.split(meta, intp, sep)
+    ),
+    "read_int": PythonFunction(
+        lambda meta, intp, /, this, offset, size, order=NULL, signed=NULL, *_:
+        this.read_int(meta, intp, offset, size, order, signed)
+    ),
+    "unpack": PythonFunction(
+        lambda meta, intp, /, this, fmt, offset=Int(0), *_:
+        this.unpack(meta, intp, fmt, offset)
+    ),
+    "decode": PythonFunction(
+        lambda meta, intp, /, this, encoding=NULL, *_:
+        this.decode(meta, intp, encoding)
+    ),
+    "to_list": PythonFunction(
+        lambda meta, intp, /, this, *_: BLList([Int(x) for x in this.view])
+    ),
+})
+BytesClass.new = bytes_new
+
+
+class Bytes(Instance):
+    """Immutable bytes type, backed by a (possibly shared) memoryview"""
+
+    __slots__ = ("view",)
+
+    view: memoryview
+
+    def __init__(self, view: memoryview) -> None:
+        super().__init__(BytesClass)
+        self.view = view
+
+    @override
+    def get_item(
+        self, index: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        match index:
+            case Int(i):
+                try:
+                    return Int(self.view[i])
+                except IndexError:
+                    return new_error(OutOfRangeException, interpreter, meta)
+        return new_error(IncorrectTypeException, interpreter, meta)
+
+    @override
+    def add(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        if isinstance(other, Bytes):
+            return Bytes(memoryview(b"".join((self.view, other.view))))
+        return super().add(other, interpreter, meta)
+
+    @override
+    def is_equal(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> Bool | BLError:
+        if isinstance(other, Bytes):
+            return BOOLS[self.view == other.view]
+        return super().is_equal(other, interpreter, meta)
+
+    @override
+    def to_bool(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> Bool:
+        return BOOLS[bool(self.view)]
+
+    @override
+    def dump(self, interpreter: "ASTInterpreter", meta: Meta | None) -> String:
+        return String(f"<{self.class_.name.value} {bytes(self.view)!r}>")
+
+    def slice(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        start: Value, stop: Value = NULL, *_
+    ) -> ExpressionResult:
+        """Get a slice of the bytes as a view, without copying"""
+        match start, stop:
+            case Int(start_), Null():
+                return Bytes(self.view[start_:].toreadonly())
+            case Int(start_), Int(stop_):
+                return Bytes(self.view[start_:stop_].toreadonly())
+        return new_error(IncorrectTypeException, interpreter, meta)
+
+    @override
+    def get_slice(
+        self, start: Value, stop: Value, step: Value,
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult:
+        if (slice_ := py_slice(start, stop, step)) is None:
+            return new_error(IncorrectTypeException, interpreter, meta)
+        return Bytes(self.view[slice_].toreadonly())
+
+    def find(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        sub: Value, start: Value = Int(0), *_
+    ) -> ExpressionResult:
+        """Find the first occurrence of a subsequence, or -1"""
+        needle = _to_buffer(sub)
+        if needle is None or not isinstance(start, Int):
+            return new_error(IncorrectTypeException, interpreter, meta)
+        # Regular expressions can search a memoryview in place
+        match_ = re.compile(re.escape(bytes(needle))).search(
+            self.view, start.value
+        )
+        return Int(-1 if match_ is None else match_.start())
+
+    def split(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        sep: Value = NULL, *_
+    ) -> ExpressionResult:
+        """Split on a separator (or runs of whitespace if it is null) into a
+        list of views"""
+        view = self.view
+        if isinstance(sep, Null):
+            return BLList([
+                Bytes(view[m.start():m.end()].toreadonly())
+                for m in _WHITESPACE_RUN.finditer(view)
+            ])
+        needle = _to_buffer(sep)
+        if not needle:
+            return new_error(IncorrectTypeException, interpreter, meta)
+        parts = []
+        start = 0
+        for m in re.finditer(re.escape(bytes(needle)), view):
+            parts.append(Bytes(view[start:m.start()].toreadonly()))
+            start = m.end()
+        parts.append(Bytes(view[start:].toreadonly()))
+        return BLList(parts)
+
+    def read_int(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        offset: Value, size: Value, order: Value = NULL,
+        signed: Value = NULL, *_
+    ) -> ExpressionResult:
+        """Read an integer of the given size in bytes at an offset"""
+        byteorder = _byteorder(order)
+        match offset, size:
+            case Int(start), Int(n) if byteorder is not None:
+                pass
+            case _:
+                return new_error(IncorrectTypeException, interpreter, meta)
+        if not 0 <= start <= start + n <= len(self.view):
+            return new_error(OutOfRangeException, interpreter, meta)
+        return Int(int.from_bytes(
+            self.view[start:start + n], byteorder,
+            signed=isinstance(signed, Bool) and signed.value,
+        ))
+
+    def unpack(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        fmt: Value, offset: Value = Int(0), *_
+    ) -> ExpressionResult:
+        """Unpack numbers following a Python struct format at an offset"""
+        match fmt, offset:
+            case String(fmt_), Int(offset_):
+                try:
+                    return BLList([
+                        _box_unpacked(x)
+                        for x in struct.unpack_from(fmt_, self.view, offset_)
+                    ])
+                except struct.error as e:
+                    return new_error(
+                        OutOfRangeException, interpreter, meta, str(e)
+                    )
+        return new_error(IncorrectTypeException, interpreter, meta)
+
+    def decode(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        encoding: Value = NULL, *_
+    ) -> ExpressionResult:
+        """Decode to a string with an explicit encoding (UTF-8 by
+        default)"""
+        encoding_ = _encoding(encoding)
+        if encoding_ is None:
+            return new_error(IncorrectTypeException, interpreter, meta)
+        try:
+            return String(str(self.view, encoding_))
+        except (LookupError, UnicodeError) as e:
+            return new_error(EncodingException, interpreter, meta, str(e))
+
+
+# ByteBuffer
+
+
+def bytebuffer_new(
+    args: list[Value], interpreter: "ASTInterpreter", meta: Meta | None
+) -> ExpressionResult:
+    """Create a new byte buffer, either empty, zero-filled or with a copy of
+    some bytes"""
+    match args:
+        case []:
+            return ByteBuffer(bytearray())
+        case [Int(size)] if size >= 0:
+            return ByteBuffer(bytearray(size))
+        case [Bytes() | BLList() as arg]:
+            data = _to_buffer(arg)
+            if data is not None:
+                return ByteBuffer(bytearray(data))
+            return new_error(OutOfRangeException, interpreter, meta)
+    return new_error(IncorrectTypeException, interpreter, meta)
+
+
+ByteBufferClass = Class(String("ByteBuffer"), BytesClass, {
+    "__setitem__": PythonFunction(
+        lambda meta, intp, /, this, index, value, *_:
+        this.set_item(index, value, intp, meta)
+    ),
+    "append": PythonFunction(
+        lambda meta, intp, /, this, byte, *_: this.append(meta, intp, byte)
+    ),
+    "extend": PythonFunction(
+        lambda meta, intp, /, this, data, *_: this.extend(meta, intp, data)
+    ),
+    "write_int": PythonFunction(
+        lambda meta, intp, /, this, value, size, order=NULL, signed=NULL, *_:
+        this.write_int(meta, intp, value, size, order, signed)
+    ),
+    "pack": PythonFunction(
+        lambda meta, intp, /, this, fmt, *values:
+        this.pack(meta, intp, fmt, *values)
+    ),
+    "clear": PythonFunction(
+        lambda meta, intp, /, this, *_: this.clear(meta, intp)
+    ),
+    "to_bytes": PythonFunction(
+        lambda meta, intp, /, this, *_: Bytes(memoryview(bytes(this.data)))
+    ),
+})
+ByteBufferClass.new = bytebuffer_new
+
+
+class ByteBuffer(Bytes):
+    """Mutable, growable bytes type, backed by a bytearray"""
+
+    __slots__ = ("data",)
+
+    data: bytearray
+
+    def __init__(self, data: bytearray) -> None:
+        # pylint: disable=super-init-not-called, non-parent-init-called
+        # A memoryview stored on the buffer would stop it from growing
+        Instance.__init__(self, ByteBufferClass)
+        self.data = data
+
+    @property
+    def view(self) -> memoryview:  # type: ignore[override]
+        """Memoryview of the current contents"""
+        return memoryview(self.data)
+
+    def _grow(self, data: bytes | memoryview) -> None:
+        """Append raw data, moving to a fresh copy if views are exported"""
+        try:
+            self.data += data
+        except BufferError:
+            self.data = bytearray(self.data)
+            self.data += data
+
+    @override
+    def set_item(
+        self, index: Value, value: Value,
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult:
+        match index, value:
+            case Int(i), Int(byte):
+                try:
+                    self.data[i] = byte
+                except IndexError:
+                    return new_error(OutOfRangeException, interpreter, meta)
+                except ValueError:
+                    return new_error(IncorrectTypeException, interpreter, meta)
+                return value
+        return new_error(IncorrectTypeException, interpreter, meta)
+
+    def append(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        byte: Value, *_
+    ) -> ExpressionResult:
+        """Append a single byte"""
+        if isinstance(byte, Int) and 0 <= byte.value < 256:
+            self._grow(bytes((byte.value,)))
+            return NULL
+        return new_error(IncorrectTypeException, interpreter, meta)
+
+    def extend(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        data: Value, *_
+    ) -> ExpressionResult:
+        """Append bytes or a list of integers"""
+        buffer = _to_buffer(data)
+        if buffer is None:
+            return new_error(IncorrectTypeException, interpreter, meta)
+        self._grow(buffer)
+        return NULL
+
+    def write_int(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        value: Value, size: Value, order: Value = NULL,
+        signed: Value = NULL, *_
+    ) -> ExpressionResult:
+        """Append an integer of the given size in bytes"""
+        byteorder = _byteorder(order)
+        match value, size:
+            case Int(x), Int(n) if byteorder is not None:
+                pass
+            case _:
+                return new_error(IncorrectTypeException, interpreter, meta)
+        try:
+            self._grow(x.to_bytes(
+                n, byteorder, signed=isinstance(signed, Bool) and signed.value
+            ))
+        except OverflowError as e:
+            return new_error(OutOfRangeException, interpreter, meta, str(e))
+        return NULL
+
+    def pack(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        fmt: Value, *values: Value
+    ) -> ExpressionResult:
+        """Append numbers packed following a Python struct format"""
+        match res := bytes_pack(meta, interpreter, None, fmt, *values):
+            case Bytes(view=view):
+                self._grow(view)
+                return NULL
+        return res
+
+    def clear(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
+    ) -> Null:
+        """Remove all bytes"""
+        # pylint: disable=unused-argument
+        try:
+            self.data.clear()
+        except BufferError:
+            self.data = bytearray()
+        return NULL
+
+
+# Binary data errors
+EncodingException = Class(String("EncodingException"), ExceptionClass)
@@ -1,28 +1,203 @@
 """Collection types"""
 
 
+import bisect
+from collections import deque
+from collections.abc import Callable, Hashable, Iterator, Sequence
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, override, cast
-from operator import methodcaller
+from itertools import islice
+from typing import TYPE_CHECKING, Literal, override, cast
+from operator import methodcaller, itemgetter
 
 from lark.tree import Meta
 
 from .essentials import (
     ExpressionResult, Value, BLError, String, Bool, BOOLS, Null, NULL, Class,
     PythonFunction, Instance, cast_to_instance, ObjectClass, ExceptionClass,
-    IncorrectTypeException,
+    IncorrectTypeException, HashKey, HashKeyError, new_error,
 )
-from .numbers import Int
-from .iterator import Item
+from .numbers import Int, Float
+from .iterator import Item, PythonIterator
 from .abc_protocols import SupportsBLCall
 
 if TYPE_CHECKING:
     from ..main import ASTInterpreter
 
 
+def py_slice(start: Value, stop: Value, step: Value) -> slice | None:
+    """Convert slice bounds (null if missing) to a Python slice, or return
+    None if they are not integers"""
+    bounds = []
+    for bound in (start, stop, step):
+        match bound:
+            case Null():
+                bounds.append(None)
+            case Int(value):
+                bounds.append(value)
+            case _:
+                return None
+    if bounds[2] == 0:
+        return None
+    return slice(*bounds)
+
+
+def _window_slice(window: range) -> slice:
+    """Convert a range of non-negative indices to the equivalent slice"""
+    # A negative stop would wrap around instead of running to the beginning
+    stop = window.stop if window.stop >= 0 else None
+    return slice(window.start, stop, window.step)
+
+
+class OrderKey:
+    """Sort key for values without a native Python ordering
+
+    Compares values with baba-lang's is_less. Errors raised by it can't be
+    returned from there, so they are raised as an OrderKeyError instead."""
+
+    __slots__ = ("value", "interpreter")
+
+    value: Value
+    interpreter: "ASTInterpreter"
+
+    def __init__(self, value: Value, interpreter: "ASTInterpreter") -> None:
+        self.value = value
+        self.interpreter = interpreter
+
+    def _is_less(self, left: Value, right: Value) -> bool:
+        res = left.is_less(right, self.interpreter, None)
+        if isinstance(res, Value):
+            res = res.to_bool(self.interpreter, None)
+        if isinstance(res, BLError):
+            raise OrderKeyError(res)
+        return res.value
+
+    def __lt__(self, other: object) -> bool:
+        return self._is_less(self.value, _order_value(other))
+
+    def __gt__(self, other: object) -> bool:
+        # Reflection of other < self, when other is a native key
+        return self._is_less(_order_value(other), self.value)
+
+
+class OrderKeyError(Exception):
+    """Error raised when comparing OrderKeys"""
+
+    error: BLError
+
+    def __init__(self, error: BLError) -> None:
+        super().__init__(error)
+        self.error = error
+
+
+def order_key(
+    value: Value, interpreter: "ASTInterpreter"
+) -> int | float | str | OrderKey:
+    """Get a key ordering values like baba-lang's < operator
+
+    Numbers and strings are unboxed so that Python compares them natively,
+    other values go through is_less."""
+    match value:
+        case Int(x) | Float(x) | String(x):
+            return x
+    return OrderKey(value, interpreter)
+
+
+def _order_value(key: object) -> Value:
+    """Inverse of order_key"""
+    match key:
+        case OrderKey(value=value):
+            return value
+        case int():
+            return Int(key)
+        case float():
+            return Float(key)
+        case str():
+            return String(key)
+    return NULL
+
+
+def collect(
+    iterable: Value, interpreter: "ASTInterpreter", meta: Meta | None
+) -> list[Value] | BLError:
+    """Get the values of an iterable as a Python list
+
+    The list may be shared with a baba-lang collection, so it must not be
+    mutated."""
+    match iterable:
+        case BLList(elems=values) | BLSet(values=values):
+            return values
+    values = []
+    match iterator_ := iterable.to_iter(interpreter, meta):
+        case BLError():
+            return iterator_
+    while True:
+        match item := iterator_.next(interpreter, meta):
+            case BLError():
+                return item
+            case Item(value=value):
+                values.append(value)
+            case Null():
+                return values
+
+
+def sort_values(
+    values: Sequence[Value], key: Value, reverse: Value,
+    interpreter: "ASTInterpreter", meta: Meta | None,
+) -> list[Value] | BLError:
+    """Sort values with Python's sort (Timsort), into a new list
+
+    The key function, if not null, is called exactly once per value, and
+    the results are decorated with order_key before sorting."""
+    if not isinstance(reverse, (Bool, Null)) or not (
+        isinstance(key, (Null, SupportsBLCall))
+    ):
+        return BLError(cast_to_instance(
+            IncorrectTypeException.new([], interpreter, meta)
+        ), meta, interpreter.path)
+    keys = []
+    for value in values:
+        if not isinstance(key, Null):
+            match value := key.call([value], interpreter, meta):
+                case BLError():
+                    return value
+        keys.append(order_key(value, interpreter))
+    decorated = list(zip(keys, values))
+    try:
+        decorated.sort(key=itemgetter(0), reverse=reverse is BOOLS[True])
+    except OrderKeyError as e:
+        return e.error
+    except TypeError as e:
+        return BLError(cast_to_instance(
+            IncorrectTypeException.new([String(str(e))], interpreter, meta)
+        ), meta, interpreter.path)
+    return [value for _, value in decorated]
+
+
 # List
 
 
+class _Window(Sequence[Value]):
+    """Elements of a list view, read through its window without copying"""
+
+    __slots__ = ("base", "window")
+
+    base: list[Value]
+    window: range
+
+    def __init__(self, base: list[Value], window: range) -> None:
+        self.base = base
+        self.window = window
+
+    def __getitem__(self, i):  # type: ignore[no-untyped-def, override]
+        return self.base[self.window[i]]
+
+    def __len__(self) -> int:
+        return len(self.window)
+
+    def __iter__(self) -> Iterator[Value]:
+        return map(self.base.__getitem__, self.window)
+
+
 def list_new(
     args: list[Value], interpreter: "ASTInterpreter", meta: Meta | None
 ) -> ExpressionResult:
@@ -49,12 +224,18 @@ ListClass = Class(String("List"), ObjectClass, {
     "__add__": PythonFunction(
         lambda meta, intp, /, this, other, *_: this.add(other, intp, meta)
     ),
+    "__iadd__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.extend(meta, intp, other)
+    ),
     "__mul__": PythonFunction(
         lambda meta, intp, /, this, other, *_: this.multiply(other, intp, meta)
     ),
     "__eq__": PythonFunction(
         lambda meta, intp, /, this, other, *_: this.is_equal(other, intp, meta)
     ),
+    "__contains__": PythonFunction(
+        lambda meta, intp, /, this, item, *_: this.contains(item, intp, meta)
+    ),
     "to_bool": PythonFunction(
         lambda meta, intp, /, this, *_: this.to_bool(intp, meta)
     ),
@@ -93,18 +274,83 @@ ListClass = Class(String("List"), ObjectClass, {
         lambda meta, intp, /, this, *_:
         this.remove_at(meta, intp, this.length(meta, intp).subtract(Int(1)))
     ),
+    "sort": PythonFunction(
+        lambda meta, intp, /, this, key=NULL, reverse=NULL, *_:
+        this.sort(meta, intp, key, reverse)
+    ),
+    "bisect_left": PythonFunction(
+        lambda meta, intp, /, this, item, key=NULL, *_:
+        this.bisect(meta, intp, item, key, bisect.bisect_left)
+    ),
+    "bisect_right": PythonFunction(
+        lambda meta, intp, /, this, item, key=NULL, *_:
+        this.bisect(meta, intp, item, key, bisect.bisect_right)
+    ),
+    "insort": PythonFunction(
+        lambda meta, intp, /, this, item, key=NULL, *_:
+        this.insort(meta, intp, item, key)
+    ),
 })
 ListClass.new = list_new
 
 
 class BLList(Instance):
-    """List type"""
+    """List type
 
-    elems: list[Value]
+    Slicing a list gives a view: a list sharing the underlying Python list,
+    restricted to a range of its indices. Both sides are then marked as
+    shared, and copy their elements before they are first mutated. Methods
+    only reading the elements go through the window, so views are never
+    copied just to be read."""
+
+    __slots__ = ("_base", "_window", "_shared")
+
+    _base: list[Value]
+    _window: range | None
+    _shared: bool
 
     def __init__(self, elems: list[Value]) -> None:
-        super().__init__(ListClass, {})
-        self.elems = elems
+        super().__init__(ListClass)
+        self._base = elems
+        self._window = None
+        self._shared = False
+
+    @property
+    def elems(self) -> list[Value]:
+        """Elements of the list
+
+        The returned list may be shared with other lists, so it must not be
+        mutated. A view is copied into a list of its own, once, on the
+        first access."""
+        if self._window is not None:
+            self._base = self._base[_window_slice(self._window)]
+            self._window = None
+            self._shared = False
+        return self._base
+
+    def _own_elems(self) -> list[Value]:
+        """Elements of the list, copied first if shared with another list"""
+        elems = self.elems
+        if self._shared:
+            self._base = elems = elems.copy()
+            self._shared = False
+        return elems
+
+    def _items(self) -> Sequence[Value]:
+        """Elements of the list, without copying those of a view"""
+        if self._window is not None:
+            return _Window(self._base, self._window)
+        return self._base
+
+    def _len(self) -> int:
+        if self._window is not None:
+            return len(self._window)
+        return len(self._base)
+
+    def _get(self, i: int) -> Value:
+        if self._window is not None:
+            return self._base[self._window[i]]
+        return self._base[i]
 
     @override
     def add(
@@ -112,9 +358,19 @@ class BLList(Instance):
         meta: Meta | None,
     ) -> ExpressionResult:
         if isinstance(other, BLList):
-            return BLList(self.elems + other.elems)
+            return BLList([*self._items(), *other._items()])
         return super().add(other, interpreter, meta)
 
+    def extend(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        other: Value, *_
+    ) -> ExpressionResult:
+        """Append the elements of another list, in place"""
+        if isinstance(other, BLList):
+            self._own_elems().extend(other._items())
+            return self
+        return self.add(other, interpreter, meta)
+
     @override
     def multiply(
         self, other: Value, interpreter: "ASTInterpreter",
@@ -122,7 +378,7 @@ class BLList(Instance):
     ) -> ExpressionResult:
         match other:
             case Int(times):
-                return BLList(self.elems * times)
+                return BLList(list(self._items()) * times)
         return super().add(other, interpreter, meta)
 
     @override
@@ -131,19 +387,54 @@ class BLList(Instance):
         meta: Meta | None,
     ) -> Bool | BLError:
         if isinstance(other, BLList):
-            return BOOLS[self.elems == other.elems]
+            if self._len() != other._len():
+                return BOOLS[False]
+            for elem, other_elem in zip(self._items(), other._items()):
+                match res := elem.is_equal(other_elem, interpreter, meta):
+                    case BLError() | Bool(False):
+                        return res
+            return BOOLS[True]
         return super().is_equal(other, interpreter, meta)
 
     @override
     def to_bool(
         self, interpreter: "ASTInterpreter", meta: Meta | None
     ) -> Bool:
-        return BOOLS[bool(self.elems)]
+        return BOOLS[self._len() > 0]
+
+    @override
+    def contains(
+        self, item: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> Bool | BLError:
+        for elem in self._items():
+            match res := elem.is_equal(item, interpreter, meta):
+                case BLError() | Bool(True):
+                    return res
+        return BOOLS[False]
+
+    @override
+    def get_slice(
+        self, start: Value, stop: Value, step: Value,
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult:
+        if (slice_ := py_slice(start, stop, step)) is None:
+            return BLError(cast_to_instance(
+                IncorrectTypeException.new([], interpreter, meta)
+            ), meta, interpreter.path)
+        if self._window is None:
+            window = range(len(self._base))[slice_]
+        else:
+            window = self._window[slice_]
+        view = BLList(self._base)
+        view._window = window
+        view._shared = self._shared = True
+        return view
 
     @override
     def dump(self, interpreter: "ASTInterpreter", meta: Meta | None) -> String:
         dmp = methodcaller("dump", interpreter, meta)
-        return String(f"[{', '.join(dmp(e).value for e in self.elems)}]")
+        return String(f"[{', '.join(dmp(e).value for e in self._items())}]")
 
     def get(
         self, meta: Meta | None, interpreter: "ASTInterpreter", /,
@@ -153,7 +444,7 @@ class BLList(Instance):
         match index:
             case Int(index_val):
                 try:
-                    return self.elems[index_val]
+                    return self._get(index_val)
                 except IndexError:
                     return BLError(cast_to_instance(
                         OutOfRangeException.new([], interpreter, meta),
@@ -170,7 +461,7 @@ class BLList(Instance):
         match index, value:
             case Int(i), Value():
                 try:
-                    self.elems[i] = value
+                    self._own_elems()[i] = value
                     return value
                 except IndexError:
                     return BLError(cast_to_instance(
@@ -185,7 +476,7 @@ class BLList(Instance):
     ) -> Int:
         """Get length (number of elements) of a list"""
         # pylint: disable=unused-argument
-        return Int(len(self.elems))
+        return Int(self._len())
 
     def insert(
         self, meta: Meta | None, interpreter: "ASTInterpreter", /,
@@ -193,7 +484,7 @@ class BLList(Instance):
     ) -> Null:
         """Insert an element into a list"""
         # pylint: disable=unused-argument
-        self.elems.insert(index.value, item)
+        self._own_elems().insert(index.value, item)
         return NULL
 
     def remove_at(
@@ -202,7 +493,7 @@ class BLList(Instance):
     ) -> Null:
         """Remove an element from a list given index"""
         # pylint: disable=unused-argument
-        self.elems.pop(index.value)
+        self._own_elems().pop(index.value)
         return NULL
 
     def map(
@@ -212,7 +503,7 @@ class BLList(Instance):
         """Map a function over a list"""
         # pylint: disable=unused-argument
         elems = []
-        for elem in self.elems:
+        for elem in self._items():
             match res := f.call([elem], interpreter, meta):
                 case Value():
                     elems.append(res)
@@ -227,7 +518,7 @@ class BLList(Instance):
         """Filter a list"""
         # pylint: disable=unused-argument
         elems = []
-        for elem in self.elems:
+        for elem in self._items():
             res = f.call([elem], interpreter, meta)
             match res:
                 case Bool(value=value):
@@ -247,12 +538,12 @@ class BLList(Instance):
     ) -> "Value | BLError":
         """Reduce a list"""
         # pylint: disable=unused-argument
-        if not self.elems:
+        if not (elems := self._items()):
             return BLError(cast_to_instance(
                 OutOfRangeException.new([], interpreter, meta)
             ), meta, interpreter.path)
-        acc = self.elems[0]
-        for elem in self.elems[1:]:
+        acc = elems[0]
+        for elem in islice(elems, 1, None):
             match res := f.call([acc, elem], interpreter, meta):
                 case Value():
                     acc = res
@@ -260,6 +551,64 @@ class BLList(Instance):
                     return res
         return acc
 
+    def sort(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        key: Value = NULL, reverse: Value = NULL, *_
+    ) -> ExpressionResult:
+        """Sort a list in place, optionally by a key function"""
+        match sorted_ := sort_values(
+            self._items(), key, reverse, interpreter, meta
+        ):
+            case BLError():
+                return sorted_
+        self._own_elems()[:] = sorted_
+        return NULL
+
+    def _bisect_key(
+        self, key: Value, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> Callable[[Value], object]:
+        def _key(value: Value) -> object:
+            if isinstance(key, SupportsBLCall):
+                match value := key.call([value], interpreter, meta):
+                    case BLError():
+                        raise OrderKeyError(value)
+            return order_key(value, interpreter)
+        return _key
+
+    def bisect(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        item: Value, key: Value,
+        bisect_func: Callable[..., int] = bisect.bisect_left, *_
+    ) -> ExpressionResult:
+        """Find where to insert an item into a sorted list to keep it
+        sorted, with a binary search
+
+        Unlike in Python, the key function is applied to the item too."""
+        key_func = self._bisect_key(key, interpreter, meta)
+        try:
+            return Int(
+                bisect_func(self._items(), key_func(item), key=key_func)
+            )
+        except OrderKeyError as e:
+            return e.error
+        except TypeError as e:
+            return BLError(cast_to_instance(
+                IncorrectTypeException.new([String(str(e))], interpreter, meta)
+            ), meta, interpreter.path)
+
+    def insort(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        item: Value, key: Value = NULL, *_
+    ) -> ExpressionResult:
+        """Insert an item into a sorted list, keeping it sorted"""
+        match index := self.bisect(
+            meta, interpreter, item, key, bisect.bisect_right
+        ):
+            case Int(i):
+                self._own_elems().insert(i, item)
+                return NULL
+        return index
+
 
 def listiter_init(
     meta: Meta | None, interpreter: "ASTInterpreter", this: Instance | None,
@@ -279,11 +628,11 @@ def listiter_next(
 ) -> Item | Null:
     """Advance list iterator"""
     if this is not None:
-        elems = cast(BLList, this.vars["lst"]).elems
+        lst = cast(BLList, this.vars["lst"])
         i = cast(Int, this.vars["i"])
         this.vars["i"] = cast(Value, i.add(Int(1), interpreter, meta))
-        if i.value < len(elems):
-            return Item(elems[i.value])
+        if i.value < lst._len():  # pylint: disable=protected-access
+            return Item(lst._get(i.value))  # pylint: disable=protected-access
     return NULL
 
 
@@ -322,6 +671,15 @@ DictClass = Class(String("Dict"), ObjectClass, {
         lambda meta, intp, /, this, key, value, *_:
         this.set(meta, intp, key, value)
     ),
+    "__contains__": PythonFunction(
+        lambda meta, intp, /, this, key, *_: this.contains(key, intp, meta)
+    ),
+    "__add__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.add(other, intp, meta)
+    ),
+    "__iadd__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.update(meta, intp, other)
+    ),
     "get": PythonFunction(
         lambda meta, intp, /, this, key, *_: this.get(meta, intp, key)
     ),
@@ -333,7 +691,19 @@ DictClass = Class(String("Dict"), ObjectClass, {
         lambda meta, intp, /, this, *_: this.length(meta, intp)
     ),
     "keys": PythonFunction(
-        lambda meta, intp, /, this, *_: this.keys(meta, intp)
+        lambda meta, intp, /, this, *_: DictView(this, "keys")
+    ),
+    "values": PythonFunction(
+        lambda meta, intp, /, this, *_: DictView(this, "values")
+    ),
+    "items": PythonFunction(
+        lambda meta, intp, /, this, *_: DictView(this, "items")
+    ),
+    "iter": PythonFunction(
+        lambda meta, intp, /, this, *_: PythonIterator(this.iter_keys())
+    ),
+    "update": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.update(meta, intp, other)
     ),
     "remove": PythonFunction(
         lambda meta, intp, /, this, key, *_: this.remove(meta, intp, key)
@@ -343,12 +713,18 @@ DictClass.new = dict_new
 
 
 class BLDict(Instance):
-    """Dict type"""
+    """Dict type
 
-    content: dict[Value, Value]
+    Keys are stored as given by Value.hash_key: most values stand for
+    themselves, and instances overloading __hash__ are wrapped in a
+    HashKey."""
 
-    def __init__(self, content: dict[Value, Value]) -> None:
-        super().__init__(DictClass, {})
+    __slots__ = ("content",)
+
+    content: dict[Hashable, Value]
+
+    def __init__(self, content: dict[Hashable, Value]) -> None:
+        super().__init__(DictClass)
         self.content = content
 
     @override
@@ -357,20 +733,48 @@ class BLDict(Instance):
         meta: Meta | None,
     ) -> Bool | BLError:
         if isinstance(other, BLDict):
-            return BOOLS[self.content == other.content]
+            try:
+                return BOOLS[self.content == other.content]
+            except HashKeyError as e:
+                return e.error
         return super().is_equal(other, interpreter, meta)
 
+    @override
+    def add(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        if isinstance(other, BLDict):
+            try:
+                return BLDict(self.content | other.content)
+            except HashKeyError as e:
+                return e.error
+        return super().add(other, interpreter, meta)
+
     @override
     def to_bool(
         self, interpreter: "ASTInterpreter", meta: Meta | None
     ) -> Bool:
         return BOOLS[bool(self.content)]
 
+    @override
+    def contains(
+        self, item: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> Bool | BLError:
+        match key := item.hash_key(interpreter, meta):
+            case BLError():
+                return key
+        try:
+            return BOOLS[key in self.content]
+        except HashKeyError as e:
+            return e.error
+
     @override
     def dump(self, interpreter: "ASTInterpreter", meta: Meta | None) -> String:
         dmp = methodcaller("dump", interpreter, meta)
         pair_str_list = []
-        for k, v in self.content.items():
+        for k, v in self.iter_items():
             pair_str_list.append(f"{dmp(k).value}: {dmp(v).value}")
         return String(f'{{{', '.join(pair_str_list)}}}')
 
@@ -379,30 +783,31 @@ class BLDict(Instance):
         key: Value, *_
     ) -> ExpressionResult:
         """Get a value from a dictionary"""
-        match key:
-            case Value():
-                try:
-                    return self.content[key]
-                except KeyError:
-                    return BLError(cast_to_instance(
-                        KeyNotFoundException.new([], interpreter, meta),
-                    ), meta, interpreter.path)
-        return BLError(cast_to_instance(
-            IncorrectTypeException.new([], interpreter, meta)
-        ), meta, interpreter.path)
+        match key_ := key.hash_key(interpreter, meta):
+            case BLError():
+                return key_
+        try:
+            return self.content[key_]
+        except KeyError:
+            return BLError(cast_to_instance(
+                KeyNotFoundException.new([], interpreter, meta),
+            ), meta, interpreter.path)
+        except HashKeyError as e:
+            return e.error
 
     def set(
         self, meta: Meta | None, interpreter: "ASTInterpreter", /,
         key: Value, value: Value, *_
     ) -> ExpressionResult:
         """Set a value in a dictionary"""
-        match key, value:
-            case Value(), Value():
-                self.content[key] = value
-                return value
-        return BLError(cast_to_instance(
-            IncorrectTypeException.new([], interpreter, meta)
-        ), meta, interpreter.path)
+        match key_ := key.hash_key(interpreter, meta):
+            case BLError():
+                return key_
+        try:
+            self.content[key_] = value
+        except HashKeyError as e:
+            return e.error
+        return value
 
     def length(
         self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
@@ -411,27 +816,756 @@ class BLDict(Instance):
         # pylint: disable=unused-argument
         return Int(len(self.content))
 
-    def keys(
-        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
-    ) -> BLList:
-        """Get all keys of a dictionary as a list"""
-        # pylint: disable=unused-argument
-        return BLList(list(self.content))
+    def iter_keys(self) -> Iterator[Value]:
+        """Iterate over the keys of a dictionary, without copying them"""
+        for k in self.content:
+            yield k.value if isinstance(k, HashKey) else cast(Value, k)
+
+    def iter_items(self) -> Iterator[tuple[Value, Value]]:
+        """Iterate over the key-value pairs of a dictionary, without copying
+        them"""
+        for k, v in self.content.items():
+            yield k.value if isinstance(k, HashKey) else cast(Value, k), v
+
+    def update(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        other: Value, *_
+    ) -> ExpressionResult:
+        """Merge another dictionary into a dictionary, in place"""
+        if isinstance(other, BLDict):
+            try:
+                self.content.update(other.content)
+            except HashKeyError as e:
+                return e.error
+            return self
+        return self.add(other, interpreter, meta)
 
     def remove(
         self, meta: Meta | None, interpreter: "ASTInterpreter", /,
         key: Value, *_
-    ) -> Null:
+    ) -> ExpressionResult:
         """Remove a key from a dictionary"""
-        # pylint: disable=unused-argument
-        del self.content[key]
+        match key_ := key.hash_key(interpreter, meta):
+            case BLError():
+                return key_
+        try:
+            del self.content[key_]
+        except KeyError:
+            return BLError(cast_to_instance(
+                KeyNotFoundException.new([], interpreter, meta),
+            ), meta, interpreter.path)
+        except HashKeyError as e:
+            return e.error
         return NULL
 
 
+# Dict views
+
+
+DictViewClass = Class(String("DictView"), ObjectClass, {
+    "__contains__": PythonFunction(
+        lambda meta, intp, /, this, item, *_: this.contains(item, intp, meta)
+    ),
+    "iter": PythonFunction(
+        lambda meta, intp, /, this, *_: PythonIterator(this.iter())
+    ),
+    "length": PythonFunction(
+        lambda meta, intp, /, this, *_: Int(len(this.dict_.content))
+    ),
+    "to_list": PythonFunction(
+        lambda meta, intp, /, this, *_: BLList(list(this.iter()))
+    ),
+    "to_bool": PythonFunction(
+        lambda meta, intp, /, this, *_: this.to_bool(intp, meta)
+    ),
+    "dump": PythonFunction(
+        lambda meta, intp, /, this, *_: this.dump(intp, meta)
+    ),
+})
+
+
+class DictView(Instance):
+    """Live view of the keys, values or items of a dictionary
+
+    Views hold no copy of the dictionary: they see every later change to
+    it, and iterating over them walks the dictionary itself. Items are
+    produced as [key, value] lists."""
+
+    __slots__ = ("dict_", "kind")
+
+    dict_: BLDict
+    kind: Literal["keys", "values", "items"]
+
+    def __init__(
+        self, dict_: BLDict, kind: Literal["keys", "values", "items"]
+    ) -> None:
+        super().__init__(DictViewClass)
+        self.dict_ = dict_
+        self.kind = kind
+
+    def iter(self) -> Iterator[Value]:
+        """Iterate over the view"""
+        match self.kind:
+            case "keys":
+                return self.dict_.iter_keys()
+            case "values":
+                return iter(self.dict_.content.values())
+        return (BLList([k, v]) for k, v in self.dict_.iter_items())
+
+    @override
+    def to_bool(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> Bool:
+        return BOOLS[bool(self.dict_.content)]
+
+    @override
+    def contains(
+        self, item: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> Bool | BLError:
+        match self.kind, item:
+            case "keys", _:
+                return self.dict_.contains(item, interpreter, meta)
+            case "items", BLList() if item._len() == 2:
+                key, value = item.elems
+                match key_ := key.hash_key(interpreter, meta):
+                    case BLError():
+                        return key_
+                try:
+                    stored = self.dict_.content[key_]
+                except KeyError:
+                    return BOOLS[False]
+                except HashKeyError as e:
+                    return e.error
+                return stored.is_equal(value, interpreter, meta)
+            case "items", _:
+                return BOOLS[False]
+        for value in self.dict_.content.values():
+            match res := value.is_equal(item, interpreter, meta):
+                case BLError() | Bool(True):
+                    return res
+        return BOOLS[False]
+
+    @override
+    def dump(self, interpreter: "ASTInterpreter", meta: Meta | None) -> String:
+        dmp = methodcaller("dump", interpreter, meta)
+        values = ", ".join(dmp(v).value for v in self.iter())
+        return String(f"<dict {self.kind} [{values}]>")
+
+
 # Dict errors
 KeyNotFoundException = Class(String("KeyNotFoundException"), ExceptionClass)
 
 
+# Set
+
+
+def set_new(
+    args: list[Value], interpreter: "ASTInterpreter", meta: Meta | None
+) -> ExpressionResult:
+    """Create a new set, optionally from the values of an iterable"""
+    set_ = BLSet({})
+    match args:
+        case []:
+            return set_
+        case [iterable]:
+            match values := collect(iterable, interpreter, meta):
+                case BLError():
+                    return values
+        case _:
+            return BLError(cast_to_instance(
+                IncorrectTypeException.new([], interpreter, meta)
+            ), meta, interpreter.path)
+    for value in values:
+        if isinstance(res := set_.add(meta, interpreter, value), BLError):
+            return res
+    return set_
+
+
+SetClass = Class(String("Set"), ObjectClass, {
+    "__contains__": PythonFunction(
+        lambda meta, intp, /, this, item, *_: this.contains(item, intp, meta)
+    ),
+    "__or__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.bit_or(other, intp, meta)
+    ),
+    "__and__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.bit_and(other, intp, meta)
+    ),
+    "__sub__": PythonFunction(
+        lambda meta, intp, /, this, other, *_:
+        this.subtract(other, intp, meta)
+    ),
+    "__eq__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.is_equal(other, intp, meta)
+    ),
+    "to_bool": PythonFunction(
+        lambda meta, intp, /, this, *_: this.to_bool(intp, meta)
+    ),
+    "dump": PythonFunction(
+        lambda meta, intp, /, this, *_: this.dump(intp, meta)
+    ),
+    "length": PythonFunction(
+        lambda meta, intp, /, this, *_: Int(len(this.content))
+    ),
+    "iter": PythonFunction(
+        lambda meta, intp, /, this, *_: PythonIterator(iter(this.values))
+    ),
+    "add": PythonFunction(
+        lambda meta, intp, /, this, item, *_: this.add(meta, intp, item)
+    ),
+    "remove": PythonFunction(
+        lambda meta, intp, /, this, item, *_: this.remove(meta, intp, item)
+    ),
+    "union": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.bit_or(other, intp, meta)
+    ),
+    "intersection": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.bit_and(other, intp, meta)
+    ),
+    "difference": PythonFunction(
+        lambda meta, intp, /, this, other, *_:
+        this.subtract(other, intp, meta)
+    ),
+    "to_list": PythonFunction(
+        lambda meta, intp, /, this, *_: BLList(this.values)
+    ),
+})
+SetClass.new = set_new
+
+
+class BLSet(Instance):
+    """Set type
+
+    Like dictionary keys, elements are stored as given by Value.hash_key,
+    mapped to the values themselves."""
+
+    __slots__ = ("content",)
+
+    content: dict[Hashable, Value]
+
+    def __init__(self, content: dict[Hashable, Value]) -> None:
+        super().__init__(SetClass)
+        self.content = content
+
+    @property
+    def values(self) -> list[Value]:
+        """Elements of the set, in insertion order"""
+        return list(self.content.values())
+
+    def _combine(
+        self, other: Value, interpreter: "ASTInterpreter", meta: Meta | None,
+        op: Callable[[dict[Hashable, Value], dict[Hashable, Value]],
+                     dict[Hashable, Value]],
+    ) -> "BLSet | BLError":
+        if not isinstance(other, BLSet):
+            return BLError(cast_to_instance(
+                IncorrectTypeException.new([], interpreter, meta)
+            ), meta, interpreter.path)
+        try:
+            return BLSet(op(self.content, other.content))
+        except HashKeyError as e:
+            return e.error
+
+    @override
+    def bit_or(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        return self._combine(other, interpreter, meta, lambda a, b: a | b)
+
+    @override
+    def bit_and(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        return self._combine(
+            other, interpreter, meta,
+            lambda a, b: {k: v for k, v in a.items() if k in b},
+        )
+
+    @override
+    def subtract(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        return self._combine(
+            other, interpreter, meta,
+            lambda a, b: {k: v for k, v in a.items() if k not in b},
+        )
+
+    @override
+    def is_equal(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> Bool | BLError:
+        if isinstance(other, BLSet):
+            try:
+                return BOOLS[self.content.keys() == other.content.keys()]
+            except HashKeyError as e:
+                return e.error
+        return super().is_equal(other, interpreter, meta)
+
+    @override
+    def contains(
+        self, item: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> Bool | BLError:
+        match key := item.hash_key(interpreter, meta):
+            case BLError():
+                return key
+        try:
+            return BOOLS[key in self.content]
+        except HashKeyError as e:
+            return e.error
+
+    @override
+    def to_bool(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> Bool:
+        return BOOLS[bool(self.content)]
+
+    @override
+    def dump(self, interpreter: "ASTInterpreter", meta: Meta | None) -> String:
+        dmp = methodcaller("dump", interpreter, meta)
+        return String(
+            f"Set([{', '.join(dmp(v).value for v in self.content.values())}])"
+        )
+
+    def add(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        item: Value, *_
+    ) -> ExpressionResult:
+        """Add an element to a set (no-op if it's already there)"""
+        match key := item.hash_key(interpreter, meta):
+            case BLError():
+                return key
+        try:
+            self.content.setdefault(key, item)
+        except HashKeyError as e:
+            return e.error
+        return NULL
+
+    def remove(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        item: Value, *_
+    ) -> ExpressionResult:
+        """Remove an element from a set"""
+        match key := item.hash_key(interpreter, meta):
+            case BLError():
+                return key
+        try:
+            del self.content[key]
+        except KeyError:
+            return BLError(cast_to_instance(
+                KeyNotFoundException.new([], interpreter, meta),
+            ), meta, interpreter.path)
+        except HashKeyError as e:
+            return e.error
+        return NULL
+
+
+# Deque
+
+
+def deque_new(
+    args: list[Value], interpreter: "ASTInterpreter", meta: Meta | None
+) -> ExpressionResult:
+    """Create a new deque, optionally from a list and with a maximum
+    length"""
+    match args:
+        case []:
+            return BLDeque(deque())
+        case [BLList(elems=elems)]:
+            return BLDeque(deque(elems))
+        case [BLList(elems=elems), Int(maxlen)] if maxlen >= 0:
+            return BLDeque(deque(elems, maxlen))
+    return BLError(cast_to_instance(
+        IncorrectTypeException.new([], interpreter, meta)
+    ), meta, interpreter.path)
+
+
+DequeClass = Class(String("Deque"), ObjectClass, {
+    "__getitem__": PythonFunction(
+        lambda meta, intp, /, this, index, *_: this.get_item(index, intp, meta)
+    ),
+    "__contains__": PythonFunction(
+        lambda meta, intp, /, this, item, *_: this.contains(item, intp, meta)
+    ),
+    "to_bool": PythonFunction(
+        lambda meta, intp, /, this, *_: this.to_bool(intp, meta)
+    ),
+    "dump": PythonFunction(
+        lambda meta, intp, /, this, *_: this.dump(intp, meta)
+    ),
+    "length": PythonFunction(
+        lambda meta, intp, /, this, *_: Int(len(this.items))
+    ),
+    "iter": PythonFunction(
+        lambda meta, intp, /, this, *_: PythonIterator(iter(list(this.items)))
+    ),
+    "push": PythonFunction(
+        lambda meta, intp, /, this, item, *_: this.push(meta, intp, item)
+    ),
+    "push_front": PythonFunction(
+        lambda meta, intp, /, this, item, *_:
+        this.push_front(meta, intp, item)
+    ),
+    "pop": PythonFunction(
+        lambda meta, intp, /, this, *_: this.pop(meta, intp)
+    ),
+    "pop_front": PythonFunction(
+        lambda meta, intp, /, this, *_: this.pop_front(meta, intp)
+    ),
+    "peek": PythonFunction(
+        lambda meta, intp, /, this, *_: this.peek(meta, intp, -1)
+    ),
+    "peek_front": PythonFunction(
+        lambda meta, intp, /, this, *_: this.peek(meta, intp, 0)
+    ),
+    "clear": PythonFunction(
+        lambda meta, intp, /, this, *_: this.clear(meta, intp)
+    ),
+    "to_list": PythonFunction(
+        lambda meta, intp, /, this, *_: BLList(list(this.items))
+    ),
+})
+DequeClass.new = deque_new
+
+
+class BLDeque(Instance):
+    """Double-ended queue type, backed by collections.deque"""
+
+    __slots__ = ("items",)
+
+    items: deque[Value]
+
+    def __init__(self, items: deque[Value]) -> None:
+        super().__init__(DequeClass)
+        self.items = items
+
+    @override
+    def get_item(
+        self, index: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        match index:
+            case Int(i):
+                try:
+                    return self.items[i]
+                except IndexError:
+                    return BLError(cast_to_instance(
+                        OutOfRangeException.new([], interpreter, meta)
+                    ), meta, interpreter.path)
+        return BLError(cast_to_instance(
+            IncorrectTypeException.new([], interpreter, meta)
+        ), meta, interpreter.path)
+
+    @override
+    def contains(
+        self, item: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> Bool | BLError:
+        for elem in self.items:
+            match res := elem.is_equal(item, interpreter, meta):
+                case BLError() | Bool(True):
+                    return res
+        return BOOLS[False]
+
+    @override
+    def to_bool(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> Bool:
+        return BOOLS[bool(self.items)]
+
+    @override
+    def dump(self, interpreter: "ASTInterpreter", meta: Meta | None) -> String:
+        dmp = methodcaller("dump", interpreter, meta)
+        return String(
+            f"Deque([{', '.join(dmp(e).value for e in self.items)}])"
+        )
+
+    def push(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        item: Value, *_
+    ) -> Null:
+        """Add an element to the back"""
+        # pylint: disable=unused-argument
+        self.items.append(item)
+        return NULL
+
+    def push_front(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        item: Value, *_
+    ) -> Null:
+        """Add an element to the front"""
+        # pylint: disable=unused-argument
+        self.items.appendleft(item)
+        return NULL
+
+    def pop(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
+    ) -> ExpressionResult:
+        """Remove and return the element at the back"""
+        try:
+            return self.items.pop()
+        except IndexError:
+            return BLError(cast_to_instance(
+                OutOfRangeException.new([], interpreter, meta)
+            ), meta, interpreter.path)
+
+    def pop_front(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
+    ) -> ExpressionResult:
+        """Remove and return the element at the front"""
+        try:
+            return self.items.popleft()
+        except IndexError:
+            return BLError(cast_to_instance(
+                OutOfRangeException.new([], interpreter, meta)
+            ), meta, interpreter.path)
+
+    def peek(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        index: int, *_
+    ) -> ExpressionResult:
+        """Return the element at the front (0) or at the back (-1)"""
+        try:
+            return self.items[index]
+        except IndexError:
+            return BLError(cast_to_instance(
+                OutOfRangeException.new([], interpreter, meta)
+            ), meta, interpreter.path)
+
+    def clear(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
+    ) -> Null:
+        """Remove all elements"""
+        # pylint: disable=unused-argument
+        self.items.clear()
+        return NULL
+
+
+# Priority queue
+
+
+def priority_queue_new(
+    args: list[Value], interpreter: "ASTInterpreter", meta: Meta | None
+) -> ExpressionResult:
+    """Create a new priority queue, optionally with a key function"""
+    match args:
+        case []:
+            return BLPriorityQueue(None)
+        case [SupportsBLCall() as key]:
+            return BLPriorityQueue(key)
+    return BLError(cast_to_instance(
+        IncorrectTypeException.new([], interpreter, meta)
+    ), meta, interpreter.path)
+
+
+PriorityQueueClass = Class(String("PriorityQueue"), ObjectClass, {
+    "to_bool": PythonFunction(
+        lambda meta, intp, /, this, *_: this.to_bool(intp, meta)
+    ),
+    "dump": PythonFunction(
+        lambda meta, intp, /, this, *_: this.dump(intp, meta)
+    ),
+    "length": PythonFunction(
+        lambda meta, intp, /, this, *_: Int(len(this.heap))
+    ),
+    "iter": PythonFunction(
+        lambda meta, intp, /, this, *_: this.iter(meta, intp)
+    ),
+    "push": PythonFunction(
+        lambda meta, intp, /, this, item, *_: this.push(meta, intp, item)
+    ),
+    "pop": PythonFunction(
+        lambda meta, intp, /, this, *_: this.pop(meta, intp)
+    ),
+    "peek": PythonFunction(
+        lambda meta, intp, /, this, *_: this.peek(meta, intp)
+    ),
+    "clear": PythonFunction(
+        lambda meta, intp, /, this, *_: this.clear(meta, intp)
+    ),
+    "to_list": PythonFunction(
+        lambda meta, intp, /, this, *_: this.to_list(meta, intp)
+    ),
+})
+PriorityQueueClass.new = priority_queue_new
+
+
+class BLPriorityQueue(Instance):
+    """Priority queue type, a binary min-heap laid out like heapq's
+
+    Heap entries are (key, counter, value) triples: the key is computed once
+    per element by order_key, and the insertion counter makes elements with
+    equal keys come out first in, first out."""
+
+    __slots__ = ("key", "heap", "counter")
+
+    key: SupportsBLCall | None
+    heap: list[tuple[object, int, Value]]
+    counter: int
+
+    def __init__(self, key: SupportsBLCall | None) -> None:
+        super().__init__(PriorityQueueClass)
+        self.key = key
+        self.heap = []
+        self.counter = 0
+
+    @staticmethod
+    def _less(
+        a: tuple[object, int, Value], b: tuple[object, int, Value]
+    ) -> bool:
+        # Entries aren't compared as tuples: OrderKeys have no __eq__, so
+        # tuple comparison would never get to the counters of equal keys
+        return a[0] < b[0] or (not b[0] < a[0] and a[1] < b[1])
+
+    # heapq moves entries as it compares them, so a comparison failing
+    # partway would leave the heap out of order. Push and pop instead find
+    # the positions of the entries they move first, and only then move them.
+
+    def _push_position(self, entry: tuple[object, int, Value]) -> int:
+        """Position of an entry pushed, once its ancestors move down"""
+        pos = len(self.heap)
+        while pos > 0 and self._less(
+            entry, self.heap[parent := (pos - 1) >> 1]
+        ):
+            pos = parent
+        return pos
+
+    def _pop_path(self) -> tuple[list[int], int]:
+        """Path that the smallest children move up along when the top is
+        popped, and the index in it where the last entry goes"""
+        heap = self.heap
+        n = len(heap) - 1
+        path = [0]
+        child = 1
+        while child < n:
+            if child + 1 < n and not self._less(heap[child], heap[child + 1]):
+                child += 1
+            path.append(child)
+            child = 2 * child + 1
+        i = len(path) - 1
+        while i > 0 and self._less(heap[n], heap[path[i]]):
+            i -= 1
+        return path, i
+
+    def _sorted_values(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> list[Value] | BLError:
+        try:
+            # Sorted by counter, then stably by key
+            by_counter = sorted(self.heap, key=itemgetter(1))
+            return [v for _, _, v in sorted(by_counter, key=itemgetter(0))]
+        except OrderKeyError as e:
+            return e.error
+        except TypeError:
+            return new_error(IncorrectTypeException, interpreter, meta)
+
+    @override
+    def to_bool(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> Bool:
+        return BOOLS[bool(self.heap)]
+
+    @override
+    def dump(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> String | BLError:
+        dmp = methodcaller("dump", interpreter, meta)
+        match values := self._sorted_values(interpreter, meta):
+            case BLError():
+                return values
+        return String(
+            f"PriorityQueue([{', '.join(dmp(v).value for v in values)}])"
+        )
+
+    def push(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        item: Value, *_
+    ) -> ExpressionResult:
+        """Add an element"""
+        key = item
+        if self.key is not None:
+            match key := self.key.call([item], interpreter, meta):
+                case BLError():
+                    return key
+        entry = (order_key(key, interpreter), self.counter, item)
+        try:
+            pos = self._push_position(entry)
+        except OrderKeyError as e:
+            return e.error
+        except TypeError:
+            return new_error(IncorrectTypeException, interpreter, meta)
+        heap = self.heap
+        heap.append(entry)
+        i = len(heap) - 1
+        while i > pos:
+            parent = (i - 1) >> 1
+            heap[i] = heap[parent]
+            i = parent
+        heap[pos] = entry
+        self.counter += 1
+        return NULL
+
+    def pop(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
+    ) -> ExpressionResult:
+        """Remove and return the smallest element"""
+        if not self.heap:
+            return new_error(OutOfRangeException, interpreter, meta)
+        try:
+            path, i = self._pop_path()
+        except OrderKeyError as e:
+            return e.error
+        except TypeError:
+            return new_error(IncorrectTypeException, interpreter, meta)
+        heap = self.heap
+        entry = heap[0]
+        for pos, child in zip(path, path[1:i + 1]):
+            heap[pos] = heap[child]
+        heap[path[i]] = heap[-1]
+        heap.pop()
+        return entry[2]
+
+    def peek(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
+    ) -> ExpressionResult:
+        """Return the smallest element"""
+        if not self.heap:
+            return new_error(OutOfRangeException, interpreter, meta)
+        return self.heap[0][2]
+
+    def iter(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
+    ) -> ExpressionResult:
+        """Iterate over the elements in priority order, without removing
+        them"""
+        match values := self._sorted_values(interpreter, meta):
+            case BLError():
+                return values
+        return PythonIterator(iter(values))
+
+    def to_list(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
+    ) -> ExpressionResult:
+        """Get the elements in priority order as a list"""
+        match values := self._sorted_values(interpreter, meta):
+            case BLError():
+                return values
+        return BLList(values)
+
+    def clear(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *_
+    ) -> Null:
+        """Remove all elements"""
+        # pylint: disable=unused-argument
+        self.heap.clear()
+        return NULL
+
+
 # Module
 
 
@@ -2,21 +2,23 @@
 
 
 from abc import ABC
-from typing import Self, TYPE_CHECKING, override, cast
+from collections.abc import Callable, Hashable, Iterator, MutableMapping
+from typing import Self, TYPE_CHECKING, final, override, cast
 from dataclasses import dataclass, field
 
 from lark import Token
 from lark.tree import Meta
 
-from bl_ast.nodes import FormArgs, Body
+from bl_ast.nodes import FormArgs, Body, FunctionStmt, FunctionLiteral
 
+from .shapes import Shape, EMPTY_SHAPE
 from .abc_protocols import (
     Result, Exit, SupportsBLCall, SupportsWrappedByPythonFunction
 )
 
 if TYPE_CHECKING:
     from .iterator import Item
-    from ..main import ASTInterpreter
+    from ..main import ASTInterpreter, Script
     from .numbers import Int
 
 
@@ -34,6 +36,43 @@ def cast_to_instance(value: "ExpressionResult") -> "Instance":
     return cast(Instance, value)
 
 
+@final
+class Missing:
+    """Type of MISSING, returned by lookups that found nothing
+
+    Unlike a BLError, it costs nothing to return, so misses that callers
+    expect (e.g. a class without a given overload) are not turned into
+    exception objects."""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+MISSING = Missing()
+
+
+def attr_not_found(
+    interpreter: "ASTInterpreter", meta: Meta | None
+) -> "BLError":
+    """Error for a missing attribute"""
+    return BLError(cast_to_instance(
+        AttrNotFoundException.new([], interpreter, meta)
+    ), meta, interpreter.path)
+
+
+def new_error(
+    exc_class: "Class", interpreter: "ASTInterpreter", meta: Meta | None,
+    msg: str | None = None,
+) -> "BLError":
+    """Error holding a new exception of a class, with an optional message"""
+    args: list[Value] = [] if msg is None else [String(msg)]
+    return BLError(cast_to_instance(
+        exc_class.new(args, interpreter, meta)
+    ), meta, interpreter.path)
+
+
 # section Result
 
 
@@ -60,16 +99,30 @@ class BLError(Exit):
     """Error result type"""
 
     value: "Instance"
+    # Where the error was raised. It is kept here rather than on the value,
+    # which may be shared, e.g. a pooled string literal.
     meta: Meta | None
     path: str | None
+    # Call stack where the error was raised, see capture_traceback
+    traceback: "list[Call | Script] | None"
 
     def __init__(
         self, value: "Instance", meta: Meta | None, path: str | None
     ) -> None:
         self.value = value
-        self.value.vars["meta"] = PythonValue(meta)
         self.meta = meta
         self.path = path
+        self.traceback = None
+
+    def capture_traceback(self, traceback: "list[Call | Script]") -> None:
+        """Take a snapshot of the call stack, before popping a frame the
+        error propagates out of
+
+        Only the first snapshot, of the stack as it was where the error was
+        raised, is kept. Errors caught without leaving their frame never
+        need one."""
+        if self.traceback is None:
+            self.traceback = traceback.copy()
 
 
 # section Values
@@ -78,6 +131,8 @@ class BLError(Exit):
 class Value(Result, ABC):
     """Value base class"""
 
+    __slots__ = ()
+
     def binary_op(
         self, op: str, other: "Value",
         interpreter: "ASTInterpreter", meta: Meta | None
@@ -121,6 +176,13 @@ class Value(Result, ABC):
                 return self.is_greater(other, interpreter, meta)
             case ">=":
                 return self.is_greater_or_equal(other, interpreter, meta)
+            case "in":
+                return other.contains(self, interpreter, meta)
+            case "not in":
+                res = other.contains(self, interpreter, meta)
+                if isinstance(res, BLError):
+                    return res
+                return res.logical_not(interpreter, meta)
         return BLError(cast_to_instance(
             NotImplementedException.new(
                 [String(f"Operator '{op}' is not supported")], interpreter,
@@ -128,6 +190,16 @@ class Value(Result, ABC):
             )
         ), meta, interpreter.path)
 
+    def inplace_op(
+        self, op: str, other: "Value",
+        interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> "ExpressionResult":
+        """In-place binary operation, as in `a op= b`
+
+        Mutable values may update themselves and return themselves, but by
+        default this is just the binary operation."""
+        return self.binary_op(op, other, interpreter, meta)
+
     def add(
         self, other: "Value", interpreter: "ASTInterpreter",
         meta: Meta | None
@@ -257,6 +329,13 @@ class Value(Result, ABC):
         """Greater than or equal to"""
         return self._unimplemented_binary_op('>=', other, interpreter, meta)
 
+    def contains(
+        self, item: "Value", interpreter: "ASTInterpreter",
+        meta: Meta | None
+    ) -> ExpressionResult:
+        """Membership test (item in self)"""
+        return self._unimplemented_binary_op('in', item, interpreter, meta)
+
     def _unimplemented_binary_op(
         self, op: str, other: "Value",
         interpreter: "ASTInterpreter", meta: Meta | None,
@@ -363,6 +442,18 @@ class Value(Result, ABC):
             )
         ), meta, interpreter.path)
 
+    def get_slice(
+        self, start: "Value", stop: "Value", step: "Value",
+        interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> ExpressionResult:
+        """Access a slice (missing bounds are null)"""
+        return BLError(cast_to_instance(
+            NotImplementedException.new(
+                [String("Slicing is not supported")],
+                interpreter, meta,
+            )
+        ), meta, interpreter.path)
+
     def set_item(
         self, index: "Value", value: "Value",
         interpreter: "ASTInterpreter", meta: Meta | None
@@ -415,6 +506,20 @@ class Value(Result, ABC):
             NotImplementedException.new([], interpreter, meta)
         ), meta, interpreter.path)
 
+    def hash_key(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> "Hashable | BLError":
+        """Return the Python object standing for the value in hash tables"""
+        try:
+            hash(self)
+        except TypeError:
+            return BLError(cast_to_instance(
+                IncorrectTypeException.new(
+                    [String("Value is not hashable")], interpreter, meta
+                )
+            ), meta, interpreter.path)
+        return self
+
     def dump(
         self, interpreter: "ASTInterpreter", meta: Meta | None
     ) -> "String | BLError":
@@ -432,6 +537,8 @@ class Value(Result, ABC):
 class PythonValue(Value):
     """Python value wrapper"""
 
+    __slots__ = ("value",)
+
     value: object
 
     @override
@@ -445,6 +552,8 @@ class PythonValue(Value):
 class Bool(Value):
     """Boolean type"""
 
+    __slots__ = ("value",)
+
     value: bool
 
     @override
@@ -469,6 +578,8 @@ BOOLS = FALSE, TRUE
 class Null(Value):
     """Null value"""
 
+    __slots__ = ()
+
     @override
     def to_bool(
         self, interpreter: "ASTInterpreter", meta: Meta | None
@@ -496,7 +607,7 @@ class Call:
     path: str | None
 
 
-@dataclass
+@dataclass(slots=True)
 class PythonFunction(Value):
     """Python function wrapper type"""
 
@@ -521,7 +632,34 @@ class PythonFunction(Value):
         return String(f"<python function {self.function!r}>")
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
+class FunctionCode:
+    """Execution state shared by the functions made from one definition
+    (closures, bound methods, ...)
+
+    The body is interpreted until the functions have been called
+    tier_threshold times, then compiled (see visit_call_body)."""
+
+    # Function statement or literal the functions are made from
+    definition: "FunctionStmt | FunctionLiteral | None" = None
+    calls: int = 0
+    compiled: "Callable[[ASTInterpreter], Result] | None" = None
+    # Annotated arguments, checked on each call: their indices, types and
+    # descriptions
+    checks: tuple[tuple[int, str, str], ...] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.checks = () if self.definition is None else tuple(
+            (i, str(annotation.name), f"argument '{name}'")
+            for i, (name, annotation) in enumerate(zip(
+                self.definition.form_args.args,
+                self.definition.form_args.annotations,
+            ))
+            if annotation is not None
+        )
+
+
+@dataclass(slots=True)
 class BLFunction(Value):
     """baba-lang function type"""
 
@@ -530,12 +668,17 @@ class BLFunction(Value):
     body: Body
     env: "Env | None" = None
     this: "Instance | None" = None
+    code: FunctionCode = field(default_factory=FunctionCode)
 
     @override
     def call(
         self, args: list[Value], interpreter: "ASTInterpreter",
         meta: Meta | None
     ) -> ExpressionResult:
+        if len(interpreter.traceback) > interpreter.max_depth:
+            return BLError(cast_to_instance(RecursionDepthException.new(
+                [String("Maximum call depth exceeded")], interpreter, meta
+            )), meta, interpreter.path)
         # Add the function to the "call stack"
         interpreter.traceback.append(Call(self, meta, interpreter.path))
         # Create an environment (call frame)
@@ -547,22 +690,31 @@ class BLFunction(Value):
             for farg, arg in zip(form_args, args, strict=True):
                 env.new_var(farg, arg)
         except ValueError:
+            interpreter.traceback.pop()
             return BLError(cast_to_instance(
                 IncorrectTypeException.new([], interpreter, meta)
             ), meta, interpreter.path)
+        for i, type_, what in self.code.checks:
+            if (error := interpreter.check_type(
+                args[i], type_, what, meta
+            )) is not None:
+                interpreter.traceback.pop()
+                return error
         # If function is bound to an object, add that object
         if self.this is not None:
             env.new_var("this", self.this)
         # Run the body
         interpreter.locals = env
-        res = interpreter.visit_stmt(self.body)
+        res = interpreter.visit_call_body(self.body, self.code, meta)
         # Clean it up
         interpreter.locals = old_env
-        # Return!
         if isinstance(res, BLError):
-            return res
+            res.capture_traceback(interpreter.traceback)
         interpreter.traceback.pop()
+        # Return!
         match res:
+            case BLError():
+                return res
             case Success():
                 return NULL
             case Return(value=value):
@@ -576,7 +728,7 @@ class BLFunction(Value):
     def bind(self, this: "Instance") -> "BLFunction":
         """Return a version of BLFunction bound to an object"""
         return BLFunction(
-            self.name, self.form_args, self.body, self.env, this
+            self.name, self.form_args, self.body, self.env, this, self.code
         )
 
     @override
@@ -592,33 +744,139 @@ class BLFunction(Value):
 # section OOP
 
 
-@dataclass(init=False)
+# Methods overloading in-place binary operators
+INPLACE_METHODS = {
+    "+": "__iadd__", "-": "__isub__", "*": "__imul__", "/": "__idiv__",
+    "%/%": "__ifloordiv__", "%": "__imod__", "**": "__ipow__",
+    "&": "__iand__", "|": "__ior__", "^": "__ixor__", "<<": "__ilshift__",
+    ">>": "__irshift__",
+}
+
+
+@dataclass(init=False, eq=False)
 class Instance(Value):
-    """baba-lang instance"""
+    """baba-lang instance
+
+    Attribute values are stored in a list laid out by the shape of the
+    instance (see shapes), or in a dict for instances in dictionary mode,
+    which have no shape. Built-in values rarely get any attributes, so they
+    all share an empty tuple until they do."""
 
     # pylint: disable=too-many-public-methods
 
     __match_args__ = ("class_", "vars_")
+    __slots__ = ("class_", "_shape", "_slots")
 
     class_: "Class"
-    vars: dict[str, Value]
+    _shape: Shape | None
+    # Values may be MISSING while the constructor runs (see Class)
+    _slots: (
+        list["Value | Missing"] | dict[str, "Value | Missing"] | tuple[()]
+    )
 
-    def __init__(self, class_: "Class", vars_: dict[str, Value]):
+    def __init__(
+        self, class_: "Class", vars_: dict[str, Value] | None = None
+    ) -> None:
         self.class_ = class_
-        self.vars = vars_
+        self._shape = EMPTY_SHAPE
+        self._slots = ()
+        if vars_:
+            for name, value in vars_.items():
+                self.set_own_attr(name, value)
+
+    @property
+    def vars(self) -> "InstanceVars":
+        """Attributes of the instance, as a mapping"""
+        return InstanceVars(self)
+
+    def get_own_attr(self, attr: str) -> "Value | Missing":
+        """Get an attribute of the instance itself (not of its class), or
+        MISSING if there is none"""
+        if (shape := self._shape) is None:
+            return cast(dict, self._slots).get(attr, MISSING)
+        if (i := shape.index.get(attr)) is None:
+            return MISSING
+        return cast(list, self._slots)[i]
+
+    def set_own_attr(self, attr: str, value: "Value | Missing") -> None:
+        """Set an attribute of the instance itself"""
+        if (shape := self._shape) is None:
+            cast(dict, self._slots)[attr] = value
+            return
+        if (i := shape.index.get(attr)) is not None:
+            cast(list, self._slots)[i] = value
+            return
+        match new_shape := shape.with_attr(attr):
+            case None:
+                self._to_dict_mode()
+                cast(dict, self._slots)[attr] = value
+            case _ if self._slots:
+                cast(list, self._slots).append(value)
+                self._shape = new_shape
+            case _:
+                self._slots = [value]
+                self._shape = new_shape
+
+    def del_own_attr(self, attr: str) -> bool:
+        """Remove an attribute of the instance itself, returning whether
+        there was one"""
+        if self.get_own_attr(attr) is MISSING:
+            return False
+        # Shapes only ever grow, so removal takes dictionary mode
+        self._to_dict_mode()
+        del cast(dict, self._slots)[attr]
+        return True
+
+    def own_attrs(self) -> "Iterator[tuple[str, Value | Missing]]":
+        """Iterate over the names and values of the attributes of the
+        instance itself"""
+        if (shape := self._shape) is None:
+            return iter(cast(dict, self._slots).items())
+        return zip(shape.names, self._slots)
+
+    def _to_dict_mode(self) -> None:
+        if self._shape is not None:
+            self._slots = dict(self.own_attrs())
+            self._shape = None
+
+    @override
+    def hash_key(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> "Hashable | BLError":
+        # Instances are hashed by identity unless __hash__ is overloaded
+        from .numbers import Int  # pylint: disable=import-outside-toplevel
+        match res := self._call_method_if_exists(
+            "__hash__", [], interpreter, meta
+        ):
+            case Missing():
+                return self
+            case Int(value):
+                return HashKey(self, value, interpreter)
+            case BLError():
+                return res
+        return BLError(cast_to_instance(
+            IncorrectTypeException.new(
+                [String("__hash__ must return an integer")], interpreter, meta
+            )
+        ), meta, interpreter.path)
+
+    def lookup_attr(self, attr: str) -> "Value | Missing":
+        """Look an attribute up, binding methods, and return MISSING if there
+        is none"""
+        if (res := self.get_own_attr(attr)) is not MISSING:
+            return res
+        match res := self.class_.lookup_attr(attr):
+            case SupportsBLCall():
+                return res.bind(self)
+        return res
 
     @override
     def get_attr(
         self, attr: str, interpreter: "ASTInterpreter", meta: Meta | None
     ) -> ExpressionResult:
-        try:
-            return self.vars[attr]
-        except KeyError:
-            match res := self.class_.get_attr(attr, interpreter, meta):
-                case SupportsBLCall():
-                    return res.bind(self)
-                case _:
-                    return res
+        if (res := self.lookup_attr(attr)) is MISSING:
+            return attr_not_found(interpreter, meta)
+        return res
 
     @override
     def set_attr(
@@ -629,10 +887,24 @@ class Instance(Value):
             case BLError():
                 return value
             case Value():
-                self.vars[attr] = value
+                self.set_own_attr(attr, value)
                 return value
         return super().set_attr(attr, value, interpreter, meta)
 
+    @override
+    def inplace_op(
+        self, op: str, other: "Value",
+        interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> ExpressionResult:
+        # Without an in-place method, fall back to the binary operator
+        if (name := INPLACE_METHODS.get(op)) is not None:
+            res = self._call_method_if_exists(
+                name, [other], interpreter, meta
+            )
+            if res is not MISSING:
+                return res
+        return super().inplace_op(op, other, interpreter, meta)
+
     @override
     def add(
         self, other: "Value", interpreter: "ASTInterpreter",
@@ -741,6 +1013,15 @@ class Instance(Value):
             other, interpreter, meta
         )
 
+    @override
+    def contains(
+        self, item: "Value", interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        return self._overloaded_binary_op("__contains__", "contains")(
+            item, interpreter, meta
+        )
+
     @override
     def is_equal(
         self, other: "Value", interpreter: "ASTInterpreter",
@@ -821,6 +1102,18 @@ class Instance(Value):
             index, interpreter, meta
         )
 
+    @override
+    def get_slice(
+        self, start: "Value", stop: "Value", step: "Value",
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult:
+        res = self._call_method_if_exists(
+            "__getslice__", [start, stop, step], interpreter, meta
+        )
+        if res is MISSING:
+            return super().get_slice(start, stop, step, interpreter, meta)
+        return res
+
     @override
     def set_item(
         self, index: "Value", value: "Value",
@@ -833,11 +1126,8 @@ class Instance(Value):
         res = self._call_method_if_exists(
             "__setitem__", [index, value], interpreter, meta
         )
-        if isinstance(res, BLError):
-            if res.value.class_ == AttrNotFoundException:
-                return super().set_item(
-                    index, value, interpreter, meta
-                )
+        if res is MISSING:
+            return super().set_item(index, value, interpreter, meta)
         return res
 
     @override
@@ -889,12 +1179,10 @@ class Instance(Value):
             interpreter: "ASTInterpreter", meta: Meta | None
         ) -> ExpressionResult:
             res = self._call_method_if_exists(name, [], interpreter, meta)
+            if res is MISSING:
+                return getattr(Value, fallback_name)(self, interpreter, meta)
             if not isinstance(res, expected_type):
                 if isinstance(res, BLError):
-                    if res.value.class_ == AttrNotFoundException:
-                        return getattr(Value, fallback_name)(
-                            self, interpreter, meta
-                        )
                     return res
                 return BLError(cast_to_instance(
                     IncorrectTypeException.new([], interpreter, meta)
@@ -912,11 +1200,10 @@ class Instance(Value):
             res = self._call_method_if_exists(
                 name, [other], interpreter, meta
             )
-            if isinstance(res, BLError):
-                if res.value.class_ == AttrNotFoundException:
-                    return getattr(Value, fallback_name)(
-                        self, other, interpreter, meta
-                    )
+            if res is MISSING:
+                return getattr(Value, fallback_name)(
+                    self, other, interpreter, meta
+                )
             return res
         return _wrapper
 
@@ -925,68 +1212,259 @@ class Instance(Value):
             interpreter: "ASTInterpreter", meta: Meta | None
         ) -> ExpressionResult:
             res = self._call_method_if_exists(name, [], interpreter, meta)
-            if isinstance(res, BLError):
-                if res.value.class_ == AttrNotFoundException:
-                    return getattr(Value, fallback_name)(
-                        self, interpreter, meta
-                    )
+            if res is MISSING:
+                return getattr(Value, fallback_name)(self, interpreter, meta)
             return res
         return _wrapper
 
     def _call_method_if_exists(
         self, name: str, args: list[Value], interpreter: "ASTInterpreter",
         meta: Meta | None
-    ) -> ExpressionResult:
-        res = self.get_attr(name, interpreter, meta)
+    ) -> "ExpressionResult | Missing":
+        res = self.lookup_attr(name)
         if isinstance(res, SupportsBLCall):
             return res.bind(self).call(args, interpreter, meta)
         return res
 
 
-@dataclass
+class Record(Instance):
+    """Instance of a class with declared fields
+
+    Fields are stored in a list of fixed size, set to null until assigned.
+    Other attributes can't be assigned by scripts. Built-in classes may
+    still set their own (e.g. the message of an exception), which puts the
+    record in dictionary mode."""
+
+    __slots__ = ()
+
+    def __init__(self, class_: "Class", shape: Shape) -> None:
+        super().__init__(class_)
+        self._shape = shape
+        self._slots = [NULL] * len(shape.names)
+
+    @override
+    def set_own_attr(self, attr: str, value: "Value | Missing") -> None:
+        if (
+            (shape := self._shape) is not None
+            and (i := shape.index.get(attr)) is not None
+        ):
+            cast(list, self._slots)[i] = value
+            return
+        self._to_dict_mode()
+        cast(dict, self._slots)[attr] = value
+
+    @override
+    def del_own_attr(self, attr: str) -> bool:
+        # Fields can't be removed
+        return False
+
+    @override
+    def set_attr(
+        self, attr: str, value: "Value",
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult:
+        # pylint: disable=protected-access
+        if attr not in cast(Shape, self.class_._fields_shape).index:
+            return BLError(cast_to_instance(AttrNotFoundException.new(
+                [String(
+                    f"Class {self.class_.name.value} has no field '{attr}'"
+                )],
+                interpreter, meta,
+            )), meta, interpreter.path)
+        return super().set_attr(attr, value, interpreter, meta)
+
+
+class InstanceVars(MutableMapping[str, Value]):
+    """Mapping view of the attributes of an instance itself"""
+
+    __slots__ = ("instance",)
+
+    instance: Instance
+
+    def __init__(self, instance: Instance) -> None:
+        self.instance = instance
+
+    def __getitem__(self, name: str) -> Value:
+        if (value := self.instance.get_own_attr(name)) is MISSING:
+            raise KeyError(name)
+        return cast(Value, value)
+
+    def __setitem__(self, name: str, value: Value) -> None:
+        self.instance.set_own_attr(name, value)
+
+    def __delitem__(self, name: str) -> None:
+        if not self.instance.del_own_attr(name):
+            raise KeyError(name)
+
+    def __iter__(self) -> Iterator[str]:
+        return (
+            name for name, value in self.instance.own_attrs()
+            if value is not MISSING
+        )
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class HashKey:
+    """Hash table key standing for an instance overloading __hash__
+
+    Python calls __eq__ on hash collisions, which is delegated to the
+    baba-lang equality of the instance. Errors raised by it can't be returned
+    from there, so they are raised as a HashKeyError instead."""
+
+    __slots__ = ("value", "hash", "interpreter")
+
+    value: Instance
+    hash: int
+    interpreter: "ASTInterpreter"
+
+    def __init__(
+        self, value: Instance, hash_: int, interpreter: "ASTInterpreter"
+    ) -> None:
+        self.value = value
+        self.hash = hash_
+        self.interpreter = interpreter
+
+    def __hash__(self) -> int:
+        return self.hash
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, HashKey):
+            other = other.value
+        if not isinstance(other, Value):
+            return NotImplemented
+        res = self.value.is_equal(other, self.interpreter, None)
+        if isinstance(res, BLError):
+            raise HashKeyError(res)
+        return isinstance(res, Bool) and res.value
+
+
+class HashKeyError(Exception):
+    """Error raised by the equality of a HashKey"""
+
+    error: BLError
+
+    def __init__(self, error: BLError) -> None:
+        super().__init__(error)
+        self.error = error
+
+
+@dataclass(eq=False)
 class Class(Value):
-    """baba-lang class"""
+    """baba-lang class
+
+    Classes can't be changed once created, so each caches its constructor.
+    It also remembers the shape its constructor left the last instance in,
+    and starts new instances in that shape, with MISSING placeholders, so
+    that they don't have to go through the shape transitions one attribute
+    at a time. Placeholders left unassigned are removed once the
+    constructor returns.
+
+    Classes declaring their fields (with fields statements, or inherited)
+    skip all that: their instances are Records laid out by a fixed shape."""
 
     name: "String"
     super: "Class | None" = None
     vars: dict[str, Value] = field(default_factory=dict)
+    fields: tuple[str, ...] | None = None
+    _constructor: "SupportsBLCall | Missing | None" = field(
+        default=None, init=False, repr=False
+    )
+    _init_shape: Shape = field(default=EMPTY_SHAPE, init=False, repr=False)
+    _fields_shape: Shape | None = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.fields is not None:
+            # Outside of the shape tree, records never change shape
+            self._fields_shape = Shape(self.fields)
+
+    def lookup_attr(self, attr: str) -> "Value | Missing":
+        """Look an attribute up in the class and its superclasses, returning
+        MISSING if there is none"""
+        class_: Class | None = self
+        while class_ is not None:
+            try:
+                return class_.vars[attr]
+            except KeyError:
+                class_ = class_.super
+        return MISSING
+
+    def has_attr(self, attr: str) -> bool:
+        """Check if the class or one of its superclasses has an attribute"""
+        return self.lookup_attr(attr) is not MISSING
 
     @override
     def get_attr(
         self, attr: str, interpreter: "ASTInterpreter", meta: Meta | None
     ) -> ExpressionResult:
-        try:
-            return self.vars[attr]
-        except KeyError:
-            if self.super is not None:
-                return self.super.get_attr(attr, interpreter, meta)
-            return BLError(cast_to_instance(
-                AttrNotFoundException.new([], interpreter, meta)
-            ), meta, interpreter.path)
-
-    def has_attr(self, attr: str) -> bool:
-        """Check if a class has an attribute"""
-        if attr in self.vars:
-            return True
-        if self.super is not None:
-            return self.super.has_attr(attr)
-        return False
+        if (res := self.lookup_attr(attr)) is MISSING:
+            return attr_not_found(interpreter, meta)
+        return res
 
     @override
     def new(
         self, args: list[Value], interpreter: "ASTInterpreter",
         meta: Meta | None
     ) -> ExpressionResult:
-        inst = Instance(self, {})
-        if self.has_attr("__init__"):  # __init__ is the constructor method
-            constr = inst.get_attr("__init__", interpreter, meta)
-            if isinstance(constr, BLError):
-                return constr
-            match res := constr.call(args, interpreter, meta):
-                case BLError():
-                    return res
+        if (constr := self._constructor) is None:
+            # __init__ is the constructor method
+            match constr := self.lookup_attr("__init__"):
+                case Missing() | SupportsBLCall():
+                    self._constructor = constr
+                case _:
+                    return constr.call(args, interpreter, meta)
+        if (fields_shape := self._fields_shape) is not None:
+            return self._new_record(
+                fields_shape, constr, args, interpreter, meta
+            )
+        inst = Instance(self)
+        if constr is MISSING:
+            return inst
+        # pylint: disable=protected-access
+        if (shape := self._init_shape).names:
+            inst._shape = shape
+            inst._slots = [MISSING] * len(shape.names)
+        res = cast(SupportsBLCall, constr).bind(inst).call(
+            args, interpreter, meta
+        )
+        if isinstance(res, BLError):
+            return res
+        self._learn_shape(inst)
         return inst
 
+    def _new_record(
+        self, shape: Shape, constr: "SupportsBLCall | Missing",
+        args: list[Value], interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> ExpressionResult:
+        inst = Record(self, shape)
+        if constr is MISSING:
+            return inst
+        res = cast(SupportsBLCall, constr).bind(inst).call(
+            args, interpreter, meta
+        )
+        if isinstance(res, BLError):
+            return res
+        return inst
+
+    def _learn_shape(self, inst: "Instance") -> None:
+        """Remove the placeholders left in a new instance, and remember the
+        shape it ends up in"""
+        # pylint: disable=protected-access
+        unassigned = any(value is MISSING for _, value in inst.own_attrs())
+        if inst._shape is self._init_shape and not unassigned:
+            return
+        if unassigned:
+            attrs = [
+                (name, value) for name, value in inst.own_attrs()
+                if value is not MISSING
+            ]
+            inst._shape = EMPTY_SHAPE
+            inst._slots = ()
+            for name, value in attrs:
+                inst.set_own_attr(name, value)
+        self._init_shape = inst._shape or EMPTY_SHAPE
+
     @override
     def dump(
         self, interpreter: "ASTInterpreter", meta: Meta | None
@@ -998,15 +1476,48 @@ class Class(Value):
 
 
 class String(Instance):
-    """String type"""
+    """String type
+
+    Strings are immutable and have no attributes of their own, so one String
+    can safely be shared, e.g. by all evaluations of a literal."""
 
     __match_args__ = ("value",)
+    __slots__ = ("value", "_hash")
+
+    # Shared by all strings, class_ is set once StringClass exists
+    _shape = EMPTY_SHAPE
+    _slots = ()
 
     value: str
+    _hash: int | None
 
     def __init__(self, value: str) -> None:
-        super().__init__(StringClass, {})
+        # pylint: disable=super-init-not-called
         self.value = value
+        self._hash = None
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, String):
+            return self.value == other.value
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(self.value)
+        return self._hash
+
+    @override
+    def hash_key(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> Self:
+        return self
+
+    @override
+    def set_attr(
+        self, attr: str, value: "Value",
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult:
+        return Value.set_attr(self, attr, value, interpreter, meta)
 
     @override
     def add(
@@ -1079,6 +1590,18 @@ class String(Instance):
                 return BOOLS[self.value >= other_val]
         return super().is_greater_or_equal(other, interpreter, meta)
 
+    @override
+    def contains(
+        self, item: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> Bool | BLError:
+        match item:
+            case String(item_val):
+                return BOOLS[item_val in self.value]
+        return BLError(cast_to_instance(
+            IncorrectTypeException.new([], interpreter, meta)
+        ), meta, interpreter.path)
+
     @override
     def get_item(
         self, index: Value, interpreter: "ASTInterpreter",
@@ -1090,6 +1613,18 @@ class String(Instance):
                 return String(self.value[other_val])
         return super().get_item(index, interpreter, meta)
 
+    @override
+    def get_slice(
+        self, start: Value, stop: Value, step: Value,
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult:
+        from .colls import py_slice  # pylint: disable=import-outside-toplevel
+        if (slice_ := py_slice(start, stop, step)) is None:
+            return BLError(cast_to_instance(
+                IncorrectTypeException.new([], interpreter, meta)
+            ), meta, interpreter.path)
+        return String(self.value[slice_])
+
     @override
     def to_bool(
         self, interpreter: "ASTInterpreter", meta: Meta | None
@@ -1115,6 +1650,14 @@ class String(Instance):
         from .numbers import Int  # pylint: disable=import-outside-toplevel
         return Int(len(self.value))
 
+    def encode(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /, *args
+    ) -> ExpressionResult:
+        """Encode the string to bytes"""
+        # pylint: disable=import-outside-toplevel
+        from .binary import encode
+        return encode(meta, interpreter, self, *args)
+
 
 # section Classes
 
@@ -1139,6 +1682,9 @@ StringClass = Class(cast(String, None), None, {
     "__eq__": PythonFunction(
         lambda meta, intp, /, this, other, *_: this.is_equal(other, intp, meta)
     ),
+    "__contains__": PythonFunction(
+        lambda meta, intp, /, this, item, *_: this.contains(item, intp, meta)
+    ),
     "__lt__": PythonFunction(
         lambda meta, intp, /, this, other, *_: this.is_less(other, intp, meta)
     ),
@@ -1162,10 +1708,14 @@ StringClass = Class(cast(String, None), None, {
     ),
     "length": PythonFunction(
         lambda meta, intp, /, this, *_: this.length(intp, meta)
-    )
+    ),
+    "encode": PythonFunction(
+        lambda meta, intp, /, this, *args: this.encode(meta, intp, *args)
+    ),
 })
 
 StringClass.super = ObjectClass
+String.class_ = StringClass
 ObjectClass.name = String("Object")
 StringClass.name = String("String")
 
@@ -1216,6 +1766,9 @@ VarNotFoundException = Class(String("VarNotFoundException"), ExceptionClass)
 IncorrectTypeException = Class(
     String("IncorrectTypeException"), ExceptionClass
 )
+RecursionDepthException = Class(
+    String("RecursionDepthException"), ExceptionClass
+)
 
 
 # section Environment
@@ -1251,29 +1804,35 @@ class Env:
 
     def get_var(self, name: str, meta: Meta | None) -> ExpressionResult:
         """Retrieve the value of a variable"""
-        resolve_result = self.resolve_var(name, meta)
-        match resolve_result:
-            case Var(value=value):
-                return value
-            case BLError():
-                return resolve_result
+        if (var := self.lookup_var(name)) is MISSING:
+            return self.var_not_found(meta)
+        return var.value
 
     def set_var(self, name: str, value: Value, meta: Meta | None
                 ) -> BLError | None:
         """Assign to an existing variable name"""
-        resolve_result = self.resolve_var(name, meta)
-        match resolve_result:
-            case Var():
-                resolve_result.value = value
-            case BLError():
-                return resolve_result
+        if (var := self.lookup_var(name)) is MISSING:
+            return self.var_not_found(meta)
+        var.value = value
+        return None
 
     def resolve_var(self, name: str, meta: Meta | None) -> Var | BLError:
         """Resolve a variable name"""
-        if name in self.vars:
-            return self.vars[name]
-        if self.parent is not None:
-            return self.parent.resolve_var(name, meta)
+        if (var := self.lookup_var(name)) is MISSING:
+            return self.var_not_found(meta)
+        return var
+
+    def lookup_var(self, name: str) -> Var | Missing:
+        """Resolve a variable name, returning MISSING if it is not bound"""
+        env: Env | None = self
+        while env is not None:
+            if (var := env.vars.get(name)) is not None:
+                return var
+            env = env.parent
+        return MISSING
+
+    def var_not_found(self, meta: Meta | None) -> BLError:
+        """Error for a variable not bound in the environment"""
         return BLError(cast_to_instance(
             VarNotFoundException.new([], self.interpreter, meta)
         ), meta, self.interpreter.path)
@@ -1281,3 +1840,69 @@ class Env:
     def copy(self) -> "Env":
         """Copy the environment (for capturing variables in closures)"""
         return Env(self.interpreter, self.vars.copy(), self.parent)
+
+
+class GlobalEnv(Env):
+    """Environment of global variables, or of the module or class being
+    defined on top of them
+
+    Global environments are never captured by closures, so assigning to an
+    existing variable can update its Var in place. Only adding variables
+    makes a previously resolved Var stale, so the chain of global
+    environments shares a version number that changes when that happens,
+    letting Var nodes cache the Var they resolved to (see
+    ASTInterpreter.visit_var)."""
+
+    root: "GlobalEnv"
+    version: int
+
+    def __init__(
+        self, interpreter: "ASTInterpreter",
+        vars_: dict[str, Var] | None = None, parent: "Env | None" = None,
+    ):
+        super().__init__(interpreter, vars_, parent)
+        self.root = parent.root if isinstance(parent, GlobalEnv) else self
+        self.version = 0
+
+    @override
+    def new_var(self, name: str, value: Value) -> None:
+        if (var := self.vars.get(name)) is not None:
+            var.value = value
+            return
+        self.vars[name] = Var(value)
+        self.root.version += 1
+
+    @override
+    def set_var(self, name: str, value: Value, meta: Meta | None
+                ) -> BLError | None:
+        env: Env | None = self
+        while env is not None:
+            if (var := env.vars.get(name)) is not None:
+                if isinstance(env, BuiltinsEnv):
+                    # Copy on write
+                    self.root.new_var(name, value)
+                else:
+                    var.value = value
+                return None
+            env = env.parent
+        return self.var_not_found(meta)
+
+
+class BuiltinsEnv(Env):
+    """Read-only environment of built-in variables, shared by all
+    interpreters
+
+    The global environments of interpreters chain to it, so creating one
+    doesn't have to populate it with built-ins. Assigning a built-in
+    variable binds a global variable of the same name instead."""
+
+    def __init__(self, vars_: dict[str, Value]) -> None:
+        # Not tied to any interpreter, lookups never start from here
+        super().__init__(
+            cast("ASTInterpreter", None),
+            {name: Var(value) for name, value in vars_.items()},
+        )
+
+    @override
+    def new_var(self, name: str, value: Value) -> None:
+        raise TypeError("built-in variables are read-only")
@@ -8,12 +8,17 @@ until it returns null. The for loop has to check for other types too, but
 that's about it"""
 
 
-from typing import TYPE_CHECKING, cast
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, cast, override
 from dataclasses import dataclass
 
 from lark.tree import Meta
 
-from .essentials import Value, String, Class, ObjectClass, Instance
+from .essentials import (
+    Value, String, Class, ObjectClass, Instance, PythonFunction, Null, NULL,
+    BLError, ExceptionClass, cast_to_instance,
+)
+from .shapes import EMPTY_SHAPE
 
 if TYPE_CHECKING:
     from ..main import ASTInterpreter
@@ -21,15 +26,66 @@ if TYPE_CHECKING:
 
 ItemClass = Class(String("Item"), ObjectClass, {})
 ItemClass.new = lambda args, interpreter, meta: Item(args[0])
+ITEM_SHAPE = EMPTY_SHAPE.with_attr("value")
 
 
-@dataclass(init=False)
+@dataclass(init=False, eq=False)
 class Item(Instance):
     """Iterator item"""
 
+    __match_args__ = ("value",)
+    __slots__ = ()
+
     def __init__(self, value: Value) -> None:
-        super().__init__(ItemClass, {"value": value})
+        super().__init__(ItemClass)
+        self._shape = ITEM_SHAPE
+        self._slots = [value]
+
+    @property
+    def value(self) -> Value:
+        """The value of the item, unless reassigned to something else"""
+        return cast(Value, self.get_own_attr("value"))
 
     def dump(self, interpreter: "ASTInterpreter", meta: Meta | None) -> String:
         value = cast(Value, self.get_attr("value", interpreter, meta))
         return String(f"<item: {value.dump(interpreter, meta)}>")
+
+
+PythonIteratorClass = Class(String("PythonIterator"), ObjectClass, {
+    "next": PythonFunction(
+        lambda meta, intp, /, this, *_: this.next(intp, meta)
+    ),
+})
+
+
+class PythonIterator(Instance):
+    """Iterator driven by a Python iterator, for native collections"""
+
+    __slots__ = ("iterator",)
+
+    iterator: Iterator[Value]
+
+    def __init__(self, iterator: Iterator[Value]) -> None:
+        super().__init__(PythonIteratorClass)
+        self.iterator = iterator
+
+    @override
+    def next(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> Item | Null | BLError:
+        try:
+            return Item(next(self.iterator))
+        except StopIteration:
+            return NULL
+        except RuntimeError as e:
+            # Raised by Python collections changed in size while iterated
+            return BLError(cast_to_instance(
+                CollectionChangedException.new(
+                    [String(str(e))], interpreter, meta
+                )
+            ), meta, interpreter.path)
+
+
+CollectionChangedException = Class(
+    String("CollectionChangedException"), ExceptionClass
+)
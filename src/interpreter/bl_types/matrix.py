@@ -0,0 +1,632 @@
+"""Matrix type
+
+Matrices keep their elements unboxed in a flat Python list, together with a
+shape, strides and an offset into that list. Rows, columns and transposes
+are therefore views sharing the storage of the matrix they come from, like in
+NumPy. Kernels work on whole rows at a time instead of element by element,
+and matrix multiplication is delegated to NumPy when it is installed."""
+
+
+import importlib.util
+import operator
+from collections.abc import Callable
+from itertools import repeat
+from math import sumprod
+from typing import TYPE_CHECKING, override
+
+from lark.tree import Meta
+
+from .essentials import (
+    ExpressionResult, Value, BLError, String, Bool, BOOLS, Null, NULL, Class,
+    PythonFunction, Instance, ObjectClass, ExceptionClass,
+    IncorrectTypeException, new_error,
+)
+from .numbers import Int, Float, DivByZeroException
+from .colls import (
+    BLList, ListIteratorClass, OutOfRangeException, py_slice,
+)
+
+if TYPE_CHECKING:
+    from ..main import ASTInterpreter
+
+if importlib.util.find_spec("numpy"):
+    # pylint: disable = import-error
+    import numpy
+else:
+    numpy = None  # pylint: disable=invalid-name
+
+
+type Number = int | float
+type Rows = list[list[Number]]
+
+
+# Helpers
+
+
+def _box(x: Number) -> Int | Float:
+    """Box a raw Python number"""
+    if isinstance(x, int):
+        return Int(x)
+    return Float(float(x))
+
+
+def _unbox_list(values: list[Value]) -> list[Number] | None:
+    """Unbox a list of baba-lang numbers, or return None if one of them
+    is not a number"""
+    res = []
+    for v in values:
+        match v:
+            case Int(value=x) | Float(value=x):
+                res.append(x)
+            case _:
+                return None
+    return res
+
+
+def _broadcast_rows(rows: Rows, n_rows: int, n_cols: int) -> Rows:
+    """Stretch a list of rows with size-1 dimensions to n_rows x n_cols"""
+    if len(rows) == 1 and n_rows != 1:
+        rows = rows * n_rows
+    if rows and len(rows[0]) == 1 and n_cols != 1:
+        rows = [row * n_cols for row in rows]
+    return rows
+
+
+def _matmul_rows(a_rows: Rows, b_cols: Rows) -> Rows:
+    """Multiply matrices given as rows of the left operand and columns of
+    the right operand"""
+    # NumPy integers are fixed-width, so only hand floats over
+    if numpy is not None and all(
+        isinstance(x, float) for rows in (a_rows, b_cols)
+        for row in rows for x in row
+    ):
+        return (numpy.array(a_rows) @ numpy.array(b_cols).T).tolist()
+    return [[sumprod(row, col) for col in b_cols] for row in a_rows]
+
+
+def _strided(start: int, n: int, step: int) -> slice:
+    """Slice of the storage holding n elements from start, step apart"""
+    stop = start + n * step
+    # A negative stop would wrap around instead of running to the beginning
+    return slice(start, stop if stop >= 0 else None, step)
+
+
+def _normalize_index(i: int, n: int) -> int | None:
+    """Normalize a possibly negative index, or return None if it is out of
+    range"""
+    if -n <= i < n:
+        return i % n
+    return None
+
+
+def _shape_error(
+    interpreter: "ASTInterpreter", meta: Meta | None, msg: str
+) -> BLError:
+    return new_error(ShapeMismatchException, interpreter, meta, msg)
+
+
+# Matrix
+
+
+def matrix_new(
+    args: list[Value], interpreter: "ASTInterpreter", meta: Meta | None
+) -> ExpressionResult:
+    """Create a new matrix from a list of numbers or a list of rows"""
+    match args:
+        case [Matrix() as arg]:
+            return arg
+        case [BLList(elems=[BLList(), *_] as rows)]:
+            unboxed_rows = []
+            for row in rows:
+                if not isinstance(row, BLList):
+                    break
+                unboxed = _unbox_list(row.elems)
+                if unboxed is None:
+                    break
+                unboxed_rows.append(unboxed)
+            else:
+                if any(len(r) != len(unboxed_rows[0]) for r in unboxed_rows):
+                    return _shape_error(
+                        interpreter, meta, "Rows have different lengths"
+                    )
+                return Matrix.from_rows(unboxed_rows)
+        case [BLList(elems=elems)]:
+            unboxed = _unbox_list(elems)
+            if unboxed is not None:
+                return Matrix(unboxed, (len(unboxed),))
+    return new_error(IncorrectTypeException, interpreter, meta)
+
+
+def matrix_full(
+    meta: Meta | None, interpreter: "ASTInterpreter", this: Instance | None,
+    /, n_rows: Value, n_cols: Value, fill: Value, *_
+) -> ExpressionResult:
+    """Create a matrix filled with the same number"""
+    # pylint: disable=unused-argument
+    match n_rows, n_cols, fill:
+        case Int(r), Int(c), Int(x) | Float(x) if r >= 0 and c >= 0:
+            return Matrix([x] * (r * c), (r, c))
+    return new_error(IncorrectTypeException, interpreter, meta)
+
+
+def matrix_identity(
+    meta: Meta | None, interpreter: "ASTInterpreter", this: Instance | None,
+    /, n: Value, *_
+) -> ExpressionResult:
+    """Create an identity matrix"""
+    # pylint: disable=unused-argument
+    match n:
+        case Int(size) if size >= 0:
+            data = [0] * (size * size)
+            data[::size + 1] = [1] * size
+            return Matrix(data, (size, size))
+    return new_error(IncorrectTypeException, interpreter, meta)
+
+
+MatrixClass = Class(String("Matrix"), ObjectClass, {
+    "zeros": PythonFunction(
+        lambda meta, intp, this, /, r, c, *_:
+        matrix_full(meta, intp, this, r, c, Int(0))
+    ),
+    "full": PythonFunction(matrix_full),
+    "identity": PythonFunction(matrix_identity),
+    "__getitem__": PythonFunction(
+        lambda meta, intp, /, this, index, *_: this.get_item(index, intp, meta)
+    ),
+    "__setitem__": PythonFunction(
+        lambda meta, intp, /, this, index, value, *_:
+        this.set_item(index, value, intp, meta)
+    ),
+    "__add__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.add(other, intp, meta)
+    ),
+    "__sub__": PythonFunction(
+        lambda meta, intp, /, this, other, *_:
+        this.subtract(other, intp, meta)
+    ),
+    "__mul__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.multiply(other, intp, meta)
+    ),
+    "__div__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.divide(other, intp, meta)
+    ),
+    "__neg__": PythonFunction(
+        lambda meta, intp, /, this, *_: this.neg(intp, meta)
+    ),
+    "__eq__": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.is_equal(other, intp, meta)
+    ),
+    "dump": PythonFunction(
+        lambda meta, intp, /, this, *_: this.dump(intp, meta)
+    ),
+    "length": PythonFunction(
+        lambda meta, intp, /, this, *_: Int(this.shape[0])
+    ),
+    "ndim": PythonFunction(
+        lambda meta, intp, /, this, *_: Int(len(this.shape))
+    ),
+    "shape": PythonFunction(
+        lambda meta, intp, /, this, *_: BLList([Int(n) for n in this.shape])
+    ),
+    "strides": PythonFunction(
+        lambda meta, intp, /, this, *_:
+        BLList([Int(s) for s in this.strides])
+    ),
+    "iter": PythonFunction(
+        lambda meta, intp, /, this, *_:
+        ListIteratorClass.new([this.to_list(meta, intp, False)], intp, meta)
+    ),
+    "get": PythonFunction(
+        lambda meta, intp, /, this, i, j, *_: this.get(meta, intp, i, j)
+    ),
+    "set": PythonFunction(
+        lambda meta, intp, /, this, i, j, value, *_:
+        this.set(meta, intp, i, j, value)
+    ),
+    "row": PythonFunction(
+        lambda meta, intp, /, this, i, *_: this.row(meta, intp, i)
+    ),
+    "col": PythonFunction(
+        lambda meta, intp, /, this, j, *_: this.col(meta, intp, j)
+    ),
+    "transpose": PythonFunction(
+        lambda meta, intp, /, this, *_: this.transpose()
+    ),
+    "copy": PythonFunction(
+        lambda meta, intp, /, this, *_: Matrix.from_rows(this.rows(), this.shape)
+    ),
+    "matmul": PythonFunction(
+        lambda meta, intp, /, this, other, *_: this.matmul(meta, intp, other)
+    ),
+    "sum": PythonFunction(
+        lambda meta, intp, /, this, axis=NULL, *_:
+        this.reduce(meta, intp, axis, sum)
+    ),
+    "mean": PythonFunction(
+        lambda meta, intp, /, this, axis=NULL, *_:
+        this.reduce(meta, intp, axis, lambda xs: sum(xs) / len(xs))
+    ),
+    "min": PythonFunction(
+        lambda meta, intp, /, this, axis=NULL, *_:
+        this.reduce(meta, intp, axis, min)
+    ),
+    "max": PythonFunction(
+        lambda meta, intp, /, this, axis=NULL, *_:
+        this.reduce(meta, intp, axis, max)
+    ),
+    "to_list": PythonFunction(
+        lambda meta, intp, /, this, *_: this.to_list(meta, intp)
+    ),
+})
+MatrixClass.new = matrix_new
+
+
+class Matrix(Instance):
+    """Matrix (or vector) of numbers
+
+    Only 1-D (vectors) and 2-D matrices are supported. Indexing a 2-D matrix
+    gives a row as a 1-D view, and indexing a 1-D matrix gives a number."""
+
+    __slots__ = ("data", "shape", "strides", "offset")
+
+    data: list[Number]
+    shape: tuple[int, ...]
+    strides: tuple[int, ...]
+    offset: int
+
+    def __init__(
+        self, data: list[Number], shape: tuple[int, ...],
+        strides: tuple[int, ...] | None = None, offset: int = 0,
+    ) -> None:
+        super().__init__(MatrixClass)
+        self.data = data
+        self.shape = shape
+        if strides is None:
+            strides = (max(shape[1], 1), 1) if len(shape) == 2 else (1,)
+        self.strides = strides
+        self.offset = offset
+
+    @classmethod
+    def from_rows(
+        cls, rows: Rows, shape: tuple[int, ...] | None = None
+    ) -> "Matrix":
+        """Create a contiguous matrix from a list of rows"""
+        if shape is None:
+            shape = (len(rows), len(rows[0]) if rows else 0)
+        if len(shape) == 1:
+            return cls(list(rows[0]), shape)
+        return cls([x for row in rows for x in row], shape)
+
+    def rows(self) -> Rows:
+        """Copy the rows out of the storage, one slice per row
+
+        A 1-D matrix has a single row"""
+        data, off = self.data, self.offset
+        if len(self.shape) == 1:
+            (n,), (s,) = self.shape, self.strides
+            return [data[_strided(off, n, s)]]
+        (n_rows, n_cols), (s0, s1) = self.shape, self.strides
+        return [
+            data[_strided(start, n_cols, s1)]
+            for start in range(off, off + n_rows * s0, s0)
+        ]
+
+    def cols(self) -> Rows:
+        """Copy the columns out of the storage"""
+        return self.transpose().rows()
+
+    @override
+    def get_item(
+        self, index: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        if not isinstance(index, Int):
+            return new_error(IncorrectTypeException, interpreter, meta)
+        i = _normalize_index(index.value, self.shape[0])
+        if i is None:
+            return new_error(OutOfRangeException, interpreter, meta)
+        pos = self.offset + i * self.strides[0]
+        if len(self.shape) == 1:
+            return _box(self.data[pos])
+        return Matrix(self.data, self.shape[1:], self.strides[1:], pos)
+
+    @override
+    def get_slice(
+        self, start: Value, stop: Value, step: Value,
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult:
+        # Slices along the first axis are views, like rows
+        if (slice_ := py_slice(start, stop, step)) is None:
+            return new_error(IncorrectTypeException, interpreter, meta)
+        indices = range(self.shape[0])[slice_]
+        s0, *strides = self.strides
+        return Matrix(
+            self.data, (len(indices), *self.shape[1:]),
+            (s0 * indices.step, *strides),
+            self.offset + indices.start * s0,
+        )
+
+    @override
+    def set_item(
+        self, index: Value, value: Value,
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult:
+        if not isinstance(index, Int):
+            return new_error(IncorrectTypeException, interpreter, meta)
+        i = _normalize_index(index.value, self.shape[0])
+        if i is None:
+            return new_error(OutOfRangeException, interpreter, meta)
+        pos = self.offset + i * self.strides[0]
+        if len(self.shape) == 1:
+            match value:
+                case Int(x) | Float(x):
+                    self.data[pos] = x
+                    return value
+            return new_error(IncorrectTypeException, interpreter, meta)
+        # Assign a whole row, broadcasting if needed
+        n, s = self.shape[1], self.strides[1]
+        match value:
+            case Int(x) | Float(x):
+                new_row = [x] * n
+            case BLList(elems=elems):
+                new_row = _unbox_list(elems)
+                if new_row is None:
+                    return new_error(IncorrectTypeException, interpreter, meta)
+            case Matrix(shape=(_,)):
+                new_row = value.rows()[0]
+            case _:
+                return new_error(IncorrectTypeException, interpreter, meta)
+        if len(new_row) != n:
+            return _shape_error(
+                interpreter, meta, f"Expected a row of length {n}"
+            )
+        self.data[_strided(pos, n, s)] = new_row
+        return value
+
+    def get(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        i: Value, j: Value, *_
+    ) -> ExpressionResult:
+        """Get an element of a 2-D matrix"""
+        pos = self._pos(i, j)
+        match pos:
+            case int():
+                return _box(self.data[pos])
+            case None:
+                return new_error(OutOfRangeException, interpreter, meta)
+        return new_error(IncorrectTypeException, interpreter, meta)
+
+    def set(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        i: Value, j: Value, value: Value, *_
+    ) -> ExpressionResult:
+        """Set an element of a 2-D matrix"""
+        pos = self._pos(i, j)
+        match pos, value:
+            case int(), Int(x) | Float(x):
+                self.data[pos] = x
+                return value
+            case None, _:
+                return new_error(OutOfRangeException, interpreter, meta)
+        return new_error(IncorrectTypeException, interpreter, meta)
+
+    def _pos(self, i: Value, j: Value) -> int | bool | None:
+        """Storage position of element (i, j), None if out of range and
+        False if the indices are not valid"""
+        match self.shape, i, j:
+            case (n_rows, n_cols), Int(row), Int(col):
+                row_ = _normalize_index(row, n_rows)
+                col_ = _normalize_index(col, n_cols)
+                if row_ is None or col_ is None:
+                    return None
+                s0, s1 = self.strides
+                return self.offset + row_ * s0 + col_ * s1
+        return False
+
+    def row(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        i: Value, *_
+    ) -> ExpressionResult:
+        """Get a row as a view"""
+        if len(self.shape) != 2:
+            return _shape_error(interpreter, meta, "Expected a 2-D matrix")
+        return self.get_item(i, interpreter, meta)
+
+    def col(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        j: Value, *_
+    ) -> ExpressionResult:
+        """Get a column as a view"""
+        if len(self.shape) != 2:
+            return _shape_error(interpreter, meta, "Expected a 2-D matrix")
+        return self.transpose().get_item(j, interpreter, meta)
+
+    def transpose(self) -> "Matrix":
+        """Transpose as a view (no-op for 1-D matrices)"""
+        return Matrix(
+            self.data, self.shape[::-1], self.strides[::-1], self.offset
+        )
+
+    def to_list(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        deep: bool = True, *_
+    ) -> BLList:
+        """Convert to a (nested) list"""
+        # pylint: disable=unused-argument
+        if len(self.shape) == 1:
+            return BLList([_box(x) for x in self.rows()[0]])
+        if deep:
+            return BLList([
+                BLList([_box(x) for x in row]) for row in self.rows()
+            ])
+        return BLList([
+            Matrix(self.data, self.shape[1:], self.strides[1:], start)
+            for start in range(
+                self.offset, self.offset + self.shape[0] * self.strides[0],
+                self.strides[0]
+            )
+        ])
+
+    def _elementwise(
+        self, op: Callable[[Number, Number], Number], other: Value,
+        interpreter: "ASTInterpreter", meta: Meta | None,
+    ) -> ExpressionResult | None:
+        """Apply a binary operation elementwise, broadcasting the operands
+        against each other. Return None if other is not a supported
+        operand"""
+        a_rows = self.rows()
+        match other:
+            case Int(x) | Float(x):
+                try:
+                    rows = [list(map(op, row, repeat(x))) for row in a_rows]
+                except ZeroDivisionError:
+                    return new_error(DivByZeroException, interpreter, meta)
+                return Matrix.from_rows(rows, self.shape)
+            case Matrix():
+                pass
+            case _:
+                return None
+        b_rows = other.rows()
+        a_shape = self.shape if len(self.shape) == 2 else (1, *self.shape)
+        b_shape = other.shape if len(other.shape) == 2 else (1, *other.shape)
+        shape = []
+        for a_dim, b_dim in zip(a_shape, b_shape):
+            if a_dim != b_dim and a_dim != 1 and b_dim != 1:
+                return _shape_error(
+                    interpreter, meta,
+                    f"Cannot broadcast shapes {self.shape} and {other.shape}"
+                )
+            shape.append(b_dim if a_dim == 1 else a_dim)
+        n_rows, n_cols = shape
+        a_rows = _broadcast_rows(a_rows, n_rows, n_cols)
+        b_rows = _broadcast_rows(b_rows, n_rows, n_cols)
+        try:
+            rows = [list(map(op, a, b)) for a, b in zip(a_rows, b_rows)]
+        except ZeroDivisionError:
+            return new_error(DivByZeroException, interpreter, meta)
+        if len(self.shape) == 1 and len(other.shape) == 1:
+            return Matrix(rows[0], (n_cols,))
+        return Matrix.from_rows(rows, (n_rows, n_cols))
+
+    @override
+    def add(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        res = self._elementwise(operator.add, other, interpreter, meta)
+        if res is None:
+            return super().add(other, interpreter, meta)
+        return res
+
+    @override
+    def subtract(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        res = self._elementwise(operator.sub, other, interpreter, meta)
+        if res is None:
+            return super().subtract(other, interpreter, meta)
+        return res
+
+    @override
+    def multiply(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        res = self._elementwise(operator.mul, other, interpreter, meta)
+        if res is None:
+            return super().multiply(other, interpreter, meta)
+        return res
+
+    @override
+    def divide(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> ExpressionResult:
+        res = self._elementwise(operator.truediv, other, interpreter, meta)
+        if res is None:
+            return super().divide(other, interpreter, meta)
+        return res
+
+    @override
+    def neg(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> "Matrix":
+        return Matrix.from_rows(
+            [list(map(operator.neg, row)) for row in self.rows()], self.shape
+        )
+
+    @override
+    def is_equal(
+        self, other: Value, interpreter: "ASTInterpreter",
+        meta: Meta | None,
+    ) -> Bool | BLError:
+        if isinstance(other, Matrix):
+            return BOOLS[
+                self.shape == other.shape and self.rows() == other.rows()
+            ]
+        return super().is_equal(other, interpreter, meta)
+
+    def matmul(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        other: Value, *_
+    ) -> ExpressionResult:
+        """Matrix multiplication
+
+        1-D operands are treated as row vectors on the left and column
+        vectors on the right, and the result is 1-D (or a number) if any of
+        the operands are 1-D"""
+        if not isinstance(other, Matrix):
+            return new_error(IncorrectTypeException, interpreter, meta)
+        if self.shape[-1] != other.shape[0]:
+            return _shape_error(
+                interpreter, meta,
+                f"Cannot multiply shapes {self.shape} and {other.shape}"
+            )
+        a_rows = self.rows()
+        b_cols = other.cols() if len(other.shape) == 2 else other.rows()
+        rows = _matmul_rows(a_rows, b_cols)
+        match len(self.shape), len(other.shape):
+            case 1, 1:
+                return _box(rows[0][0])
+            case 1, 2:
+                return Matrix(rows[0], (len(b_cols),))
+            case 2, 1:
+                return Matrix([row[0] for row in rows], (len(a_rows),))
+        return Matrix.from_rows(rows, (len(a_rows), len(b_cols)))
+
+    def reduce(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        axis: Value, f: Callable[[list[Number]], Number], *_
+    ) -> ExpressionResult:
+        """Reduce along an axis (or the whole matrix if axis is null)"""
+        try:
+            match axis, len(self.shape):
+                case Null(), 1 | 2:
+                    return _box(f([x for row in self.rows() for x in row]))
+                case Int(0), 1:
+                    return _box(f(self.rows()[0]))
+                case Int(0), 2:
+                    return Matrix([f(col) for col in self.cols()], (
+                        self.shape[1],
+                    ))
+                case Int(1), 2:
+                    return Matrix([f(row) for row in self.rows()], (
+                        self.shape[0],
+                    ))
+        except (ValueError, ZeroDivisionError):
+            # Reducing an empty matrix
+            return new_error(OutOfRangeException, interpreter, meta)
+        return new_error(IncorrectTypeException, interpreter, meta)
+
+    @override
+    def dump(self, interpreter: "ASTInterpreter", meta: Meta | None) -> String:
+        if len(self.shape) == 1:
+            return String(f"Matrix({self.rows()[0]!r})")
+        return String(f"Matrix({self.rows()!r})")
+
+
+# Matrix errors
+ShapeMismatchException = Class(
+    String("ShapeMismatchException"), ExceptionClass
+)
@@ -24,6 +24,8 @@ class Int(Value):
 
     # pylint: disable=too-many-public-methods
 
+    __slots__ = ("value",)
+
     value: int
 
     @override
@@ -259,6 +261,8 @@ class Int(Value):
 class Float(Value):
     """Float type"""
 
+    __slots__ = ("value",)
+
     value: float
 
     @override
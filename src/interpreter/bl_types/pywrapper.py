@@ -14,13 +14,14 @@ from .essentials import (
 )
 from .numbers import Int, Float
 from .colls import BLList, BLDict
+from .binary import Bytes, ByteBuffer
 
 if TYPE_CHECKING:
     from .essentials import Instance
     from ..main import ASTInterpreter
 
 
-@dataclass
+@dataclass(slots=True)
 class ConvenientPythonWrapper(PythonFunction):
     """Convenient wrapper for Python functions to baba-lang"""
 
@@ -46,7 +47,10 @@ class ConvenientPythonWrapper(PythonFunction):
     @staticmethod
     def unwrap_arg(
         arg: Value
-    ) -> int | float | str | bool | list | dict | None:
+    ) -> (
+        int | float | str | bool | list | dict | bytes | bytearray
+        | memoryview | object | None
+    ):
         """Unwrap argument for use with Python"""
         uw = ConvenientPythonWrapper.unwrap_arg
         match arg:
@@ -57,10 +61,25 @@ class ConvenientPythonWrapper(PythonFunction):
                 return value
             case Null():
                 return None
+            case PythonValue(value=value):
+                return value
+            case ConvenientPythonWrapper(function=function):
+                return function
             case BLList(elems=elems):
                 return [uw(e) for e in elems]
-            case BLDict(content=content):
-                return {uw(k): uw(content[k]) for k in content}
+            case BLDict():
+                return {uw(k): uw(v) for k, v in arg.iter_items()}
+            case ByteBuffer(data=data):
+                return data
+            case Bytes(view=view):
+                # Hand the original bytes object over when the view covers
+                # all of it in order, so functions expecting real bytes work
+                # too (a contiguous view that long can only start at 0)
+                if not view.c_contiguous:
+                    return view.tobytes()
+                if isinstance(view.obj, bytes) and len(view) == len(view.obj):
+                    return view.obj
+                return view
         raise ValueError
 
     @staticmethod
@@ -78,6 +97,15 @@ class ConvenientPythonWrapper(PythonFunction):
             return NULL
         if isinstance(res, str):
             return String(res)
+        if isinstance(res, bytes):
+            return Bytes(memoryview(res))
+        if isinstance(res, bytearray):
+            return ByteBuffer(res)
+        if isinstance(res, memoryview):
+            try:
+                return Bytes(res.cast("B").toreadonly())
+            except TypeError:
+                return PythonValue(res)
         if isinstance(res, (tuple, list, set, frozenset)):
             return BLList([w(e) for e in res])
         if isinstance(res, dict):
@@ -0,0 +1,55 @@
+"""Shapes (hidden classes) of instance attributes
+
+Instead of a dict each, instances store their attribute values in a list,
+and point to a shape mapping attribute names to indexes in that list.
+Shapes are shared by all instances that got the same attributes in the same
+order, and form a tree: adding an attribute moves an instance from a shape
+to one of its children, and the transition is remembered so that the next
+instance doing the same ends up with the very same shape.
+
+Objects used like maps (that get too many attributes, or attributes in too
+many different orders) would make the tree grow without bound, so they are
+switched to a plain dict instead (dictionary mode)."""
+
+
+# Attributes an instance may have before switching to dictionary mode
+MAX_ATTRS = 64
+# Children a shape may have before new transitions switch to dictionary mode
+MAX_TRANSITIONS = 64
+
+
+class Shape:
+    """Layout of the attributes of instances"""
+
+    __slots__ = ("names", "index", "transitions")
+
+    names: tuple[str, ...]
+    index: dict[str, int]
+    transitions: dict[str, "Shape"]
+
+    def __init__(self, names: tuple[str, ...]) -> None:
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self.transitions = {}
+
+    def with_attr(self, name: str) -> "Shape | None":
+        """Get the shape following this one when an attribute is added, or
+        None if the instance should switch to dictionary mode"""
+        try:
+            return self.transitions[name]
+        except KeyError:
+            pass
+        if (
+            len(self.names) >= MAX_ATTRS
+            or len(self.transitions) >= MAX_TRANSITIONS
+        ):
+            return None
+        shape = self.transitions[name] = Shape((*self.names, name))
+        return shape
+
+    def __repr__(self) -> str:
+        return f"Shape({self.names!r})"
+
+
+# Shape of instances without attributes, root of the tree
+EMPTY_SHAPE = Shape(())
@@ -0,0 +1,143 @@
+"""Text building types
+
+StringBuilder accumulates string pieces in a list and joins them only when
+the result is asked for, so building a long string piece by piece takes
+linear time instead of the quadratic time of repeated concatenation."""
+
+
+from typing import TYPE_CHECKING, override
+
+from lark.tree import Meta
+
+from .essentials import (
+    ExpressionResult, Value, BLError, String, Bool, BOOLS, Class,
+    PythonFunction, Instance, cast_to_instance, ObjectClass,
+    IncorrectTypeException,
+)
+from .numbers import Int
+
+if TYPE_CHECKING:
+    from ..main import ASTInterpreter
+
+
+def string_builder_new(
+    args: list[Value], interpreter: "ASTInterpreter", meta: Meta | None
+) -> ExpressionResult:
+    """Create a new string builder, optionally seeded with a string"""
+    match args:
+        case []:
+            return StringBuilder([])
+        case [String(value)]:
+            return StringBuilder([value])
+    return BLError(cast_to_instance(
+        IncorrectTypeException.new([], interpreter, meta)
+    ), meta, interpreter.path)
+
+
+StringBuilderClass = Class(String("StringBuilder"), ObjectClass, {
+    "append": PythonFunction(
+        lambda meta, intp, /, this, piece, *_: this.append(meta, intp, piece)
+    ),
+    "append_line": PythonFunction(
+        lambda meta, intp, /, this, piece=String(""), *_:
+        this.append_line(meta, intp, piece)
+    ),
+    "length": PythonFunction(
+        lambda meta, intp, /, this, *_: Int(this.size)
+    ),
+    "clear": PythonFunction(
+        lambda meta, intp, /, this, *_: this.clear()
+    ),
+    "to_bool": PythonFunction(
+        lambda meta, intp, /, this, *_: this.to_bool(intp, meta)
+    ),
+    "to_string": PythonFunction(
+        lambda meta, intp, /, this, *_: this.to_string(intp, meta)
+    ),
+    "dump": PythonFunction(
+        lambda meta, intp, /, this, *_: this.dump(intp, meta)
+    ),
+})
+StringBuilderClass.new = string_builder_new
+
+
+class StringBuilder(Instance):
+    """Mutable string builder
+
+    Implicit builders are the ones the interpreter puts in place of a string
+    local when the static checker has proven that the local is only appended
+    to inside a loop (see static_checker.optimizer). They are turned back
+    into strings once the loop is over, so scripts never see them."""
+
+    __slots__ = ("pieces", "size", "implicit")
+
+    pieces: list[str]
+    size: int
+    implicit: bool
+
+    def __init__(self, pieces: list[str], implicit: bool = False) -> None:
+        super().__init__(StringBuilderClass)
+        self.pieces = pieces
+        self.size = sum(map(len, pieces))
+        self.implicit = implicit
+
+    def push(self, piece: str) -> None:
+        """Append a raw Python string"""
+        self.pieces.append(piece)
+        self.size += len(piece)
+
+    def join(self) -> str:
+        """Join the pieces, keeping the result as the only piece"""
+        if len(self.pieces) != 1:
+            self.pieces[:] = ["".join(self.pieces)]
+        return self.pieces[0] if self.pieces else ""
+
+    def append(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        piece: Value, *_
+    ) -> ExpressionResult:
+        """Append the string representation of a value"""
+        match piece:
+            case String(value):
+                self.push(value)
+                return self
+        match res := piece.to_string(interpreter, meta):
+            case String(value):
+                self.push(value)
+                return self
+        return res
+
+    def append_line(
+        self, meta: Meta | None, interpreter: "ASTInterpreter", /,
+        piece: Value, *_
+    ) -> ExpressionResult:
+        """Append the string representation of a value and a newline"""
+        res = self.append(meta, interpreter, piece)
+        if isinstance(res, BLError):
+            return res
+        self.push("\n")
+        return self
+
+    def clear(self) -> "StringBuilder":
+        """Remove all pieces"""
+        self.pieces.clear()
+        self.size = 0
+        return self
+
+    @override
+    def to_bool(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> Bool:
+        return BOOLS[self.size > 0]
+
+    @override
+    def to_string(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> String:
+        return String(self.join())
+
+    @override
+    def dump(
+        self, interpreter: "ASTInterpreter", meta: Meta | None
+    ) -> String:
+        return String(f"<StringBuilder {self.join()!r}>")
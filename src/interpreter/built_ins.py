@@ -10,6 +10,7 @@ from .bl_types.essentials import (
     IncorrectTypeException, cast_to_instance,
 )
 from .bl_types.numbers import Int, Float
+from .bl_types.colls import BLList, collect, sort_values
 
 if TYPE_CHECKING:
     from .main import ASTInterpreter
@@ -121,3 +122,20 @@ def exit_(
     return BLError(cast_to_instance(
         IncorrectTypeException.new([], interpreter, meta)
     ), meta, interpreter.path)
+
+
+def sorted_(
+    meta: Meta | None, interpreter: "ASTInterpreter", this: Instance | None,
+    /, iterable: Value, key: Value = NULL, reverse: Value = NULL, *_
+) -> BLList | BLError:
+    """Sort the values of an iterable into a new list"""
+    # pylint: disable=unused-argument
+    match values := collect(iterable, interpreter, meta):
+        case BLError():
+            return values
+    match sorted_values := sort_values(
+        values, key, reverse, interpreter, meta
+    ):
+        case BLError():
+            return sorted_values
+    return BLList(sorted_values)
@@ -0,0 +1,701 @@
+"""Compiler of hot code into closures
+
+The AST interpreter is cheap to start but pays for matching every node it
+visits. Function bodies called often and loops running long enough (see
+ASTInterpreter.tier_threshold) are compiled once into a tree of closures
+instead, each specialized to its node: the children are compiled ahead,
+operators are resolved to the methods implementing them, and operations on
+two numbers skip method calls altogether.
+
+Given a profile of earlier runs (see the profiling module), operators are
+specialized to the operand types seen there, and branches never taken are
+left to the interpreter. Expressions proven to compute on numbers only (see
+TypeInferencePass) run on raw Python numbers, without any dispatch.
+
+Compiled code takes the interpreter and returns the same results as
+visiting the node would. Nodes the compiler doesn't specialize are visited
+by the interpreter as usual."""
+
+
+import operator
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, cast
+
+from bl_ast import nodes
+
+from .bl_types import exits
+from .bl_types.essentials import (
+    Result, ExpressionResult, Success, BLError, Return, Value, String, Bool,
+    BOOLS, TRUE, FALSE, NULL, MISSING,
+)
+from .bl_types.numbers import Int, Float
+from .bl_types.colls import BLList
+from .bl_types.iterator import Item
+
+if TYPE_CHECKING:
+    from .main import ASTInterpreter
+    from .profiling import Profile
+
+
+# pylint: disable=too-many-return-statements
+# pylint: disable=protected-access
+
+
+type Compiled = Callable[["ASTInterpreter"], Result]
+type CompiledExpr = Callable[["ASTInterpreter"], ExpressionResult]
+# Compiled while loop, taking whether to check the condition first
+type CompiledLoop = Callable[["ASTInterpreter", bool], Result]
+
+# Results stopping a body, whose types aren't subclassed further
+_EXITS = frozenset({BLError, Return, exits.Break, exits.Continue})
+_SUCCESS = Success()
+
+# Methods implementing binary operators (see Value.binary_op)
+_METHODS = {
+    "+": "add", "-": "subtract", "*": "multiply", "/": "divide",
+    "%/%": "floor_div", "%": "modulo", "**": "power", "&": "bit_and",
+    "|": "bit_or", "^": "bit_xor", "<<": "left_shift", ">>": "right_shift",
+    "==": "is_equal", "!=": "is_not_equal", "<": "is_less",
+    "<=": "is_less_or_equal", ">": "is_greater", ">=": "is_greater_or_equal",
+}
+# Operators on two numbers of the same type that can't fail, giving numbers
+# of that type
+_ARITHMETIC: dict[type[Int | Float], dict[str, Callable[[Any, Any], Any]]] = {
+    Int: {
+        "+": operator.add, "-": operator.sub, "*": operator.mul,
+        "&": operator.and_, "|": operator.or_, "^": operator.xor,
+    },
+    Float: {"+": operator.add, "-": operator.sub, "*": operator.mul},
+}
+# Operators on two numbers that can't fail, giving booleans
+_COMPARISONS = {
+    "==": operator.eq, "!=": operator.ne, "<": operator.lt,
+    "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+# Operators on raw numbers, computing the values that the methods of Int and
+# Float box
+_RAW_BINARY = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul,
+    "&": operator.and_, "|": operator.or_, "^": operator.xor,
+    "/": operator.truediv, "%": operator.mod, "%/%": operator.floordiv,
+    **_COMPARISONS,
+}
+_RAW_PREFIX = {"+": operator.pos, "-": operator.neg, "~": operator.invert}
+# Boxing of raw numbers, by the type inferred
+_BOXES: dict[str, Callable[[Any], Value]] = {
+    "Int": Int, "Float": Float, "Bool": BOOLS.__getitem__,
+}
+
+
+class _Escape(Exception):
+    """Error escaping code running on raw numbers"""
+
+    error: BLError
+
+    def __init__(self, error: BLError) -> None:
+        super().__init__()
+        self.error = error
+
+
+class Compiler:
+    """Compiler of statements and expressions into closures"""
+
+    profile: "Profile | None"
+
+    def __init__(self, profile: "Profile | None" = None) -> None:
+        self.profile = profile
+
+    def compile_body(self, body: nodes.Body) -> Compiled:
+        """Compile a function body"""
+        return self.compile_stmt(body)
+
+    def compile_stmt(self, node: nodes._Stmt) -> Compiled:
+        """Compile a statement node"""
+        if isinstance(node, nodes._Expr):
+            return self.compile_expr(node)
+        match node:
+            case nodes.NopStmt():
+                return lambda interp: _SUCCESS
+            case nodes.Body(statements=statements):
+                return self._compile_statements(statements)
+            case nodes.IfStmt(condition=condition, body=body):
+                return self._compile_if(node, [condition], [body], None)
+            case nodes.IfElseStmt(
+                condition=condition, then_body=then_body,
+                else_body=else_body,
+            ):
+                return self._compile_if(
+                    node, [condition], [then_body], else_body
+                )
+            case nodes.IfChain(
+                conditions=conditions, bodies=bodies, else_body=else_body
+            ):
+                return self._compile_if(node, conditions, bodies, else_body)
+            case nodes.WhileStmt(eval_cond_after_body=eval_cond_after_body):
+                loop = self.compile_loop(node)
+                check_first = not eval_cond_after_body
+                return lambda interp: loop(interp, check_first)
+            case nodes.ForEachStmt():
+                return self._compile_for_each(node)
+            case nodes.BreakStmt():
+                break_ = exits.Break()
+                return lambda interp: break_
+            case nodes.ContinueStmt():
+                continue_ = exits.Continue()
+                return lambda interp: continue_
+            case nodes.ReturnStmt(value=value) if value is not None:
+                compiled_value = self.compile_expr(value)
+
+                def return_(interp: "ASTInterpreter") -> Result:
+                    res = compiled_value(interp)
+                    if type(res) is BLError:
+                        return res
+                    return Return(res)
+                return return_
+        return lambda interp: interp.visit_stmt(node)
+
+    def _compile_statements(self, statements: list[nodes._Stmt]) -> Compiled:
+        if not statements:
+            return lambda interp: _SUCCESS
+        if len(statements) == 1:
+            return self.compile_stmt(statements[0])
+        compiled = tuple(self.compile_stmt(stmt) for stmt in statements)
+
+        def body(interp: "ASTInterpreter") -> Result:
+            res: Result = _SUCCESS
+            for stmt in compiled:
+                res = stmt(interp)
+                if type(res) in _EXITS:
+                    return res
+            return res
+        return body
+
+    def _compile_condition(
+        self, node: nodes._Expr
+    ) -> Callable[["ASTInterpreter"], Bool | BLError]:
+        """Compile an expression evaluated to a boolean"""
+        compiled = self.compile_expr(node)
+        meta = node.meta
+
+        def condition(interp: "ASTInterpreter") -> Bool | BLError:
+            res = compiled(interp)
+            if res is TRUE or res is FALSE or type(res) is BLError:
+                return cast(Bool | BLError, res)
+            return res.to_bool(interp, meta)
+        return condition
+
+    def _compile_branch(
+        self, body: nodes._Stmt, counts: dict[str, int] | None, branch: str
+    ) -> Compiled:
+        """Compile a branch of an if statement, unless the profile says it
+        is never taken"""
+        if counts is not None and branch not in counts:
+            return lambda interp: interp.visit_stmt(body)
+        return self.compile_stmt(body)
+
+    def _compile_if(
+        self, node: nodes.IfStmt | nodes.IfElseStmt | nodes.IfChain,
+        conditions: list[nodes._Expr], bodies: list[nodes.Body],
+        else_body: nodes._Stmt | None,
+    ) -> Compiled:
+        counts = (
+            None if self.profile is None
+            else self.profile.branch_counts(node)
+        )
+        branches = tuple(
+            (
+                self._compile_condition(condition),
+                self._compile_branch(body, counts, str(i)),
+            )
+            for i, (condition, body) in enumerate(zip(conditions, bodies))
+        )
+        compiled_else = (
+            None if else_body is None
+            else self._compile_branch(else_body, counts, "else")
+        )
+
+        def if_(interp: "ASTInterpreter") -> Result:
+            for condition, body in branches:
+                cond = condition(interp)
+                if type(cond) is BLError:
+                    return cond
+                if cond.value:
+                    return body(interp)
+            if compiled_else is None:
+                return _SUCCESS
+            return compiled_else(interp)
+        return if_
+
+    def compile_loop(self, node: nodes.WhileStmt) -> CompiledLoop:
+        """Compile a while loop, to be run from its start or after its
+        body"""
+        condition = self._compile_condition(node.condition)
+        body = self.compile_stmt(node.body)
+
+        def loop(interp: "ASTInterpreter", check_first: bool) -> Result:
+            if not check_first:
+                res = body(interp)
+                if type(res) in _EXITS and type(res) is not exits.Continue:
+                    return res
+            while True:
+                cond = condition(interp)
+                if type(cond) is BLError:
+                    return cond
+                if not cond.value:
+                    return _SUCCESS
+                res = body(interp)
+                if type(res) in _EXITS and type(res) is not exits.Continue:
+                    return res
+        return loop
+
+    def _compile_for_each(self, node: nodes.ForEachStmt) -> Compiled:
+        meta = node.meta
+        name = str(node.ident)
+        iterable = self.compile_expr(node.iterable)
+        body = self.compile_stmt(node.body)
+
+        def for_each(interp: "ASTInterpreter") -> Result:
+            iterable_ = iterable(interp)
+            if type(iterable_) is BLError:
+                return iterable_
+            iterator_ = iterable_.to_iter(interp, meta)
+            if isinstance(iterator_, BLError):
+                return iterator_
+            while True:
+                el = iterator_.next(interp, meta)
+                if type(el) is not Item:
+                    if type(el) is BLError:
+                        return el
+                    return _SUCCESS
+                _new_var(interp, name, cast(Item, el).value)
+                res = body(interp)
+                if type(res) in _EXITS and type(res) is not exits.Continue:
+                    return res
+        return for_each
+
+    def compile_expr(self, node: nodes._Expr) -> CompiledExpr:
+        """Compile an expression node"""
+        # pylint: disable=too-many-branches
+        compile_expr = self.compile_expr
+        match node:
+            case nodes.Constant(value=value):
+                return lambda interp: value
+            case nodes.TrueLiteral():
+                return lambda interp: TRUE
+            case nodes.FalseLiteral():
+                return lambda interp: FALSE
+            case nodes.NullLiteral():
+                return lambda interp: NULL
+            case nodes.Var():
+                return _compile_var(node)
+            case nodes.Exprs(expressions=expressions) if expressions:
+                return _compile_exprs(tuple(map(compile_expr, expressions)))
+            case nodes.Assign(
+                pattern=nodes.VarPattern(name=name), right=right
+            ):
+                return _compile_assign_var(str(name), compile_expr(right))
+            case nodes.Assign(meta=meta, pattern=pattern, right=right):
+                return _compile_assign(meta, pattern, compile_expr(right))
+            case nodes.Inplace(
+                meta=meta, pattern=pattern, op=op, right=right
+            ):
+                return _compile_inplace(
+                    meta, pattern, op, compile_expr(right)
+                )
+            case nodes.LogicalOp(left=left, op=op, right=right):
+                return self._compile_logical([left, right], op)
+            case nodes.LogicalChain(operands=operands, op=op):
+                return self._compile_logical(operands, op)
+            case nodes.BinaryOp(meta=meta, left=left, op=op, right=right):
+                return _compile_binary(
+                    meta, op, compile_expr(left), compile_expr(right),
+                    self._fast_type(node, 0),
+                )
+            case nodes.BinaryChain(meta=meta, operands=operands, ops=ops):
+                if "+" in ops:
+                    return self._compile_concatenation(node)
+                compiled = compile_expr(operands[0])
+                for i, (op, operand) in enumerate(zip(ops, operands[1:])):
+                    compiled = _compile_binary(
+                        meta, op, compiled, compile_expr(operand),
+                        self._fast_type(node, i),
+                    )
+                return compiled
+            case nodes.Prefix(meta=meta, op=op, operand=operand):
+                return _compile_prefix(meta, op, compile_expr(operand))
+            case nodes.Call(meta=meta, callee=callee, args=args):
+                return _compile_call(
+                    meta, compile_expr(callee),
+                    tuple(map(compile_expr, args.args)),
+                )
+            case nodes.Dot(meta=meta, accessee=accessee, attr_name=attr):
+                return _compile_dot(meta, compile_expr(accessee), str(attr))
+            case nodes.Subscript(
+                meta=meta, subscriptee=subscriptee, index=index
+            ):
+                return _compile_subscript(
+                    meta, compile_expr(subscriptee), compile_expr(index)
+                )
+            case nodes.List(elems=elems):
+                return _compile_list(tuple(map(compile_expr, elems)))
+            case nodes.NumericExpr(expr=expr, type_=type_):
+                return _compile_numeric(self._compile_raw(expr), type_)
+            case nodes.TypeCheck(
+                meta=meta, expr=expr, annotation=annotation, what=what
+            ):
+                return _compile_type_check(
+                    meta, compile_expr(expr), annotation, what
+                )
+        return lambda interp: interp.visit_expr(node)
+
+    def _compile_raw(self, node: nodes._Expr) -> Callable[..., Any]:
+        """Compile an expression of a NumericExpr, computing a raw number
+        (or raising _Escape)"""
+        compile_raw = self._compile_raw
+        match node:
+            case nodes.BinaryOp(meta=meta, left=left, op=op, right=right):
+                return _compile_raw_binary(
+                    meta, op, compile_raw(left), compile_raw(right)
+                )
+            case nodes.BinaryChain(meta=meta, operands=operands, ops=ops):
+                compiled = compile_raw(operands[0])
+                for op, operand in zip(ops, operands[1:]):
+                    compiled = _compile_raw_binary(
+                        meta, op, compiled, compile_raw(operand)
+                    )
+                return compiled
+            case nodes.Prefix(op=op, operand=operand):
+                prefix_op = _RAW_PREFIX[op]
+                operand_ = compile_raw(operand)
+                return lambda interp: prefix_op(operand_(interp))
+            case nodes.Constant(value=value):
+                raw = value.value
+                return lambda interp: raw
+            case nodes.Var(name=name):
+                # Only locals assigned to in the function have known types
+                name = str(name)
+                return lambda interp: (
+                    interp.locals.vars[name].value.value  # type: ignore
+                )
+        boxed = self.compile_expr(node)
+
+        def unboxed(interp: "ASTInterpreter") -> Any:
+            res = boxed(interp)
+            if type(res) is BLError:
+                raise _Escape(res)
+            return cast(Int | Float, res).value
+        return unboxed
+
+    def _fast_type(
+        self, node: nodes.BinaryOp | nodes.BinaryChain, index: int
+    ) -> type[Int | Float] | None:
+        """Number type to specialize the index-th operator of a node to
+
+        Integers are assumed without a profile, or when it saw any."""
+        if self.profile is None:
+            return Int
+        types = self.profile.binary_types(node, index)
+        if types is None or "Int,Int" in types:
+            return Int
+        if "Float,Float" in types:
+            return Float
+        return None
+
+    def _compile_logical(
+        self, operands: list[nodes._Expr], op: str
+    ) -> CompiledExpr:
+        """Compile a chain of the same logical operator"""
+        *lefts, last = operands
+        compiled_lefts = tuple(
+            (self.compile_expr(left), left.meta) for left in lefts
+        )
+        compiled_last = self.compile_expr(last)
+        short_circuit_on = op == "||"
+
+        def logical(interp: "ASTInterpreter") -> ExpressionResult:
+            for left, meta in compiled_lefts:
+                res = left(interp)
+                if type(res) is BLError:
+                    return res
+                res_bool = res.to_bool(interp, meta)
+                if type(res_bool) is BLError:
+                    return res_bool
+                if res_bool.value == short_circuit_on:
+                    return res
+            return compiled_last(interp)
+        return logical
+
+    def _compile_concatenation(self, node: nodes.BinaryChain) -> CompiledExpr:
+        """Compile a chain of binary operations with additions, see
+        ASTInterpreter.visit_binary_chain"""
+        meta = node.meta
+        first = self.compile_expr(node.operands[0])
+        rest = tuple(
+            (op, self.compile_expr(operand))
+            for op, operand in zip(node.ops, node.operands[1:])
+        )
+
+        def concatenation(interp: "ASTInterpreter") -> ExpressionResult:
+            left = first(interp)
+            if type(left) is BLError:
+                return left
+            parts: list[str] = []
+            for op, operand in rest:
+                right = operand(interp)
+                if type(right) is BLError:
+                    return right
+                if (
+                    op == "+" and type(right) is String
+                    and (parts or type(left) is String)
+                ):
+                    if not parts:
+                        parts.append(cast(String, left).value)
+                    parts.append(cast(String, right).value)
+                    continue
+                if parts:
+                    left = String("".join(parts))
+                    parts.clear()
+                left = left.binary_op(op, right, interp, meta)
+                if type(left) is BLError:
+                    return left
+            if parts:
+                return String("".join(parts))
+            return left
+        return concatenation
+
+
+def _compile_var(node: nodes.Var) -> CompiledExpr:
+    """Compile a variable reference, see ASTInterpreter.visit_var"""
+    name = str(node.name)
+    cache = node.cache
+    meta = node.meta
+
+    def var(interp: "ASTInterpreter") -> ExpressionResult:
+        locals_ = interp.locals
+        if locals_ is not None:
+            var_ = locals_.lookup_var(name)
+            if var_ is not MISSING:
+                return var_.value
+        globals_ = interp.globals
+        if cache[0] is globals_ and cache[1] == globals_.root.version:
+            return cache[2].value
+        if (var_ := globals_.lookup_var(name)) is MISSING:
+            return globals_.var_not_found(meta)
+        cache[:] = globals_, globals_.root.version, var_
+        return var_.value
+    return var
+
+
+def _new_var(interp: "ASTInterpreter", name: str, value: Value) -> None:
+    if (locals_ := interp.locals) is not None:
+        locals_.new_var(name, value)
+    else:
+        interp.globals.new_var(name, value)
+
+
+def _compile_exprs(compiled: tuple[CompiledExpr, ...]) -> CompiledExpr:
+    def exprs(interp: "ASTInterpreter") -> ExpressionResult:
+        res: ExpressionResult = NULL
+        for expr in compiled:
+            res = expr(interp)
+            if type(res) is BLError:
+                return res
+        return res
+    return exprs
+
+
+def _compile_assign_var(name: str, right: CompiledExpr) -> CompiledExpr:
+    def assign(interp: "ASTInterpreter") -> ExpressionResult:
+        value = right(interp)
+        if type(value) is BLError:
+            return value
+        _new_var(interp, name, cast(Value, value))
+        return value
+    return assign
+
+
+def _compile_assign(
+    meta: Any, pattern: nodes._Pattern, right: CompiledExpr
+) -> CompiledExpr:
+    def assign(interp: "ASTInterpreter") -> ExpressionResult:
+        value = right(interp)
+        if type(value) is BLError:
+            return value
+        return interp.assign(meta, pattern, cast(Value, value))
+    return assign
+
+
+def _compile_inplace(
+    meta: Any, pattern: nodes._Pattern, op: Any, right: CompiledExpr
+) -> CompiledExpr:
+    def inplace(interp: "ASTInterpreter") -> ExpressionResult:
+        value = right(interp)
+        if type(value) is BLError:
+            return value
+        return interp.inplace(meta, pattern, op, cast(Value, value))
+    return inplace
+
+
+def _compile_binary(
+    meta: Any, op: str, left: CompiledExpr, right: CompiledExpr,
+    fast_type: type[Int | Float] | None,
+) -> CompiledExpr:
+    """Compile a binary operation, specialized to its operator and to
+    operands of fast_type"""
+    if op not in _METHODS:
+        def binary(interp: "ASTInterpreter") -> ExpressionResult:
+            left_ = left(interp)
+            if type(left_) is BLError:
+                return left_
+            right_ = right(interp)
+            if type(right_) is BLError:
+                return right_
+            return left_.binary_op(op, right_, interp, meta)
+        return binary
+    method = _METHODS[op]
+    if fast_type is not None and op in _ARITHMETIC[fast_type]:
+        fast_op = _ARITHMETIC[fast_type][op]
+
+        def arithmetic(interp: "ASTInterpreter") -> ExpressionResult:
+            left_ = left(interp)
+            if type(left_) is BLError:
+                return left_
+            right_ = right(interp)
+            if type(left_) is fast_type and type(right_) is fast_type:
+                return fast_type(fast_op(left_.value, right_.value))
+            if type(right_) is BLError:
+                return right_
+            return getattr(left_, method)(right_, interp, meta)
+        return arithmetic
+    if fast_type is not None and op in _COMPARISONS:
+        fast_cmp = _COMPARISONS[op]
+
+        def comparison(interp: "ASTInterpreter") -> ExpressionResult:
+            left_ = left(interp)
+            if type(left_) is BLError:
+                return left_
+            right_ = right(interp)
+            if type(left_) is fast_type and type(right_) is fast_type:
+                return BOOLS[fast_cmp(left_.value, right_.value)]
+            if type(right_) is BLError:
+                return right_
+            return getattr(left_, method)(right_, interp, meta)
+        return comparison
+
+    def other(interp: "ASTInterpreter") -> ExpressionResult:
+        left_ = left(interp)
+        if type(left_) is BLError:
+            return left_
+        right_ = right(interp)
+        if type(right_) is BLError:
+            return right_
+        return getattr(left_, method)(right_, interp, meta)
+    return other
+
+
+def _compile_numeric(raw: Callable[..., Any], type_: str) -> CompiledExpr:
+    box = _BOXES[type_]
+
+    def numeric(interp: "ASTInterpreter") -> ExpressionResult:
+        try:
+            return box(raw(interp))
+        except _Escape as escape:
+            return escape.error
+    return numeric
+
+
+def _compile_type_check(
+    meta: Any, expr: CompiledExpr, annotation: nodes.Annotation, what: str
+) -> CompiledExpr:
+    type_ = str(annotation.name)
+
+    def type_check(interp: "ASTInterpreter") -> ExpressionResult:
+        res = expr(interp)
+        if type(res) is BLError:
+            return res
+        error = interp.check_type(cast(Value, res), type_, what, meta)
+        return res if error is None else error
+    return type_check
+
+
+def _compile_raw_binary(
+    meta: Any, op: str, left: Callable[..., Any], right: Callable[..., Any]
+) -> Callable[..., Any]:
+    raw_op = _RAW_BINARY[op]
+    if op not in ("/", "%", "%/%"):
+        return lambda interp: raw_op(left(interp), right(interp))
+
+    def division(interp: "ASTInterpreter") -> Any:
+        left_ = left(interp)
+        right_ = right(interp)
+        try:
+            return raw_op(left_, right_)
+        except ZeroDivisionError:
+            # Let the boxed numbers make the error
+            left_box = Int(left_) if type(left_) is int else Float(left_)
+            right_box = Int(right_) if type(right_) is int else Float(right_)
+            raise _Escape(cast(BLError, left_box.binary_op(
+                op, right_box, interp, meta
+            ))) from None
+    return division
+
+
+def _compile_prefix(meta: Any, op: str, operand: CompiledExpr) -> CompiledExpr:
+    def prefix(interp: "ASTInterpreter") -> ExpressionResult:
+        operand_ = operand(interp)
+        if type(operand_) is BLError:
+            return operand_
+        return operand_.unary_op(op, interp, meta)
+    return prefix
+
+
+def _compile_call(
+    meta: Any, callee: CompiledExpr, args: tuple[CompiledExpr, ...]
+) -> CompiledExpr:
+    def call(interp: "ASTInterpreter") -> ExpressionResult:
+        args_ = []
+        for arg in args:
+            arg_ = arg(interp)
+            if not isinstance(arg_, Value):
+                return arg_
+            args_.append(arg_)
+        callee_ = callee(interp)
+        if type(callee_) is BLError:
+            return callee_
+        return callee_.call(args_, interp, meta)
+    return call
+
+
+def _compile_dot(meta: Any, accessee: CompiledExpr, attr: str) -> CompiledExpr:
+    def dot(interp: "ASTInterpreter") -> ExpressionResult:
+        accessee_ = accessee(interp)
+        if type(accessee_) is BLError:
+            return accessee_
+        return accessee_.get_attr(attr, interp, meta)
+    return dot
+
+
+def _compile_subscript(
+    meta: Any, subscriptee: CompiledExpr, index: CompiledExpr
+) -> CompiledExpr:
+    def subscript(interp: "ASTInterpreter") -> ExpressionResult:
+        subscriptee_ = subscriptee(interp)
+        if type(subscriptee_) is BLError:
+            return subscriptee_
+        index_ = index(interp)
+        if type(index_) is BLError:
+            return index_
+        return subscriptee_.get_item(index_, interp, meta)
+    return subscript
+
+
+def _compile_list(elems: tuple[CompiledExpr, ...]) -> CompiledExpr:
+    def list_(interp: "ASTInterpreter") -> ExpressionResult:
+        values = []
+        for elem in elems:
+            value = elem(interp)
+            if not isinstance(value, Value):
+                return value
+            values.append(value)
+        return BLList(values)
+    return list_
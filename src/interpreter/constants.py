@@ -0,0 +1,80 @@
+"""Literal constant pool
+
+String and number literals are evaluated once, when a script is loaded,
+instead of every time they are run. Their nodes are replaced with Constant
+nodes holding the values, which are shared between equal literals."""
+
+
+from dataclasses import fields, replace
+
+from bl_ast import nodes
+from bl_ast.base import _AstNode
+from static_checker.optimizer import _walk
+
+from .bl_types.essentials import Value, String
+from .bl_types.numbers import Int, Float
+
+
+class ConstantPool:
+    """Pool of literal values"""
+
+    values: dict[tuple[type, object], Value]
+
+    def __init__(self) -> None:
+        self.values = {}
+
+    def get(self, node: nodes.String | nodes.Int | nodes.Float) -> Value:
+        """Get the value of a literal, building it if not pooled yet"""
+        # Literals are never negative, so keys can't mix up 0.0 and -0.0
+        key = (type(node), node.value)
+        try:
+            return self.values[key]
+        except KeyError:
+            pass
+        match node:
+            case nodes.String(value=value):
+                res: Value = String(value)
+            case nodes.Int(value=value):
+                res = Int(value)
+            case nodes.Float(value=value):
+                res = Float(value)
+        self.values[key] = res
+        return res
+
+    def rewrite(self, node: _AstNode) -> _AstNode:
+        """Replace the literals of a tree with Constant nodes
+
+        Lists and non-frozen nodes are updated in place, frozen nodes are
+        copied if they have to change. Nodes are rewritten after their
+        children, in reverse pre-order, so that deep trees don't need a
+        deep Python stack."""
+        order = list(_walk(node))
+        rewritten: dict[int, _AstNode] = {}
+        for item in reversed(order):
+            rewritten[id(item)] = self._rewrite_node(item, rewritten)
+        return rewritten[id(node)]
+
+    def _rewrite_node(
+        self, node: _AstNode, rewritten: dict[int, _AstNode]
+    ) -> _AstNode:
+        """Rewrite a node whose children have been rewritten already"""
+        match node:
+            case nodes.String() | nodes.Int() | nodes.Float():
+                return nodes.Constant(node.meta, self.get(node))
+        changes = {}
+        for field in fields(node):  # type: ignore[arg-type]
+            value = getattr(node, field.name)
+            if isinstance(value, _AstNode):
+                if (new_value := rewritten.get(id(value), value)) is not value:
+                    changes[field.name] = new_value
+            elif isinstance(value, list):
+                for i, item in enumerate(value):
+                    if isinstance(item, _AstNode):
+                        value[i] = rewritten.get(id(item), item)
+        if not changes:
+            return node
+        if node.__dataclass_params__.frozen:  # type: ignore[attr-defined]
+            return replace(node, **changes)  # type: ignore[type-var]
+        for name, new_value in changes.items():
+            setattr(node, name, new_value)
+        return node
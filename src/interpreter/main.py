@@ -1,6 +1,7 @@
 """AST interpreter"""
 
 
+import threading
 from pathlib import Path
 from dataclasses import dataclass
 from typing import cast
@@ -15,14 +16,74 @@ from bl_ast.base import ASTVisitor
 from static_checker import StaticChecker, StaticError
 
 from . import built_ins
-from .bl_types import pywrapper, exits, essentials, iterator, colls, numbers
+from .compiler import Compiler
+from .constants import ConstantPool
+from .profiling import Profile
+from .bl_types import (
+    pywrapper, exits, essentials, iterator, colls, numbers, matrix, binary,
+    text,
+)
 from .bl_types.essentials import (
     Result, ExpressionResult, Success, BLError, Value,
-    PythonFunction, Call, NotImplementedException, Env, Return,
+    PythonFunction, Call, NotImplementedException, Env, GlobalEnv,
+    BuiltinsEnv, Return,
     cast_to_instance,
 )
 
 
+# Calls run on each thread in stackless mode (a call takes around 6 Python
+# frames, and functions can add more by nesting expressions)
+SEGMENT_DEPTH = 64
+# Stack size of these threads
+SEGMENT_STACK_SIZE = 4 * 1024 * 1024
+
+# Built-in variables, shared by all interpreters
+BUILTINS = BuiltinsEnv({
+    "print": PythonFunction(built_ins.print_),
+    "printf": PythonFunction(built_ins.printf),
+    "input": PythonFunction(built_ins.input_),
+    "to_int": PythonFunction(built_ins.to_int),
+    "to_float": PythonFunction(built_ins.to_float),
+    "dump": PythonFunction(built_ins.dump),
+    "to_string": PythonFunction(built_ins.to_string),
+    "to_bool": PythonFunction(built_ins.to_bool),
+    "exit": PythonFunction(built_ins.exit_),
+    "sorted": PythonFunction(built_ins.sorted_),
+    "py_function": PythonFunction(pywrapper.py_function),
+    "py_method": PythonFunction(pywrapper.py_method),
+    "py_constant": PythonFunction(pywrapper.py_constant),
+    "Object": essentials.ObjectClass,
+    "Item": iterator.ItemClass,
+    "Set": colls.SetClass,
+    "Deque": colls.DequeClass,
+    "PriorityQueue": colls.PriorityQueueClass,
+    "Matrix": matrix.MatrixClass,
+    "Bytes": binary.BytesClass,
+    "ByteBuffer": binary.ByteBufferClass,
+    "StringBuilder": text.StringBuilderClass,
+    "Exception": essentials.ExceptionClass,
+    "NotImplementedException": essentials.NotImplementedException,
+    "AttrNotFoundException": essentials.AttrNotFoundException,
+    "VarNotFoundException": essentials.VarNotFoundException,
+    "IncorrectTypeException": essentials.IncorrectTypeException,
+    "RecursionDepthException": essentials.RecursionDepthException,
+    "OutOfRangeException": colls.OutOfRangeException,
+    "KeyNotFoundException": colls.KeyNotFoundException,
+    "ModuleVarNotFoundException": colls.ModuleVarNotFoundException,
+    "ShapeMismatchException": matrix.ShapeMismatchException,
+    "EncodingException": binary.EncodingException,
+    "CollectionChangedException": iterator.CollectionChangedException,
+})
+
+
+# Types that annotations may name (see TypeInferencePass)
+ANNOTATION_TYPES: dict[str, type[Value]] = {
+    "Int": numbers.Int, "Float": numbers.Float, "Bool": essentials.Bool,
+    "String": essentials.String, "List": colls.BLList, "Dict": colls.BLDict,
+    "Null": essentials.Null,
+}
+
+
 @dataclass(frozen=True)
 class Script:
     """baba-lang script instance"""
@@ -38,67 +99,70 @@ class ASTInterpreter(ASTVisitor):
     # pylint: disable=too-many-branches
     # pylint: disable=too-many-statements
 
-    globals: Env
+    globals: GlobalEnv
     locals: Env | None = None
 
     traceback: list[Call | Script]
     path: str | None
+    # Deepest the call stack can get before RecursionDepthException
+    max_depth: int
+    # Whether deep calls are run in stack segments, see visit_call_body
+    stackless: bool
+    # Calls of a function or iterations of a loop before it's compiled (see
+    # the compiler module), 0 to never compile
+    tier_threshold: int
+    # Profile guiding the compiler, or being recorded
+    profile: Profile | None
+    # Profile being recorded, if any
+    recorder: Profile | None
 
-    def __init__(self, path=None):
+    def __init__(
+        self, path=None, *, max_depth=10000, stackless=False,
+        tier_threshold=1000, profile=None,
+    ):
         self.traceback = [Script(path, None)]
         self.path = path
+        self.max_depth = max_depth
+        self.stackless = stackless
+        self.profile = profile
+        if profile is not None and profile.recording:
+            # Compiled code isn't profiled
+            tier_threshold = 0
+            self.recorder = profile
+        else:
+            self.recorder = None
+        self.tier_threshold = tier_threshold
 
-        self.globals = Env(self)
-        # Populate some builtins
-        self.globals.new_var("print", PythonFunction(built_ins.print_))
-        self.globals.new_var("printf", PythonFunction(built_ins.printf))
-        self.globals.new_var("input", PythonFunction(built_ins.input_))
-        self.globals.new_var("to_int", PythonFunction(built_ins.to_int))
-        self.globals.new_var("to_float", PythonFunction(built_ins.to_float))
-        self.globals.new_var("dump", PythonFunction(built_ins.dump))
-        self.globals.new_var("to_string", PythonFunction(built_ins.to_string))
-        self.globals.new_var("to_bool", PythonFunction(built_ins.to_bool))
-        self.globals.new_var("exit", PythonFunction(built_ins.exit_))
-        self.globals.new_var("py_function", PythonFunction(
-            pywrapper.py_function
-        ))
-        self.globals.new_var("py_method", PythonFunction(
-            pywrapper.py_method
-        ))
-        self.globals.new_var("py_constant", PythonFunction(
-            pywrapper.py_constant
-        ))
-        self.globals.new_var("Object", essentials.ObjectClass)
-        self.globals.new_var("Item", iterator.ItemClass)
-        self.globals.new_var("Exception", essentials.ExceptionClass)
-        self.globals.new_var(
-            "NotImplementedException", essentials.NotImplementedException
-        )
-        self.globals.new_var(
-            "AttrNotFoundException", essentials.AttrNotFoundException
-        )
-        self.globals.new_var(
-            "VarNotFoundException", essentials.VarNotFoundException
-        )
-        self.globals.new_var(
-            "IncorrectTypeException", essentials.IncorrectTypeException
-        )
-        self.globals.new_var(
-            "OutOfRangeException", colls.OutOfRangeException
-        )
-        self.globals.new_var(
-            "KeyNotFoundException", colls.KeyNotFoundException
-        )
-        self.globals.new_var(
-            "ModuleVarNotFoundException", colls.ModuleVarNotFoundException
-        )
+        self.globals = GlobalEnv(self, parent=BUILTINS)
+        self.constants = ConstantPool()
 
     def run_src(self, src: str) -> Result:
         """Run baba-lang source code as a string"""
         ast_ = parse_to_ast(src)
         ast_ = StaticChecker().visit(ast_)
+        ast_ = self.constants.rewrite(ast_)
+        if self.profile is not None:
+            self._apply_profile(ast_, src)
         return self.visit(ast_)
 
+    def _apply_profile(self, ast_: nodes._AstNode, src: str) -> None:
+        """Compile the functions and loops of a script that the profile
+        found hot, so that it starts without warming up"""
+        profile = cast(Profile, self.profile)
+        sites = profile.register(ast_, src, self.path)
+        if not self.tier_threshold:
+            return
+        compiler = Compiler(profile)
+        for node in sites:
+            if not profile.is_hot(node, self.tier_threshold):
+                continue
+            match node:
+                case nodes.FunctionStmt() | nodes.FunctionLiteral():
+                    node.code = essentials.FunctionCode(node)
+                    node.code.compiled = compiler.compile_body(node.body)
+                case nodes.WhileStmt():
+                    node.compiled = compiler.compile_loop(node)
+
     def visit(self, node: nodes._AstNode) -> Result:
         # pylint: disable=protected-access
         match node:
@@ -127,6 +191,12 @@ class ASTInterpreter(ASTVisitor):
                 if isinstance(cond, BLError):
                     return cond
                 cond = cond.to_bool(self, meta)
+                if self.recorder is not None and isinstance(
+                    cond, essentials.Bool
+                ):
+                    self.recorder.record_branch(
+                        node, 0 if cond.value else None
+                    )
                 match cond:
                     case BLError():
                         return cond
@@ -142,6 +212,12 @@ class ASTInterpreter(ASTVisitor):
                 if isinstance(cond, BLError):
                     return cond
                 cond = cond.to_bool(self, meta)
+                if self.recorder is not None and isinstance(
+                    cond, essentials.Bool
+                ):
+                    self.recorder.record_branch(
+                        node, 0 if cond.value else None
+                    )
                 match cond:
                     case BLError():
                         return cond
@@ -149,29 +225,28 @@ class ASTInterpreter(ASTVisitor):
                         return self.visit_stmt(then_body)
                     case essentials.Bool(False):
                         return self.visit_stmt(else_body)
-            case nodes.WhileStmt(
-                meta=meta, condition=condition, body=body,
-                eval_cond_after_body=eval_cond_after_body,
+            case nodes.IfChain(
+                conditions=conditions, bodies=bodies, else_body=else_body
             ):
-                eval_condition = not eval_cond_after_body
-                while True:
-                    if eval_condition:
-                        cond = self.visit_expr(condition)
-                        if isinstance(cond, BLError):
+                for i, (condition, body) in enumerate(zip(conditions, bodies)):
+                    cond = self.visit_expr(condition)
+                    if isinstance(cond, BLError):
+                        return cond
+                    cond = cond.to_bool(self, condition.meta)
+                    match cond:
+                        case BLError():
                             return cond
-                        cond = cond.to_bool(self, meta)
-                        match cond:
-                            case BLError():
-                                return cond
-                            case essentials.Bool(False):
-                                return Success()
-                    res = self.visit_stmt(body)
-                    if isinstance(res, exits.Continue):
-                        pass
-                    elif isinstance(res, exits.Exit):
-                        return res
-                    if eval_cond_after_body:
-                        eval_condition = True
+                        case essentials.Bool(True):
+                            if self.recorder is not None:
+                                self.recorder.record_branch(node, i)
+                            return self.visit_stmt(body)
+                if self.recorder is not None:
+                    self.recorder.record_branch(node, None)
+                if else_body is None:
+                    return Success()
+                return self.visit_stmt(else_body)
+            case nodes.WhileStmt():
+                return self.visit_while(node)
             case nodes.ForEachStmt(
                 meta=meta, ident=ident, iterable=iterable, body=body
             ):
@@ -185,7 +260,7 @@ class ASTInterpreter(ASTVisitor):
                     match el := iterator_.next(self, meta):
                         case BLError():
                             return el
-                        case iterator.Item(vars={"value": value}):
+                        case iterator.Item(value=value):
                             self.assign(
                                 meta, nodes.VarPattern(meta, ident), value
                             )
@@ -200,6 +275,14 @@ class ASTInterpreter(ASTVisitor):
                 return exits.Break()
             case nodes.ContinueStmt():
                 return exits.Continue()
+            case nodes.AnnotatedAssign(
+                meta=meta, name=name, annotation=annotation, right=right
+            ):
+                # Only left by the static checker if it isn't run
+                return self.visit_expr(nodes.Assign(
+                    meta, nodes.VarPattern(meta, name),
+                    nodes.TypeCheck(meta, right, annotation, f"'{name}'"),
+                ))
             case nodes.ReturnStmt(value=value):
                 res = None if value is None else self.visit_expr(value)
                 if isinstance(res, BLError):
@@ -230,31 +313,56 @@ class ASTInterpreter(ASTVisitor):
                         return self.visit_stmt(catch.body)
             case nodes.FunctionStmt(name=name, form_args=form_args, body=body):
                 env = None if self.locals is None else self.locals.copy()
+                if node.code is None:
+                    node.code = essentials.FunctionCode(node)
                 self.globals.new_var(name, essentials.BLFunction(
-                    str(name), form_args, body, env
+                    str(name), form_args, body, env, code=node.code
                 ))
                 return Success()
             case nodes.ModuleStmt(name=name, entries=entries):
                 # Create new environment
-                self.globals = Env(self, parent=self.globals)
+                outer = self.globals
+                self.globals = GlobalEnv(self, parent=outer)
                 # Evaluate the body
                 for entry in entries.entries:
                     match res := self.visit(entry):
                         case BLError():
+                            self.globals = outer
                             return res
                 vars_ = {
                     str(name): var.value
                     for name, var in self.globals.vars.items()
                 }
                 # Clean up
-                if self.globals.parent is not None:
-                    self.globals = self.globals.parent
+                self.globals = outer
                 self.globals.new_var(name, colls.Module(name, vars_))
                 return Success()
             case nodes.ClassStmt():
                 return self.visit_class(node)
+            case nodes.FieldsStmt():
+                # Read by visit_class
+                return Success()
             case nodes.IncludeStmt():
                 return self.visit_include(node)
+            case nodes.BuilderBegin(meta=meta, names=names):
+                for name in names:
+                    value = self._get_var(name, meta)
+                    if isinstance(value, essentials.String):
+                        self._set_var(name, text.StringBuilder(
+                            [value.value], implicit=True
+                        ), meta)
+                return Success()
+            case nodes.BuilderEnd(meta=meta, names=names):
+                for name in names:
+                    value = self._get_var(name, meta)
+                    if (
+                        isinstance(value, text.StringBuilder)
+                        and value.implicit
+                    ):
+                        self._set_var(
+                            name, essentials.String(value.join()), meta
+                        )
+                return Success()
         return BLError(cast_to_instance(
             NotImplementedException.new(
                 [essentials.String("Statement type not supported")], self,
@@ -269,19 +377,20 @@ class ASTInterpreter(ASTVisitor):
         super_ = node.super
         entries = node.entries
         # Create new environment
-        self.globals = Env(self, parent=self.globals)
+        outer = self.globals
+        self.globals = GlobalEnv(self, parent=outer)
         # Evaluate the body
         for entry in entries.entries:
             match res := self.visit(entry):
                 case BLError():
+                    self.globals = outer
                     return res
         vars_ = {
             str(name): var.value
             for name, var in self.globals.vars.items()
         }
         # Clean up
-        if self.globals.parent is not None:
-            self.globals = self.globals.parent
+        self.globals = outer
         # Create the class
         if super_ is None:
             superclass_res = essentials.ObjectClass
@@ -296,11 +405,156 @@ class ASTInterpreter(ASTVisitor):
                     return BLError(cast_to_instance(
                         essentials.IncorrectTypeException.new([], self, meta)
                     ), meta, self.path)
+        # Fields are declared if any fields statement is there, even empty
+        declarations = [
+            entry for entry in entries.entries
+            if isinstance(entry, nodes.FieldsStmt)
+        ]
+        if declarations or superclass_res.fields is not None:
+            fields: tuple[str, ...] | None = tuple(dict.fromkeys([
+                *(superclass_res.fields or ()),
+                *(str(name) for entry in declarations for name in entry.names),
+            ]))
+        else:
+            fields = None
         self.globals.new_var(name, essentials.Class(
-            essentials.String(name), superclass_res, vars_
+            essentials.String(name), superclass_res, vars_, fields
         ))
         return Success()
 
+    def visit_binary_chain(self, node: nodes.BinaryChain) -> ExpressionResult:
+        """Visit a chain of binary operations
+
+        Strings added one after another are joined at once rather than one
+        at a time, which would take quadratic time."""
+        meta = node.meta
+        operands = node.operands
+        left = self.visit_expr(operands[0])
+        if isinstance(left, BLError):
+            return left
+        # Pending string concatenation, to be joined into left
+        parts: list[str] = []
+        for i, (op, operand) in enumerate(zip(node.ops, operands[1:])):
+            right = self.visit_expr(operand)
+            if isinstance(right, BLError):
+                return right
+            if self.recorder is not None:
+                self.recorder.record_binary(node, i, left, right)
+            if (
+                op == "+" and isinstance(right, essentials.String)
+                and (parts or isinstance(left, essentials.String))
+            ):
+                if not parts:
+                    parts.append(cast(essentials.String, left).value)
+                parts.append(right.value)
+                continue
+            if parts:
+                left = essentials.String("".join(parts))
+                parts.clear()
+            left = left.binary_op(op, right, self, meta)
+            if isinstance(left, BLError):
+                return left
+        if parts:
+            return essentials.String("".join(parts))
+        return left
+
+    def visit_while(self, node: nodes.WhileStmt) -> Result:
+        """Visit a while statement node
+
+        Loops are compiled once they have run tier_threshold iterations in
+        total, and continue in compiled form from the next iteration on."""
+        meta = node.meta
+        condition = node.condition
+        body = node.body
+        eval_cond_after_body = node.eval_cond_after_body
+        if node.compiled is not None:
+            return node.compiled(self, not eval_cond_after_body)
+        if self.recorder is not None:
+            self.recorder.record_loop(node, True)
+        eval_condition = not eval_cond_after_body
+        while True:
+            if eval_condition:
+                cond = self.visit_expr(condition)
+                if isinstance(cond, BLError):
+                    return cond
+                cond = cond.to_bool(self, meta)
+                match cond:
+                    case BLError():
+                        return cond
+                    case essentials.Bool(False):
+                        return Success()
+            res = self.visit_stmt(body)
+            if isinstance(res, exits.Continue):
+                pass
+            elif isinstance(res, exits.Exit):
+                return res
+            if eval_cond_after_body:
+                eval_condition = True
+            if self.recorder is not None:
+                self.recorder.record_loop(node, False)
+            if self.tier_threshold:
+                node.back_edges += 1
+                if node.back_edges >= self.tier_threshold:
+                    node.compiled = Compiler(self.profile).compile_loop(node)
+                    return node.compiled(self, True)
+
+    def visit_call_body(
+        self, body: nodes.Body, code: essentials.FunctionCode,
+        meta: Meta | None,
+    ) -> Result:
+        """Run the body of a function being called
+
+        Bodies are compiled once their functions have been called
+        tier_threshold times, and run in compiled form from then on.
+
+        Each call takes a handful of Python frames, so deep recursion would
+        run into RecursionError (reported as RecursionDepthException). In
+        stackless mode, every SEGMENT_DEPTH calls the body is instead run on
+        a new thread, which starts with a fresh Python stack while the
+        calling thread waits for it. The Python stack of any one thread is
+        then bounded, and only max_depth limits recursion."""
+        if code.compiled is None and self.tier_threshold:
+            code.calls += 1
+            if code.calls >= self.tier_threshold:
+                code.compiled = Compiler(self.profile).compile_body(body)
+        if self.stackless and len(self.traceback) % SEGMENT_DEPTH == 0:
+            return self._run_segment(body, code)
+        try:
+            if code.compiled is not None:
+                return code.compiled(self)
+            return self.visit_stmt(body)
+        except RecursionError:
+            return BLError(cast_to_instance(
+                essentials.RecursionDepthException.new([essentials.String(
+                    "Python stack exhausted, try stackless mode"
+                )], self, meta)
+            ), meta, self.path)
+
+    def _run_segment(
+        self, body: nodes.Body, code: essentials.FunctionCode
+    ) -> Result:
+        outcome: list[Result | BaseException] = []
+
+        def run() -> None:
+            try:
+                if code.compiled is not None:
+                    outcome.append(code.compiled(self))
+                else:
+                    outcome.append(self.visit_stmt(body))
+            except BaseException as e:  # pylint: disable=broad-except
+                outcome.append(e)
+
+        old_size = threading.stack_size(SEGMENT_STACK_SIZE)
+        try:
+            thread = threading.Thread(target=run)
+            thread.start()
+        finally:
+            threading.stack_size(old_size)
+        thread.join()
+        if isinstance(res := outcome[0], BaseException):
+            raise res
+        return res
+
     def visit_include(self, node: nodes.IncludeStmt) -> Result:
         """Visit an include statement node"""
         if self.path is None:
@@ -328,17 +582,18 @@ class ASTInterpreter(ASTVisitor):
         try:
             res = self.run_src(src)
         except (UnexpectedInput, StaticError):
+            res = None
+        if isinstance(res, BLError):
+            res.capture_traceback(self.traceback)
+        self.traceback.pop()
+        self.path = None if old_path is None else str(old_path)
+        if res is None:
             return BLError(cast_to_instance(
                 InvalidIncludeException.new([essentials.String(
                     f"Source file {new_path} has a compile-time error. " +
                     "Check it."
                 )], self, node.meta)
             ), node.meta, self.path)
-        match res:
-            case BLError():
-                return res
-        self.traceback.pop()
-        self.path = None if old_path is None else str(old_path)
         return res
 
     def _find_src(
@@ -376,6 +631,11 @@ class ASTInterpreter(ASTVisitor):
                     return rhs_result
                 if isinstance(rhs_result, Value):
                     return self.inplace(meta, pattern, op, rhs_result)
+            case nodes.BuilderInplace(meta=meta, inplace=inplace):
+                rhs_result = self.visit_expr(inplace.right)
+                if isinstance(rhs_result, BLError):
+                    return rhs_result
+                return self.builder_inplace(meta, inplace, rhs_result)
             case nodes.LogicalOp(left=left_node, op=op, right=right):
                 left = self.visit_expr(left_node)
                 if isinstance(left, BLError):
@@ -389,6 +649,20 @@ class ASTInterpreter(ASTVisitor):
                 ):
                     return left
                 return self.visit_expr(right)
+            case nodes.LogicalChain(operands=operands, op=op):
+                *lefts, last = operands
+                for left_node in lefts:
+                    left = self.visit_expr(left_node)
+                    if isinstance(left, BLError):
+                        return left
+                    left_bool = left.to_bool(self, left_node.meta)
+                    if isinstance(left_bool, BLError):
+                        return left_bool
+                    if left_bool.value == (op == "||"):
+                        return left
+                return self.visit_expr(last)
+            case nodes.BinaryChain():
+                return self.visit_binary_chain(node)
             case nodes.BinaryOp(meta=meta, left=left, op=op, right=right):
                 left = self.visit_expr(left)
                 if isinstance(left, BLError):
@@ -396,6 +670,8 @@ class ASTInterpreter(ASTVisitor):
                 right = self.visit_expr(right)
                 if isinstance(right, BLError):
                     return right
+                if self.recorder is not None:
+                    self.recorder.record_binary(node, 0, left, right)
                 return left.binary_op(op, right, self, meta)
             case nodes.Subscript(
                 meta=meta, subscriptee=subscriptee, index=index
@@ -407,6 +683,23 @@ class ASTInterpreter(ASTVisitor):
                 if isinstance(index, BLError):
                     return index
                 return subscriptee.get_item(index, self, meta)
+            case nodes.Slice(
+                meta=meta, subscriptee=subscriptee,
+                start=start, stop=stop, step=step,
+            ):
+                subscriptee = self.visit_expr(subscriptee)
+                if isinstance(subscriptee, BLError):
+                    return subscriptee
+                bounds = []
+                for bound in (start, stop, step):
+                    bound = (
+                        essentials.NULL if bound is None
+                        else self.visit_expr(bound)
+                    )
+                    if isinstance(bound, BLError):
+                        return bound
+                    bounds.append(bound)
+                return subscriptee.get_slice(*bounds, self, meta)
             case nodes.Call(meta=meta, callee=callee, args=args_in_ast):
                 # Visit all args, stop if one is an error
                 args = []
@@ -418,6 +711,8 @@ class ASTInterpreter(ASTVisitor):
                 callee = self.visit_expr(callee)
                 if isinstance(callee, BLError):
                     return callee
+                if self.recorder is not None:
+                    self.recorder.record_call(node, callee)
                 return callee.call(args, self, meta)
             case nodes.New(meta=meta, class_name=name, args=args_):
                 # Visit all args, stop if one is an error
@@ -443,8 +738,21 @@ class ASTInterpreter(ASTVisitor):
                 if isinstance(accessee, BLError):
                     return accessee
                 return accessee.get_attr(attr, self, meta)
-            case nodes.Var(meta=meta, name=name):
-                return self._get_var(name, meta)
+            case nodes.Var():
+                return self.visit_var(node)
+            case nodes.NumericExpr(expr=expr):
+                # Only the compiler runs these on raw numbers
+                return self.visit_expr(expr)
+            case nodes.TypeCheck(
+                meta=meta, expr=expr, annotation=annotation, what=what
+            ):
+                res = self.visit_expr(expr)
+                if isinstance(res, BLError):
+                    return res
+                error = self.check_type(res, str(annotation.name), what, meta)
+                return res if error is None else error
+            case nodes.Constant(value=value):
+                return value
             case nodes.String(value=value):
                 return essentials.String(value)
             case nodes.Int(value=value):
@@ -465,17 +773,25 @@ class ASTInterpreter(ASTVisitor):
                         return e_visited
                     elems.append(e_visited)
                 return colls.BLList(elems)
-            case nodes.Dict(pairs=pairs):
-                content = {}
+            case nodes.Dict(meta=meta, pairs=pairs):
+                dict_ = colls.BLDict({})
                 for pair in pairs:
-                    k_visited = self.visit(pair.key)
-                    v_visited = self.visit(pair.value)
-                    content[k_visited] = v_visited
-                return colls.BLDict(content)
+                    k_visited = self.visit_expr(pair.key)
+                    if isinstance(k_visited, BLError):
+                        return k_visited
+                    v_visited = self.visit_expr(pair.value)
+                    if isinstance(v_visited, BLError):
+                        return v_visited
+                    res = dict_.set(meta, self, k_visited, v_visited)
+                    if isinstance(res, BLError):
+                        return res
+                return dict_
             case nodes.FunctionLiteral(form_args=form_args, body=body):
                 env = None if self.locals is None else self.locals.copy()
+                if node.code is None:
+                    node.code = essentials.FunctionCode(node)
                 return essentials.BLFunction(
-                    "<anonymous>", form_args, body, env
+                    "<anonymous>", form_args, body, env, code=node.code
                 )
         return BLError(cast_to_instance(
             NotImplementedException.new([], self, node.meta)
@@ -516,6 +832,7 @@ class ASTInterpreter(ASTVisitor):
         """Visit an in-place assignment node"""
         # to solve the unbound problem
         accessee = cast(Value, essentials.ObjectClass.new([], self, meta))
+        index: ExpressionResult = essentials.NULL
         if isinstance(pattern, nodes.VarPattern):
             old_value_get_result = self._get_var(pattern.name, meta)
         elif isinstance(pattern, nodes.DotPattern):
@@ -539,7 +856,7 @@ class ASTInterpreter(ASTVisitor):
             ), meta, self.path)
         if isinstance(old_value_get_result, BLError):
             return old_value_get_result
-        new_result = old_value_get_result.binary_op(
+        new_result = old_value_get_result.inplace_op(
             op[:-1], right, self, meta
         )
         match new_result:
@@ -555,27 +872,88 @@ class ASTInterpreter(ASTVisitor):
             self._set_var(pattern.name, new_result, meta)
         if isinstance(pattern, nodes.DotPattern):
             accessee.set_attr(pattern.attr_name, new_result, self, meta)
+        if isinstance(pattern, nodes.SubscriptPattern):
+            res = accessee.set_item(index, new_result, self, meta)
+            if isinstance(res, BLError):
+                return res
         return new_result
 
+    def builder_inplace(
+        self, meta: Meta, node: nodes.Inplace, right: Value
+    ) -> ExpressionResult:
+        """Visit an in-place addition to a possible implicit string builder"""
+        name = cast(nodes.VarPattern, node.pattern).name
+        builder = self._get_var(name, meta)
+        if isinstance(builder, text.StringBuilder) and builder.implicit:
+            if isinstance(right, essentials.String):
+                builder.push(right.value)
+                return builder
+            # Not a string concatenation after all, fall back to the string
+            self._set_var(name, essentials.String(builder.join()), meta)
+        return self.inplace(meta, node.pattern, node.op, right)
+
+    def check_type(
+        self, value: Value, type_: str, what: str, meta: Meta | None
+    ) -> BLError | None:
+        """Check a value against the type named by an annotation, getting
+        the error if it fails"""
+        if isinstance(value, ANNOTATION_TYPES[type_]):
+            return None
+        actual = next(
+            (
+                name for name, type_ in ANNOTATION_TYPES.items()
+                if isinstance(value, type_)
+            ),
+            type(value).__name__,
+        )
+        return BLError(cast_to_instance(
+            essentials.IncorrectTypeException.new([essentials.String(
+                f"{what} should be {type_}, not {actual}"
+            )], self, meta)
+        ), meta, self.path)
+
+    def visit_var(self, node: nodes.Var) -> ExpressionResult:
+        """Visit a variable reference
+
+        Global variables are looked up once per node and version of the
+        global environments (see GlobalEnv)."""
+        name = node.name
+        if self.locals is not None:
+            var = self.locals.lookup_var(name)
+            if var is not essentials.MISSING:
+                return var.value
+        cache = node.cache
+        globals_ = self.globals
+        if cache[0] is globals_ and cache[1] == globals_.root.version:
+            return cache[2].value
+        if (var := globals_.lookup_var(name)) is essentials.MISSING:
+            return globals_.var_not_found(node.meta)
+        cache[:] = globals_, globals_.root.version, var
+        return var.value
+
     def _get_var(self, name: str, meta: Meta) -> ExpressionResult:
         """Get a variable either from locals or globals"""
-        if self.locals is not None:
-            res = self.locals.get_var(name, meta)
-            if isinstance(res, Value):
-                return res
-        return self.globals.get_var(name, meta)
+        if (var := self._lookup_var(name)) is essentials.MISSING:
+            return self.globals.var_not_found(meta)
+        return var.value
 
     def _set_var(self, name: str, value: Value, meta: Meta) -> BLError | None:
         """Set a variable either in locals or globals"""
         if self.locals is not None:
-            res = self.locals.set_var(name, value, meta)
-            match res:
-                case BLError(value=value):
-                    if value.class_ == essentials.VarNotFoundException:
-                        return self.globals.set_var(name, value, meta)
-                    return res
+            var = self.locals.lookup_var(name)
+            if var is not essentials.MISSING:
+                var.value = value
+                return None
         return self.globals.set_var(name, value, meta)
 
+    def _lookup_var(self, name: str) -> essentials.Var | essentials.Missing:
+        """Resolve a variable either in locals or globals"""
+        if self.locals is not None:
+            var = self.locals.lookup_var(name)
+            if var is not essentials.MISSING:
+                return var
+        return self.globals.lookup_var(name)
+
     def _new_var(self, name: str, value: Value) -> None:
         """Assign a new variable either in locals or globals"""
         if self.locals is not None:
@@ -0,0 +1,211 @@
+"""Script profiles, for profile-guided optimization
+
+A profile records how a script ran: the types of the operands of binary
+operators, the functions called from each call site, how often branches are
+taken and how many iterations loops run. Loading it on later runs of the
+script compiles its hot functions and loops upfront (instead of warming up
+again, see ASTInterpreter.tier_threshold), specialized to what was recorded.
+
+Sites are keyed by a hash of their source and their position in it, so sites
+of a source that changed since are never found, and simply ignored. Nothing
+is compiled while a profile is recorded, so that all code is seen."""
+
+
+import json
+from hashlib import sha256
+from pathlib import Path
+
+from bl_ast import nodes
+from bl_ast.base import _AstNode
+from static_checker.optimizer import _walk
+
+from .bl_types.essentials import Value, BLFunction
+
+
+# Version of the profile format, profiles of other versions are ignored
+PROFILE_VERSION = 1
+
+# Nodes recorded in profiles
+_SITES = (
+    nodes.BinaryOp, nodes.BinaryChain, nodes.Call, nodes.IfStmt,
+    nodes.IfElseStmt, nodes.IfChain, nodes.WhileStmt, nodes.FunctionStmt,
+    nodes.FunctionLiteral,
+)
+
+type Site = (
+    nodes.BinaryOp | nodes.BinaryChain | nodes.Call | nodes.IfStmt
+    | nodes.IfElseStmt | nodes.IfChain | nodes.WhileStmt
+    | nodes.FunctionStmt | nodes.FunctionLiteral
+)
+
+
+def _is_counters(value: object) -> bool:
+    """Check if a loaded value is the counters of a site"""
+    return isinstance(value, dict) and all(
+        isinstance(count, int) and not isinstance(count, bool)
+        for count in value.values()
+    )
+
+
+class Profile:
+    """Type, call target, branch and loop trip count profile of a script"""
+
+    recording: bool
+    # Paths of the sources profiled, by hash
+    scripts: dict[str, str | None]
+    # Counters of each site
+    sites: dict[str, dict[str, int]]
+    # Keys of the sites of the sources run, by node id
+    keys: dict[int, str]
+    # Nodes of the sources run, keeping their ids from being reused
+    registered: list[Site]
+    # Calls to each function, summed over the call sites
+    _calls: dict[str, int] | None
+
+    def __init__(
+        self, *, recording: bool = False,
+        scripts: dict[str, str | None] | None = None,
+        sites: dict[str, dict[str, int]] | None = None,
+    ) -> None:
+        self.recording = recording
+        self.scripts = {} if scripts is None else scripts
+        self.sites = {} if sites is None else sites
+        self.keys = {}
+        self.registered = []
+        self._calls = None
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Profile":
+        """Load a profile, or get an empty one if the file is missing, not
+        a valid profile or from another version"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        match data:
+            case {
+                "version": version, "scripts": dict(scripts),
+                "sites": dict(sites),
+            } if (
+                version == PROFILE_VERSION
+                and all(
+                    path is None or isinstance(path, str)
+                    for path in scripts.values()
+                )
+                and all(_is_counters(counters) for counters in sites.values())
+            ):
+                return cls(scripts=scripts, sites=sites)
+        return cls()
+
+    def save(self, path: str | Path) -> None:
+        """Save the profile"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": PROFILE_VERSION,
+                "scripts": self.scripts,
+                "sites": self.sites,
+            }, f, indent=1)
+
+    def register(
+        self, ast_: _AstNode, src: str, path: str | None
+    ) -> list[Site]:
+        """Key the sites of a source about to be run, returning them"""
+        digest = sha256(src.encode("utf-8")).hexdigest()
+        if self.recording:
+            self.scripts[digest] = path
+        sites = [
+            node for node in _walk(ast_)
+            if isinstance(node, _SITES) and not node.meta.empty
+        ]
+        for node in sites:
+            meta = node.meta
+            self.keys[id(node)] = (
+                f"{digest}:{meta.start_pos}-{meta.end_pos}"
+            )
+        self.registered.extend(sites)
+        return sites
+
+    def _count(self, node: Site, counter: str) -> None:
+        if (key := self.keys.get(id(node))) is None:
+            return
+        counters = self.sites.setdefault(key, {})
+        counters[counter] = counters.get(counter, 0) + 1
+
+    def record_binary(
+        self, node: nodes.BinaryOp | nodes.BinaryChain, index: int,
+        left: Value, right: Value,
+    ) -> None:
+        """Record the operand types of the index-th operator of a node"""
+        self._count(
+            node, f"{index}:{type(left).__name__},{type(right).__name__}"
+        )
+
+    def record_call(self, node: nodes.Call, callee: Value) -> None:
+        """Record the function called by a call site"""
+        target = None
+        if isinstance(callee, BLFunction):
+            definition = callee.code.definition
+            target = self.keys.get(id(definition))
+        self._count(node, type(callee).__name__ if target is None else target)
+
+    def record_branch(
+        self, node: nodes.IfStmt | nodes.IfElseStmt | nodes.IfChain,
+        index: int | None,
+    ) -> None:
+        """Record the branch taken by an if statement, None for else"""
+        self._count(node, "else" if index is None else str(index))
+
+    def record_loop(self, node: nodes.WhileStmt, entry: bool) -> None:
+        """Record a loop being entered, or starting another iteration"""
+        self._count(node, "entries" if entry else "iterations")
+
+    def _counters(self, node: Site) -> dict[str, int] | None:
+        if (key := self.keys.get(id(node))) is None:
+            return None
+        return self.sites.get(key)
+
+    def is_hot(self, node: Site, threshold: int) -> bool:
+        """Check if a function was called, or a loop iterated, at least
+        threshold times"""
+        match node:
+            case nodes.FunctionStmt() | nodes.FunctionLiteral():
+                if (key := self.keys.get(id(node))) is None:
+                    return False
+                if self._calls is None:
+                    # Counters of call sites are named after their targets,
+                    # which no counter of other sites is
+                    self._calls = {}
+                    for counters in self.sites.values():
+                        for target, count in counters.items():
+                            self._calls[target] = (
+                                self._calls.get(target, 0) + count
+                            )
+                return self._calls.get(key, 0) >= threshold
+            case nodes.WhileStmt():
+                counters = self._counters(node)
+                return (
+                    counters is not None
+                    and counters.get("iterations", 0) >= threshold
+                )
+        return False
+
+    def binary_types(
+        self, node: nodes.BinaryOp | nodes.BinaryChain, index: int
+    ) -> set[str] | None:
+        """Operand types seen by the index-th operator of a node, as
+        "Left,Right" type names, or None if it wasn't profiled"""
+        if (counters := self._counters(node)) is None:
+            return None
+        prefix = f"{index}:"
+        return {
+            counter.removeprefix(prefix) for counter in counters
+            if counter.startswith(prefix)
+        }
+
+    def branch_counts(
+        self, node: nodes.IfStmt | nodes.IfElseStmt | nodes.IfChain
+    ) -> dict[str, int] | None:
+        """Times each branch of an if statement was taken ("0", "1", ...
+        and "else"), or None if it wasn't profiled"""
+        return self._counters(node)
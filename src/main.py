@@ -15,7 +15,7 @@ from lark.exceptions import UnexpectedInput
 from lark.tree import Meta
 
 from interpreter import (
-    ASTInterpreter, BLError, Result, Value, Call, Script
+    ASTInterpreter, BLError, Result, Value, Call, Script, Profile
 )
 from static_checker import StaticChecker, StaticError
 
@@ -44,6 +44,35 @@ argparser.add_argument(
     help='Print result',
     action='store_true',
 )
+argparser.add_argument(
+    '--stackless',
+    help='Allow deep recursion, by running calls in stack segments',
+    action='store_true',
+)
+argparser.add_argument(
+    '--max-depth',
+    help='Maximum call depth (default: %(default)s)',
+    type=int,
+    default=10000,
+)
+argparser.add_argument(
+    '--tier-threshold',
+    help='Calls of a function or iterations of a loop before it is '
+    'compiled, 0 to never compile (default: %(default)s)',
+    type=int,
+    default=1000,
+)
+argparser.add_argument(
+    '--profile',
+    help='Start from a profile recorded by earlier runs of the script, '
+    'compiling what was hot upfront',
+    metavar='FILE',
+)
+argparser.add_argument(
+    '--record-profile',
+    help='Record a profile of the run to be used with --profile',
+    metavar='FILE',
+)
 
 
 default_interp = ASTInterpreter()
@@ -97,12 +126,14 @@ def handle_runtime_errors(
                     print(value.dump(interpreter, meta).value)
             print('Traceback:')
             print()
-            for i, frame in enumerate(interpreter.traceback[1:], 1):
+            if (traceback := result.traceback) is None:
+                traceback = interpreter.traceback
+            for i, frame in enumerate(traceback[1:], 1):
                 match frame:
                     case Call(path=path, meta=meta):
                         pass
                     case Script(meta=meta):
-                        prev_frame = interpreter.traceback[i-1]
+                        prev_frame = traceback[i-1]
                         path = (
                             prev_frame.path if prev_frame.path is not None
                             else None
@@ -149,13 +180,27 @@ def main() -> int:
     """Main function"""
     args = argparser.parse_args()
     if args.path is None:
+        default_interp.max_depth = args.max_depth
+        default_interp.stackless = args.stackless
+        default_interp.tier_threshold = args.tier_threshold
         return main_interactive()
     path = os.path.abspath(args.path)
     src_stream = open(path, encoding='utf-8')
     with src_stream:
         src = src_stream.read()
-    interpreter = ASTInterpreter(path)
+    if args.record_profile is not None:
+        profile: Profile | None = Profile(recording=True)
+    elif args.profile is not None:
+        profile = Profile.load(args.profile)
+    else:
+        profile = None
+    interpreter = ASTInterpreter(
+        path, max_depth=args.max_depth, stackless=args.stackless,
+        tier_threshold=args.tier_threshold, profile=profile,
+    )
     res = interp_with_error_handling(src, interpreter)
+    if profile is not None and profile.recording:
+        profile.save(args.record_profile)
     match res:
         case UnexpectedInput() | StaticError() | BLError():
             return 1
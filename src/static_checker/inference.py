@@ -0,0 +1,666 @@
+"""Type inference pass run after the syntax check"""
+
+
+from collections.abc import Iterator
+from dataclasses import fields, replace
+from typing import Any
+
+from bl_ast.base import ASTVisitor, _AstNode
+from bl_ast import nodes
+
+from .errors import StaticError
+from .optimizer import _walk, _ESCAPING
+
+
+# Types inferred, named after the classes of their values
+INT = "Int"
+FLOAT = "Float"
+BOOL = "Bool"
+STRING = "String"
+LIST = "List"
+DICT = "Dict"
+NULL = "Null"
+NUMBERS = frozenset({INT, FLOAT})
+# Types that annotations may name
+ANNOTATIONS = frozenset({INT, FLOAT, BOOL, STRING, LIST, DICT, NULL})
+
+# Types of the locals known at a point of a function, None if unreachable
+type State = dict[str, str] | None
+# Expression as rewritten, its type if known, and whether it is an operation
+# on numbers only
+type Inferred = tuple[nodes._Expr, str | None, bool]
+
+# Operators on two numbers, and the type of their results
+_ARITHMETIC = frozenset({"+", "-", "*"})
+_BITWISE = frozenset({"&", "|", "^"})
+_FLOAT_RESULT = frozenset({"/", "%", "%/%"})
+_COMPARISONS = frozenset({"==", "!=", "<", "<=", ">", ">="})
+
+# Built-in functions converting to numbers
+_CONVERSIONS = {"to_int": INT, "to_float": FLOAT}
+
+# Nodes with scopes of their own
+_SCOPES = (
+    nodes.FunctionStmt, nodes.FunctionLiteral, nodes.ClassStmt,
+    nodes.ModuleStmt,
+)
+
+
+def binary_type(op: str, left: str | None, right: str | None) -> str | None:
+    """Type of a binary operation on values of known types, if known"""
+    if left not in NUMBERS or right not in NUMBERS:
+        return None
+    if op in _ARITHMETIC:
+        return INT if left == right == INT else FLOAT
+    if op in _BITWISE:
+        return INT if left == right == INT else None
+    if op in _FLOAT_RESULT:
+        return FLOAT
+    if op in _COMPARISONS:
+        return BOOL
+    return None
+
+
+def prefix_type(op: str, operand: str | None) -> str | None:
+    """Type of a unary operation on a value of known type, if known"""
+    if op in ("+", "-") and operand in NUMBERS:
+        return operand
+    if op == "~" and operand == INT:
+        return INT
+    return None
+
+
+def _join(*states: State) -> State:
+    """Types known on all the paths reaching a point"""
+    live = [state for state in states if state is not None]
+    if not live:
+        return None
+    first, *rest = live
+    return {
+        name: type_ for name, type_ in first.items()
+        if all(state.get(name) == type_ for state in rest)
+    }
+
+
+def _bindings(node: _AstNode, name: str) -> int:
+    """Count the places a tree binds a name at"""
+    count = 0
+    for child in _walk(node):
+        match child:
+            case (
+                nodes.VarPattern(name=name_) | nodes.FunctionStmt(name=name_)
+                | nodes.ForEachStmt(ident=name_)
+                | nodes.CatchClause(ident=name_)
+                | nodes.AnnotatedAssign(name=name_)
+            ) if name_ == name:
+                count += 1
+            case nodes.FormArgs(args=args) if name in args:
+                count += 1
+    return count
+
+
+def _scope(body: nodes.Body) -> Iterator[_AstNode]:
+    """Yield the nodes of a function body (or script), but not those of the
+    functions, classes and modules in it"""
+    stack: list[_AstNode] = [body]
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, _SCOPES):
+            continue
+        for field in fields(node):  # type: ignore[arg-type]
+            value = getattr(node, field.name)
+            if isinstance(value, _AstNode):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(
+                    item for item in value if isinstance(item, _AstNode)
+                )
+
+
+def _local_annotations(
+    form_args: nodes.FormArgs | None, body: nodes.Body
+) -> dict[str, nodes.Annotation]:
+    """Annotations of the arguments and locals of a function (or script)"""
+    declared = [] if form_args is None else [
+        (name, annotation)
+        for name, annotation in zip(form_args.args, form_args.annotations)
+        if annotation is not None
+    ]
+    declared.extend(sorted(
+        (
+            (child.name, child.annotation) for child in _scope(body)
+            if isinstance(child, nodes.AnnotatedAssign)
+        ),
+        key=lambda declaration: declaration[1].meta.start_pos,
+    ))
+    annotations: dict[str, nodes.Annotation] = {}
+    for name, annotation in declared:
+        first = annotations.setdefault(str(name), annotation)
+        if first.name != annotation.name:
+            raise StaticError(
+                f"'{name}' is already annotated as {first.name}",
+                annotation.meta,
+            )
+    return annotations
+
+
+def _forget_assigned(node: _AstNode, state: dict[str, str]) -> None:
+    """Forget the types of the locals a tree may assign to"""
+    for child in _walk(node):
+        match child:
+            case nodes.VarPattern(name=name):
+                state.pop(str(name), None)
+            case nodes.BuilderBegin(names=names):
+                for name in names:
+                    state.pop(name, None)
+
+
+class TypeInferencePass(ASTVisitor):
+    """
+    Infers the types of the locals of functions and of the expressions
+    using them, from literals, arithmetic results and calls to to_int,
+    to_float and functions annotated with return types. The inference is
+    flow-sensitive: a local has a type at a point of the function when all
+    paths reaching it assigned a value of that type to the local last, so
+    branches join and loops are iterated until their types stop changing.
+    Formal arguments are of unknown types, unless annotated (the
+    interpreter checks these when the function is called).
+
+    Operations on numbers only (Int-only, Float-only, or a mix of both
+    promoted to Float as usual) are wrapped in NumericExpr nodes, taking the
+    largest such expressions. The compiler runs these on raw Python numbers,
+    boxing only their results where they escape the expression: into
+    locals, calls, containers, return values... An in-place operation on a
+    local of known type becomes an assignment of such an expression.
+
+    Functions with closures, try statements or anything else that can
+    observe their locals from outside have the types of their locals left
+    unknown, like in StringBuilderPass. So are calls to to_int and to_float
+    if the script binds these names itself, and to annotated functions that
+    it binds elsewhere.
+
+    Assignments to annotated locals and returns from annotated functions
+    are checked against their annotations: a static error if their types
+    are known to be others, a TypeCheck node if they aren't known.
+    """
+
+    def visit(self, node: _AstNode) -> _AstNode:
+        for child in _walk(node):
+            if (
+                isinstance(child, nodes.Annotation)
+                and child.name not in ANNOTATIONS
+            ):
+                raise StaticError(f"unknown type '{child.name}'", child.meta)
+        returns = {
+            name: type_ for name, type_ in _CONVERSIONS.items()
+            if not _bindings(node, name)
+        }
+        if not isinstance(node, nodes.Body):
+            return node
+        for stmt in node.statements:
+            match stmt:
+                case nodes.FunctionStmt(
+                    name=name, return_annotation=nodes.Annotation(name=type_)
+                ) if _bindings(node, name) == 1:
+                    returns[str(name)] = str(type_)
+        functions = [
+            child for child in _walk(node)
+            if isinstance(child, (nodes.FunctionStmt, nodes.FunctionLiteral))
+        ]
+        _FunctionInference(
+            returns, _local_annotations(None, node), None, False
+        ).function(node, {})
+        for function in functions:
+            form_args = function.form_args
+            body = function.body
+            locals_known = not any(
+                isinstance(child, _ESCAPING) for child in _walk(body)
+            )
+            annotations = _local_annotations(form_args, body)
+            state = {
+                str(name): str(annotation.name)
+                for name, annotation in zip(
+                    form_args.args, form_args.annotations
+                )
+                if annotation is not None and locals_known
+            }
+            _FunctionInference(
+                returns, annotations,
+                function.return_annotation
+                if isinstance(function, nodes.FunctionStmt) else None,
+                locals_known,
+            ).function(body, state)
+        return node
+
+
+class _FunctionInference:
+    """Type inference over the body of a function, or over a script"""
+
+    # pylint: disable=too-many-return-statements
+    # pylint: disable=too-many-instance-attributes
+
+    # Types returned by the functions called by name
+    returns: dict[str, str]
+    # Annotations of the locals, and of the return value
+    annotations: dict[str, nodes.Annotation]
+    return_annotation: nodes.Annotation | None
+    # Whether the types of locals can be known, that is, if nothing else
+    # can assign to them
+    locals_known: bool
+    # Whether to rewrite the nodes, off while loops are iterated over
+    rewrite: bool
+    # States at the break and continue statements of the loops entered
+    breaks: list[list[State]]
+    continues: list[list[State]]
+
+    def __init__(
+        self, returns: dict[str, str],
+        annotations: dict[str, nodes.Annotation],
+        return_annotation: nodes.Annotation | None, locals_known: bool,
+    ) -> None:
+        # pylint: disable=too-many-arguments
+        self.returns = returns
+        self.annotations = annotations
+        self.return_annotation = return_annotation
+        self.locals_known = locals_known
+        self.rewrite = True
+        self.breaks = []
+        self.continues = []
+
+    def function(self, node: nodes.Body, state: dict[str, str]) -> None:
+        """Infer over a function body (or a script)"""
+        end = self.body(node, state)
+        annotation = self.return_annotation
+        if end is not None and annotation is not None:
+            # Falling off the end returns null, checked at runtime as the end
+            # may not be reachable after all (e.g. after `while true`)
+            meta = annotation.meta
+            node.statements.append(nodes.ReturnStmt(meta, nodes.TypeCheck(
+                meta, nodes.NullLiteral(meta), annotation, "return value"
+            )))
+
+    def body(self, node: nodes.Body, state: State) -> State:
+        """Infer over a body, returning the state after it"""
+        statements = node.statements
+        for i, stmt in enumerate(statements):
+            if state is None:
+                break
+            new_stmt, state = self.stmt(stmt, state)
+            if self.rewrite:
+                statements[i] = new_stmt
+        return state
+
+    def stmt(
+        self, node: nodes._Stmt, state: dict[str, str]
+    ) -> tuple[nodes._Stmt, State]:
+        """Infer over a statement, returning it as rewritten and the state
+        after it"""
+        # pylint: disable=too-many-branches
+        if isinstance(node, nodes._Expr):
+            return self.boxed(self.expr(node, state)), state
+        match node:
+            case nodes.Body():
+                return node, self.body(node, state)
+            case nodes.IfStmt(condition=condition, body=body):
+                condition = self.boxed(self.expr(condition, state))
+                then_state = self.body(body, dict(state))
+                if self.rewrite:
+                    node.condition = condition
+                return node, _join(state, then_state)
+            case nodes.IfElseStmt(
+                condition=condition, then_body=then_body, else_body=else_body
+            ):
+                condition = self.boxed(self.expr(condition, state))
+                then_state = self.body(then_body, dict(state))
+                else_body, else_state = self.stmt(else_body, dict(state))
+                if self.rewrite:
+                    node.condition = condition
+                    node.else_body = else_body
+                return node, _join(then_state, else_state)
+            case nodes.IfChain(
+                conditions=conditions, bodies=bodies, else_body=else_body
+            ):
+                states: list[State] = []
+                for i, (condition, body) in enumerate(zip(conditions, bodies)):
+                    condition = self.boxed(self.expr(condition, state))
+                    if self.rewrite:
+                        conditions[i] = condition
+                    states.append(self.body(body, dict(state)))
+                if else_body is None:
+                    states.append(state)
+                else:
+                    states.append(self.body(else_body, dict(state)))
+                return node, _join(*states)
+            case nodes.WhileStmt():
+                return node, self.loop(node, state)
+            case nodes.ForEachStmt(meta=meta, ident=ident, iterable=iterable):
+                self.unannotated(ident, meta)
+                iterable = self.boxed(self.expr(iterable, state))
+                state.pop(str(ident), None)
+                state = self.loop(node, state)
+                return self.replace(node, iterable=iterable), state
+            case nodes.BreakStmt():
+                self.breaks[-1].append(dict(state))
+                return node, None
+            case nodes.ContinueStmt():
+                self.continues[-1].append(dict(state))
+                return node, None
+            case nodes.ReturnStmt(meta=meta, value=value):
+                if (annotation := self.return_annotation) is not None:
+                    if value is None:
+                        value = nodes.NullLiteral(meta)
+                    value = self.checked(
+                        self.expr(value, state), annotation, "return value"
+                    )
+                    return self.replace(node, value=value), None
+                if value is None:
+                    return node, None
+                value = self.boxed(self.expr(value, state))
+                return self.replace(node, value=value), None
+            case nodes.ThrowStmt(value=value):
+                value = self.boxed(self.expr(value, state))
+                return self.replace(node, value=value), None
+            case nodes.BuilderBegin(names=names) | nodes.BuilderEnd(
+                names=names
+            ):
+                for name in names:
+                    state.pop(name, None)
+                return node, state
+            case nodes.AnnotatedAssign(meta=meta, name=name, right=right):
+                return self.stmt(
+                    nodes.Assign(meta, nodes.VarPattern(meta, name), right),
+                    state,
+                )
+            case nodes.TryStmt(body=body, catch=catch):
+                # Only in functions whose locals aren't known
+                self.body(body, {})
+                self.unannotated(catch.ident, catch.meta)
+                self.body(catch.body, {})
+                return node, {}
+            case nodes.NopStmt():
+                return node, state
+        # Not expected in functions inferred over
+        return node, {}
+
+    def loop(
+        self, node: nodes.WhileStmt | nodes.ForEachStmt, state: dict[str, str]
+    ) -> State:
+        """Infer over a loop, returning the state after it
+
+        The types known at the start of an iteration are those known
+        before the loop and at the end of all iterations, found by iterating
+        until they don't change, before rewriting the loop."""
+        rewrite = self.rewrite
+        self.rewrite = False
+        head: dict[str, str] = state
+        while True:
+            back, _ = self.iteration(node, dict(head))
+            new_head = _join(head, back)
+            if new_head == head or new_head is None:
+                break
+            head = new_head
+        self.rewrite = rewrite
+        return self.iteration(node, dict(head))[1]
+
+    def iteration(
+        self, node: nodes.WhileStmt | nodes.ForEachStmt, state: dict[str, str]
+    ) -> tuple[State, State]:
+        """Infer over an iteration of a loop, returning the states when
+        going back to its start and after leaving it"""
+        self.breaks.append([])
+        self.continues.append([])
+        match node:
+            case nodes.WhileStmt(
+                condition=condition, body=body,
+                eval_cond_after_body=eval_cond_after_body,
+            ):
+                if eval_cond_after_body:
+                    after_body = self.body(body, state)
+                    after_body = _join(after_body, *self.continues[-1])
+                    if after_body is None:
+                        back = exit_ = None
+                    else:
+                        condition = self.boxed(
+                            self.expr(condition, after_body)
+                        )
+                        back = exit_ = after_body
+                else:
+                    condition = self.boxed(self.expr(condition, state))
+                    exit_ = dict(state)
+                    after_body = self.body(body, state)
+                    back = _join(after_body, *self.continues[-1])
+                if self.rewrite:
+                    node.condition = condition
+            case nodes.ForEachStmt(body=body):
+                exit_ = dict(state)
+                after_body = self.body(body, state)
+                back = _join(after_body, *self.continues[-1])
+        self.continues.pop()
+        return back, _join(exit_, *self.breaks.pop())
+
+    def replace(self, node: Any, **changes: Any) -> Any:
+        """Copy a frozen node with changes if rewriting, and if anything
+        changes"""
+        if not self.rewrite or all(
+            getattr(node, name) is value for name, value in changes.items()
+        ):
+            return node
+        return replace(node, **changes)
+
+    def assigned(
+        self, state: dict[str, str], name: str, type_: str | None
+    ) -> None:
+        """Update the state with an assignment to a local"""
+        if type_ is None or not self.locals_known:
+            state.pop(name, None)
+        else:
+            state[name] = type_
+
+    def unannotated(self, name: str | None, meta: Any) -> None:
+        """Check that a local bound by a loop or catch clause isn't
+        annotated"""
+        if name is not None and self.rewrite and name in self.annotations:
+            raise StaticError(
+                f"'{name}' is annotated, so it can't be bound here", meta
+            )
+
+    def checked(
+        self, inferred: Inferred, annotation: nodes.Annotation, what: str
+    ) -> nodes._Expr:
+        """Expression as rewritten, checked against an annotation where its
+        type isn't known"""
+        node, type_, _ = inferred
+        expr = self.boxed(inferred)
+        if not self.rewrite:
+            return expr
+        if type_ is None:
+            return nodes.TypeCheck(node.meta, expr, annotation, what)
+        if type_ != annotation.name:
+            raise StaticError(
+                f"{what} should be {annotation.name}, not {type_}", node.meta
+            )
+        return expr
+
+    def boxed(self, inferred: Inferred) -> nodes._Expr:
+        """Expression as rewritten, wrapped if it operates on numbers"""
+        node, type_, numeric = inferred
+        if numeric and self.rewrite:
+            return nodes.NumericExpr(node.meta, node, type_)  # type: ignore
+        return node
+
+    def expr(self, node: nodes._Expr, state: dict[str, str]) -> Inferred:
+        """Infer the type of an expression, updating the state with the
+        assignments it does"""
+        # pylint: disable=too-many-branches
+        # pylint: disable=too-many-locals
+        match node:
+            case nodes.Int():
+                return node, INT, False
+            case nodes.Float():
+                return node, FLOAT, False
+            case nodes.TrueLiteral() | nodes.FalseLiteral():
+                return node, BOOL, False
+            case nodes.String():
+                return node, STRING, False
+            case nodes.NullLiteral():
+                return node, NULL, False
+            case nodes.Var(name=name):
+                return node, state.get(str(name)), False
+            case nodes.Exprs(expressions=expressions):
+                type_ = None
+                for i, expr in enumerate(expressions):
+                    new_expr, type_, numeric = self.expr(expr, state)
+                    if self.rewrite:
+                        expressions[i] = self.boxed(
+                            (new_expr, type_, numeric)
+                        )
+                return node, type_, False
+            case nodes.Assign(
+                pattern=nodes.VarPattern(name=name), right=right
+            ):
+                inferred = self.expr(right, state)
+                if (annotation := self.annotations.get(str(name))) is None:
+                    right = self.boxed(inferred)
+                    type_ = inferred[1]
+                else:
+                    right = self.checked(inferred, annotation, f"'{name}'")
+                    type_ = str(annotation.name)
+                self.assigned(state, str(name), type_)
+                return self.replace(node, right=right), type_, False
+            case nodes.Inplace(
+                meta=meta, pattern=nodes.VarPattern(name=name) as pattern,
+                op=op, right=right,
+            ):
+                right, right_type, numeric = self.expr(right, state)
+                bin_op = op.update(value=op[:-1])
+                type_ = binary_type(bin_op, state.get(str(name)), right_type)
+                annotation = self.annotations.get(str(name))
+                if type_ is None:
+                    right = self.boxed((right, right_type, numeric))
+                    node = self.replace(node, right=right)
+                    if annotation is None:
+                        state.pop(str(name), None)
+                        return node, None, False
+                    # Checked after the local is updated, which is only
+                    # observed if the check fails
+                    type_ = str(annotation.name)
+                    self.assigned(state, str(name), type_)
+                    if self.rewrite:
+                        node = nodes.Assign(meta, pattern, nodes.TypeCheck(
+                            meta, node, annotation, f"'{name}'"
+                        ))
+                    return node, type_, False
+                if annotation is not None:
+                    self.checked((node, type_, False), annotation, f"'{name}'")
+                self.assigned(state, str(name), type_)
+                if not self.rewrite:
+                    return node, type_, False
+                # Numbers aren't updated in place, this is the same as
+                # `name = name op right`
+                value = nodes.BinaryOp(
+                    meta, nodes.Var(meta, name), bin_op, right
+                )
+                return nodes.Assign(
+                    meta, pattern, self.boxed((value, type_, True))
+                ), type_, False
+            case nodes.BinaryOp(left=left, op=op, right=right):
+                left_inferred = self.expr(left, state)
+                right_inferred = self.expr(right, state)
+                type_ = binary_type(op, left_inferred[1], right_inferred[1])
+                if type_ is not None:
+                    return self.replace(
+                        node, left=left_inferred[0], right=right_inferred[0]
+                    ), type_, True
+                return self.replace(
+                    node, left=self.boxed(left_inferred),
+                    right=self.boxed(right_inferred),
+                ), None, False
+            case nodes.BinaryChain(operands=operands, ops=ops):
+                inferred = [self.expr(operand, state) for operand in operands]
+                type_ = inferred[0][1]
+                for op, (_, operand_type, _) in zip(ops, inferred[1:]):
+                    type_ = binary_type(op, type_, operand_type)
+                if self.rewrite:
+                    operands[:] = (
+                        [operand for operand, _, _ in inferred]
+                        if type_ is not None
+                        else [self.boxed(operand) for operand in inferred]
+                    )
+                return node, type_, type_ is not None
+            case nodes.Prefix(op=op, operand=operand):
+                operand, operand_type, numeric = self.expr(operand, state)
+                type_ = prefix_type(op, operand_type)
+                if type_ is not None:
+                    return self.replace(node, operand=operand), type_, True
+                operand = self.boxed((operand, operand_type, numeric))
+                return self.replace(node, operand=operand), None, False
+            case nodes.LogicalOp(left=left, right=right):
+                left = self.boxed(self.expr(left, state))
+                # The right operand may not run
+                right_state = dict(state)
+                right = self.boxed(self.expr(right, right_state))
+                self._update(state, _join(state, right_state))
+                return self.replace(node, left=left, right=right), None, False
+            case nodes.LogicalChain(operands=operands):
+                states: list[State] = []
+                current = state
+                for i, operand in enumerate(operands):
+                    if i > 0:
+                        current = dict(current)
+                    operand = self.boxed(self.expr(operand, current))
+                    if self.rewrite:
+                        operands[i] = operand
+                    states.append(current)
+                self._update(state, _join(*states))
+                return node, None, False
+            case nodes.BuilderInplace(
+                inplace=nodes.Inplace(
+                    pattern=nodes.VarPattern(name=name)
+                ) as inplace
+            ) if name in self.annotations and (
+                self.annotations[name].name != STRING
+            ):
+                # The local never holds a string, nor a builder then
+                return self.expr(inplace, state)
+            case nodes.BuilderInplace(
+                inplace=nodes.Inplace(right=right) as inplace
+            ):
+                # The local may hold a builder
+                right = self.boxed(self.expr(right, state))
+                _forget_assigned(inplace, state)
+                inplace = self.replace(inplace, right=right)
+                return self.replace(node, inplace=inplace), None, False
+            case nodes.Call(callee=callee, args=args):
+                for i, arg in enumerate(args.args):
+                    arg = self.boxed(self.expr(arg, state))
+                    if self.rewrite:
+                        args.args[i] = arg
+                callee = self.boxed(self.expr(callee, state))
+                type_ = None
+                if isinstance(callee, nodes.Var):
+                    type_ = self.returns.get(str(callee.name))
+                return self.replace(node, callee=callee), type_, False
+            case nodes.Dot(accessee=accessee):
+                accessee = self.boxed(self.expr(accessee, state))
+                return self.replace(node, accessee=accessee), None, False
+            case nodes.Subscript(subscriptee=subscriptee, index=index):
+                subscriptee = self.boxed(self.expr(subscriptee, state))
+                index = self.boxed(self.expr(index, state))
+                return self.replace(
+                    node, subscriptee=subscriptee, index=index
+                ), None, False
+            case nodes.List(elems=elems):
+                for i, elem in enumerate(elems):
+                    elem = self.boxed(self.expr(elem, state))
+                    if self.rewrite:
+                        elems[i] = elem
+                return node, LIST, False
+        _forget_assigned(node, state)
+        return node, None, False
+
+    @staticmethod
+    def _update(state: dict[str, str], new_state: State) -> None:
+        state.clear()
+        if new_state is not None:
+            state.update(new_state)
@@ -3,56 +3,29 @@
 
 from enum import Enum
 
-from lark.tree import Meta
-
-from bl_ast.base import ASTVisitor
+from bl_ast.base import ASTVisitor, _AstNode
 from bl_ast import nodes
 
+from .errors import StaticError
+from .optimizer import StringBuilderPass, _children
+from .inference import TypeInferencePass
 
-class StaticError(ValueError):
-    """Static error: program failed the static check"""
-
-    msg: str
-    meta: Meta
 
-    def __init__(self, msg, meta, *args, **kwargs):
-        super().__init__(msg, meta, *args, **kwargs)
-        self.msg = msg
-        self.meta = meta
+# Deepest a tree can be nested. The passes after the parser recurse once or
+# a few times per level, so deeper trees would exhaust the Python stack.
+MAX_NESTING = 500
 
-    def __str__(self) -> str:
-        return (
-            f"Static check failed at line {self.meta.line}, " +
-            f"column {self.meta.column}:\n" +
-            f"{self.msg}\n"
-        )
 
-    def get_context(self, text: str | bytes, span: int = 40) -> str | bytes:
-        """Returns a pretty string pinpointing the error in the text,
-        with span amount of context characters around it.
-
-        Note:
-            The parser doesn't hold a copy of the text it has to parse,
-            so you have to provide it again
-        """
-        # stolen from Lark
-        pos = self.meta.start_pos
-        start = max(pos - span, 0)
-        end = pos + span
-        if isinstance(text, str):
-            before = text[start:pos].rsplit('\n', 1)[-1]
-            after = text[pos:end].split('\n', 1)[0]
-            return (
-                before + after + '\n' + ' ' * len(before.expandtabs()) +
-                '^\n'
+def check_nesting(node: _AstNode) -> None:
+    """Check that a tree isn't nested too deeply to be visited"""
+    stack = [(node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if depth > MAX_NESTING:
+            raise StaticError(
+                f"code is nested deeper than {MAX_NESTING} levels", node.meta
             )
-        text = bytes(text)
-        before = text[start:pos].rsplit(b'\n', 1)[-1]
-        after = text[pos:end].split(b'\n', 1)[0]
-        return (
-            (before + after + b'\n' + b' ' * len(before.expandtabs()) +
-             b'^\n').decode("ascii", "backslashreplace")
-        )
+        stack.extend((child, depth + 1) for child in _children(node))
 
 
 class BodyType(Enum):
@@ -120,6 +93,8 @@ class SyntaxChecker(ASTVisitor):
             case (
                 nodes.Exprs(expressions=expressions)
                 | nodes.List(elems=expressions)
+                | nodes.LogicalChain(operands=expressions)
+                | nodes.BinaryChain(operands=expressions)
             ):
                 for expr in expressions:
                     self.visit(expr)
@@ -134,6 +109,11 @@ class SyntaxChecker(ASTVisitor):
             ):
                 self.visit(left)
                 self.visit(right)
+            case nodes.Slice(subscriptee=subscriptee) as slice_:
+                self.visit(subscriptee)
+                for bound in (slice_.start, slice_.stop, slice_.step):
+                    if bound is not None:
+                        self.visit(bound)
             case nodes.Call(callee=callee, args=args):
                 self.visit(callee)
                 for arg in args.args:
@@ -185,6 +165,16 @@ class SyntaxChecker(ASTVisitor):
                 node.then_body = self.visit_body(then_body)
                 node.else_body = self.visit_stmt(else_body)
                 self.modes.pop()
+            case nodes.IfChain(
+                conditions=conditions, bodies=bodies, else_body=else_body
+            ):
+                for condition in conditions:
+                    self.visit(condition)
+                self.modes.append(BodyType.NORMAL)
+                node.bodies = [self.visit_body(body) for body in bodies]
+                if else_body is not None:
+                    node.else_body = self.visit_body(else_body)
+                self.modes.pop()
             case nodes.WhileStmt(
                 condition=condition, body=body,
                 eval_condition_after=eval_condition_after,
@@ -217,6 +207,8 @@ class SyntaxChecker(ASTVisitor):
                 raise StaticError(
                     "'continue' used outside of loops", meta
                 )
+            case nodes.AnnotatedAssign(right=right):
+                self.visit(right)
             case nodes.FunctionStmt(body=body):
                 self.modes.append(BodyType.FUNCTION)
                 node.body = self.visit_body(body)
@@ -264,7 +256,7 @@ class StaticChecker(ASTVisitor):
     Methods
     -------
     visit(node: nodes._AstNode) -> nodes._AstNode:
-        Visit an AST node and perform syntax checking.
+        Visit an AST node, perform syntax checking and optimize it.
 
     visit_expr(node: nodes._Expr) -> nodes._Expr:
         Visit an expression node and perform syntax checking.
@@ -272,5 +264,8 @@ class StaticChecker(ASTVisitor):
 
     def visit(self, node: nodes._AstNode) -> nodes._AstNode:
         """Visit an AST node"""
+        check_nesting(node)
         pass1 = SyntaxChecker()
-        return pass1.visit(node)
+        pass2 = StringBuilderPass()
+        pass3 = TypeInferencePass()
+        return pass3.visit(pass2.visit(pass1.visit(node)))
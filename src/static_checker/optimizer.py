@@ -0,0 +1,191 @@
+"""Optimization passes run after the syntax check"""
+
+
+from collections.abc import Iterator
+from dataclasses import fields
+
+from bl_ast.base import ASTVisitor, _AstNode
+from bl_ast import nodes
+
+
+# Nodes that let code outside the function body see its locals
+_ESCAPING = (
+    nodes.FunctionLiteral, nodes.FunctionStmt, nodes.TryStmt,
+    nodes.IncludeStmt, nodes.ModuleStmt, nodes.ClassStmt,
+)
+
+
+def _children(node: _AstNode) -> list[_AstNode]:
+    """Child nodes of a node, in source order"""
+    children: list[_AstNode] = []
+    for field in fields(node):  # type: ignore[arg-type]
+        value = getattr(node, field.name)
+        if isinstance(value, _AstNode):
+            children.append(value)
+        elif isinstance(value, list):
+            children.extend(
+                item for item in value if isinstance(item, _AstNode)
+            )
+    return children
+
+
+def _walk(node: _AstNode) -> Iterator[_AstNode]:
+    """Yield a node and all of its descendants, in source order
+
+    The tree is walked with a stack, so deeply nested expressions can't
+    overflow the Python stack."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(_children(node)))
+
+
+def _statement_exprs(stmt: nodes._Stmt) -> list[nodes._Expr]:
+    """Expressions whose value is thrown away when stmt is run"""
+    match stmt:
+        case nodes.Exprs(expressions=expressions):
+            return expressions
+        case nodes._Expr():  # pylint: disable=protected-access
+            return [stmt]
+    return []
+
+
+def _is_append(expr: nodes._Expr, name: str) -> bool:
+    match expr:
+        case nodes.Inplace(pattern=nodes.VarPattern(name=name_), op="+="):
+            return name_ == name
+    return False
+
+
+def _assigned_names(stmt: nodes._Stmt) -> set[str]:
+    """Variables certainly assigned to by running stmt"""
+    match stmt:
+        case nodes.ForEachStmt(ident=ident):
+            return {str(ident)}
+    return {
+        str(expr.pattern.name) for expr in _statement_exprs(stmt)
+        if isinstance(expr, nodes.Assign)
+        and isinstance(expr.pattern, nodes.VarPattern)
+    }
+
+
+class StringBuilderPass(ASTVisitor):
+    """
+    Turns `+=` on string locals inside loops into appends to an implicit
+    string builder, making such loops linear instead of quadratic.
+
+    A local qualifies for a loop when the loop only ever touches it through
+    `+=` statements, and when it is certainly local: it's a formal argument
+    or is assigned at the top level of the function body before the loop.
+    Functions containing closures, try statements or anything else that can
+    observe their locals from outside are left alone.
+
+    The loop is wrapped between a BuilderBegin and a BuilderEnd node, which
+    switch the locals to builders (only if they hold strings) and back.
+    """
+
+    def visit(self, node: _AstNode) -> _AstNode:
+        # Collect first, the walk must not see the rewritten bodies
+        for child in list(_walk(node)):
+            match child:
+                case (
+                    nodes.FunctionStmt(form_args=form_args, body=body)
+                    | nodes.FunctionLiteral(form_args=form_args, body=body)
+                ):
+                    self.visit_function(form_args, body)
+        return node
+
+    def visit_function(
+        self, form_args: nodes.FormArgs, body: nodes.Body
+    ) -> None:
+        """Optimize the loops of a function body"""
+        if any(isinstance(child, _ESCAPING) for child in _walk(body)):
+            return
+        self._visit_top_level(body, set(map(str, form_args.args)))
+
+    def _visit_top_level(self, body: nodes.Body, locals_: set[str]) -> None:
+        statements = body.statements
+        # pylint: disable=consider-using-enumerate
+        for i in range(len(statements)):
+            stmt = statements[i]
+            if isinstance(stmt, nodes.Body):
+                # Blocks at the top level (e.g. desugared for loops) run
+                # unconditionally too
+                self._visit_top_level(stmt, locals_)
+                continue
+            statements[i] = self._optimize(stmt, frozenset(locals_))
+            locals_ |= _assigned_names(stmt)
+
+    def _optimize(
+        self, stmt: nodes._Stmt, candidates: frozenset[str]
+    ) -> nodes._Stmt:
+        match stmt:
+            case nodes.WhileStmt(body=body) | nodes.ForEachStmt(body=body):
+                names = sorted(
+                    name for name in candidates
+                    if self._only_appended(stmt, name)
+                )
+                self._optimize_body(body, candidates - set(names))
+                if not names:
+                    return stmt
+                self._rewrite_appends(stmt, set(names))
+                return nodes.Body(stmt.meta, [
+                    nodes.BuilderBegin(stmt.meta, names),
+                    stmt,
+                    nodes.BuilderEnd(stmt.meta, names),
+                ])
+            case nodes.Body():
+                self._optimize_body(stmt, candidates)
+            case nodes.IfStmt(body=body):
+                self._optimize_body(body, candidates)
+            case nodes.IfElseStmt(then_body=then_body, else_body=else_body):
+                self._optimize_body(then_body, candidates)
+                stmt.else_body = self._optimize(else_body, candidates)
+            case nodes.IfChain(bodies=bodies, else_body=else_body):
+                for body in bodies:
+                    self._optimize_body(body, candidates)
+                if else_body is not None:
+                    self._optimize_body(else_body, candidates)
+        return stmt
+
+    def _optimize_body(
+        self, body: nodes.Body, candidates: frozenset[str]
+    ) -> None:
+        if not candidates:
+            return
+        statements = body.statements
+        for i, stmt in enumerate(statements):
+            statements[i] = self._optimize(stmt, candidates)
+
+    @staticmethod
+    def _only_appended(loop: nodes._Stmt, name: str) -> bool:
+        """Check if name is used in the loop by `+=` statements only"""
+        uses = 0
+        appends = 0
+        for child in _walk(loop):
+            match child:
+                case nodes.Var(name=name_) | nodes.VarPattern(name=name_):
+                    uses += name_ == name
+                case nodes.ForEachStmt(ident=name_):
+                    uses += name_ == name
+                case nodes.Body(statements=statements):
+                    appends += sum(
+                        _is_append(expr, name)
+                        for stmt in statements
+                        for expr in _statement_exprs(stmt)
+                    )
+        return appends > 0 and uses == appends
+
+    @staticmethod
+    def _rewrite_appends(loop: nodes._Stmt, names: set[str]) -> None:
+        for child in list(_walk(loop)):
+            if isinstance(child, nodes.Body):
+                exprs_lists = [child.statements] + [
+                    stmt.expressions for stmt in child.statements
+                    if isinstance(stmt, nodes.Exprs)
+                ]
+                for exprs in exprs_lists:
+                    for i, expr in enumerate(exprs):
+                        if any(_is_append(expr, name) for name in names):
+                            exprs[i] = nodes.BuilderInplace(expr.meta, expr)
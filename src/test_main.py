@@ -4,8 +4,8 @@ from typing import cast
 from pytest import fixture
 
 from main import interpret
-from interpreter import ASTInterpreter
-from interpreter.bl_types import essentials, numbers, colls
+from interpreter import ASTInterpreter, Profile
+from interpreter.bl_types import essentials, numbers, colls, shapes
 from interpreter.bl_types.essentials import Value, Bool
 from interpreter.bl_types.numbers import Int
 
@@ -342,3 +342,999 @@ def test_custom_iter(example_interp: ASTInterpreter):
     res = example_interp.globals.get_var("res", meta=None)
     assert isinstance(res, Bool)
     assert res.is_equal(essentials.TRUE, example_interp, meta=None)
+
+
+def test_matrix(example_interp: ASTInterpreter):
+    """Test for the matrix type"""
+    interpret(
+        """
+        m = new Matrix([[1, 2], [3, 4]]);
+        t = m.transpose();
+        t[0] = [5, 6];
+
+        truth_1 = m == new Matrix([[5, 2], [6, 4]]);
+        truth_2 = m.matmul(Matrix.identity(2)) == m;
+        truth_3 = m + new Matrix([10, 20]) == new Matrix([[15, 22], [16, 24]]);
+        truth_4 = (m * 2).sum(0) == new Matrix([22, 12]);
+        truth_5 = m[1][0] == 6 && m.col(1) == new Matrix([2, 4]);
+        truth_6 = (
+            Matrix.zeros(0, 3).matmul(Matrix.zeros(3, 2)).shape() == [0, 2]
+            && Matrix.zeros(2, 3).matmul(Matrix.zeros(3, 0)).shape() == [2, 0]
+            && Matrix.zeros(2, 0).matmul(Matrix.zeros(0, 3))
+                == Matrix.zeros(2, 3)
+        );
+
+        res = (
+            truth_1 && truth_2 && truth_3 && truth_4 && truth_5 && truth_6
+        );
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+
+
+def test_bytes(example_interp: ASTInterpreter):
+    """Test for the bytes and byte buffer types"""
+    interpret(
+        """
+        b = "key=value".encode();
+        parts = b.split("=".encode());
+        truth_1 = parts[1].decode() == "value" && b.find("v".encode()) == 4;
+
+        buf = new ByteBuffer();
+        buf.write_int(513, 2, "big");
+        view = buf.slice(0, 2);
+        buf[0] = 3;
+        truth_2 = view[0] == 3 && buf.read_int(0, 2, "big") == 769;
+
+        buf.extend(b);
+        buf[0] = 4;
+        truth_3 = view[0] == 3 && buf.length() == 11;
+
+        res = truth_1 && truth_2 && truth_3;
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+    # Views not covering the bytes in order are unwrapped to copies
+    # pylint: disable=import-outside-toplevel
+    from interpreter.bl_types.pywrapper import ConvenientPythonWrapper
+    reversed_ = interpret('"abcdef".encode()[::-1]', example_interp)
+    assert ConvenientPythonWrapper.unwrap_arg(reversed_) == b"fedcba"
+    strided = interpret('"abcdef".encode()[::2]', example_interp)
+    assert ConvenientPythonWrapper.unwrap_arg(strided) == b"ace"
+
+
+def test_bytes_wrapping():
+    """Test that Python binary data is wrapped without copying"""
+    # pylint: disable=import-outside-toplevel
+    from interpreter.bl_types.pywrapper import ConvenientPythonWrapper
+    from interpreter.bl_types.binary import Bytes, ByteBuffer
+    data = b"abc"
+    wrapped = ConvenientPythonWrapper.wrap_res(data)
+    assert isinstance(wrapped, Bytes)
+    assert ConvenientPythonWrapper.unwrap_arg(wrapped) is data
+    buffer = bytearray(b"abc")
+    wrapped = ConvenientPythonWrapper.wrap_res(buffer)
+    assert isinstance(wrapped, ByteBuffer)
+    assert ConvenientPythonWrapper.unwrap_arg(wrapped) is buffer
+
+
+def test_string_builder(example_interp: ASTInterpreter):
+    """Test for the string builder and the implicit builder optimization"""
+    interpret(
+        """
+        fun join_digits(n) {
+            out = "";
+            for (i = 0; i < n; i += 1) {
+                out += to_string(i);
+            }
+            return out;
+        }
+        fun add_numbers() {
+            total = "";
+            total = 0;
+            for x in [1, 2, 3] {
+                total += x;
+            }
+            return total;
+        }
+        sb = new StringBuilder("a");
+        sb.append("b").append_line(1);
+        truth_1 = to_string(sb) == "ab1\\n" && sb.length() == 4;
+        truth_2 = join_digits(5) == "01234" && add_numbers() == 6;
+        res = truth_1 && truth_2;
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+
+
+def test_string_builder_pass():
+    """Test that only safe loops get the implicit builder"""
+    # pylint: disable=import-outside-toplevel
+    from bl_ast import parse_to_ast, nodes
+    from static_checker import StaticChecker
+    ast_ = StaticChecker().visit(parse_to_ast(
+        """
+        fun safe(out) {
+            for x in [1, 2] { out += "x"; }
+        }
+        fun reads(out) {
+            for x in [1, 2] { out += out; }
+        }
+        fun closure(out) {
+            for x in [1, 2] { out += "x"; }
+            return fun () -> out;
+        }
+        """
+    ))
+    kinds = [
+        type(stmt.body.statements[0]) for stmt in ast_.statements
+    ]
+    assert kinds == [nodes.Body, nodes.ForEachStmt, nodes.ForEachStmt]
+
+
+def test_slice(example_interp: ASTInterpreter):
+    """Test for slicing and copy-on-write list views"""
+    # pylint: disable=protected-access
+    interpret(
+        """
+        a = [0, 1, 2, 3, 4, 5];
+        v = a[1:5:2];
+        v[0] = 10;
+        a[3] = 30;
+        truth_1 = a == [0, 1, 2, 30, 4, 5] && v == [10, 3];
+        truth_2 = a[::-1][:2] == [5, 4] && a[-2:].length() == 2;
+        truth_3 = "hello"[1:3] == "el" && "hello"[::-1] == "olleh";
+        res = truth_1 && truth_2 && truth_3;
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+    # Reading a view goes through its window, however often it is read
+    res = interpret(
+        """
+        big = [];
+        i = 0;
+        while i < 1000 { big.push(i); i += 1; }
+        view = big[1:-1:2];
+        total = 0;
+        i = 0;
+        while i < 100 {
+            total += view.reduce(fun (a, b) -> a + b) + view.length();
+            total += view.bisect_left(501);
+            if 501 in view { total += 1; }
+            for x in view { last = x; }
+            i += 1;
+        }
+        [view.map(fun (x) -> x * 2)[:2] == [2, 6], to_string(view)[:7],
+         total + last, view == big[1:-1:2]]
+        """,
+        example_interp,
+    )
+    assert isinstance(res, colls.BLList)
+    # The view holds the 499 odd numbers from 1 to 997
+    assert res.elems == [
+        essentials.TRUE, essentials.String("[1, 3, "),
+        Int(100 * (499 ** 2 + 499 + 250 + 1) + 997), essentials.TRUE,
+    ]
+    view = interpret("view", example_interp)
+    big = interpret("big", example_interp)
+    assert isinstance(view, colls.BLList) and isinstance(big, colls.BLList)
+    assert view._window is not None and view._base is big._base
+
+
+def test_hashing(example_interp: ASTInterpreter):
+    """Test for dictionary keys and the hashing protocol"""
+    interpret(
+        """
+        class Point {
+            fun __init__(x, y) {
+                this.x = x;
+                this.y = y;
+            }
+            fun __hash__() {
+                return this.x * 31 + this.y;
+            }
+            fun __eq__(other) {
+                return this.x == other.x && this.y == other.y;
+            }
+        }
+        class Plain {}
+        plain = new Plain();
+        d = {"a": 1, plain: 2};
+        d["b" + "c"] = 3;
+        d[new Point(1, 2)] = 4;
+        truth_1 = d["a"] == 1 && d["bc"] == 3 && d[plain] == 2;
+        truth_2 = d[new Point(1, 2)] == 4 && d.length() == 4;
+        truth_3 = [1, "x", [2]] == [1, "x", [2]] && [1] != [2];
+        res = truth_1 && truth_2 && truth_3;
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+
+
+def test_set_and_in(example_interp: ASTInterpreter):
+    """Test for the set type and the membership operators"""
+    interpret(
+        """
+        class Evens {
+            fun __contains__(x) {
+                return x % 2 == 0;
+            }
+        }
+        a = new Set([1, 2, 2, 3]);
+        b = new Set([3, 4]);
+        truth_1 = a.length() == 3 && 2 in a && 4 not in a;
+        truth_2 = (a | b).length() == 4 && a & b == new Set([3])
+            && a - b == new Set([1, 2]);
+        truth_3 = 1 in [1, 2] && "ell" in "hello" && "k" not in {"a": 1};
+        truth_4 = 4 in new Evens() && 5 not in new Evens();
+        res = truth_1 && truth_2 && truth_3 && truth_4;
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+
+
+def test_queues(example_interp: ASTInterpreter):
+    """Test for the deque and priority queue types"""
+    interpret(
+        """
+        d = new Deque([1, 2]);
+        d.push(3);
+        d.push_front(0);
+        truth_1 = d.pop_front() == 0 && d.pop() == 3 && d.length() == 2;
+        pq = new PriorityQueue(fun (s) -> s.length());
+        for s in ["ccc", "a", "bb", "dd"] {
+            pq.push(s);
+        }
+        truth_2 = pq.peek() == "a" && pq.to_list() == ["a", "bb", "dd", "ccc"];
+        popped = [];
+        while pq {
+            popped.push(pq.pop());
+        }
+        truth_3 = popped == ["a", "bb", "dd", "ccc"];
+        class Flaky {
+            fun __init__(n) { this.n = n; }
+            fun __lt__(other) {
+                if broken { throw new Exception("broken"); }
+                return this.n < other.n;
+            }
+        }
+        broken = false;
+        flaky = new PriorityQueue();
+        for n in [5, 1, 4, 2, 3] {
+            flaky.push(new Flaky(n));
+        }
+        broken = true;
+        try {
+            flaky.pop();
+            failed = false;
+        } catch e {
+            failed = true;
+        }
+        broken = false;
+        order = [];
+        while flaky {
+            order.push(flaky.pop().n);
+        }
+        truth_4 = failed && order == [1, 2, 3, 4, 5];
+        ties = new PriorityQueue(fun (s) -> new Flaky(s.length()));
+        for s in ["bb", "a", "cc", "dd", "e"] {
+            ties.push(s);
+        }
+        truth_5 = ties.to_list() == ["a", "e", "bb", "cc", "dd"];
+        popped = [];
+        while ties {
+            popped.push(ties.pop());
+        }
+        truth_6 = popped == ["a", "e", "bb", "cc", "dd"];
+        res = truth_1 && truth_2 && truth_3 && truth_4 && truth_5 && truth_6;
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+
+
+def test_sort(example_interp: ASTInterpreter):
+    """Test for sorting and binary search on lists"""
+    interpret(
+        """
+        class Version {
+            fun __init__(n) { this.n = n; }
+            fun __lt__(other) { return this.n < other.n; }
+        }
+        calls = [];
+        fun key(s) { calls.push(s); return s.length(); }
+        words = ["ccc", "a", "bb", "dd"];
+        truth_1 = (
+            sorted(words, key) == ["a", "bb", "dd", "ccc"]
+            && calls.length() == 4
+        );
+        truth_2 = sorted(new Set([3, 1, 2]), null, true) == [3, 2, 1];
+        versions = [new Version(3), new Version(1), new Version(2)];
+        versions.sort();
+        truth_3 = versions.map(fun (v) -> v.n) == [1, 2, 3];
+        xs = [1, 3, 5];
+        truth_4 = xs.bisect_left(3) == 1 && xs.bisect_right(3) == 2;
+        xs.insort(4);
+        truth_5 = xs == [1, 3, 4, 5];
+        res = truth_1 && truth_2 && truth_3 && truth_4 && truth_5;
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+
+
+def test_dict_views(example_interp: ASTInterpreter):
+    """Test for live dictionary views and dictionary iteration"""
+    interpret(
+        """
+        d = {"a": 1, "b": 2};
+        keys = d.keys();
+        items = d.items();
+        d["c"] = 3;
+        seen = [];
+        for k in d {
+            seen.push(k);
+        }
+        truth_1 = seen == ["a", "b", "c"] && keys.length() == 3;
+        truth_2 = "c" in keys && 3 in d.values() && !(4 in d.values());
+        truth_3 = ["a", 1] in items && ["a", 2] not in items;
+        truth_4 = items.to_list() == [["a", 1], ["b", 2], ["c", 3]];
+        res = truth_1 && truth_2 && truth_3 && truth_4;
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+
+
+def test_inplace_ops(example_interp: ASTInterpreter):
+    """Test for in-place operators on mutable values"""
+    interpret(
+        """
+        class Counter {
+            fun __init__() { this.n = 0; }
+            fun __iadd__(k) { this.n = this.n + k; return this; }
+        }
+        a = [1];
+        b = a;
+        a += [2];
+        s = "x";
+        t = s;
+        s += "y";
+        truth_1 = b == [1, 2] && t == "x" && s == "xy";
+        d = {"a": 1};
+        e = d;
+        d += {"b": 2};
+        truth_2 = e == {"a": 1, "b": 2} && d + {"c": 3} != d;
+        nested = {"k": [1]};
+        nested["k"] += [2];
+        truth_3 = nested["k"] == [1, 2];
+        c = new Counter();
+        alias = c;
+        c += 5;
+        truth_4 = alias.n == 5;
+        res = truth_1 && truth_2 && truth_3 && truth_4;
+        """,
+        example_interp,
+    )
+    res = example_interp.globals.get_var("res", meta=None)
+    assert isinstance(res, Bool)
+    assert res.value
+
+
+def test_constant_pool(example_interp: ASTInterpreter):
+    """Test for the literal constant pool and immutable strings"""
+    interpret(
+        """
+        strings = [];
+        for i in [1, 2, 3] {
+            strings.push("fizz");
+        }
+        fun attr_error() {
+            try {
+                "fizz".attr = 1;
+            } catch e {
+                return true;
+            }
+            return false;
+        }
+        fun throw_literal(x) {
+            try {
+                throw x;
+            } catch e {
+                return "caught " + to_string(e);
+            }
+        }
+        """,
+        example_interp,
+    )
+    strings = example_interp.globals.get_var("strings", meta=None)
+    assert isinstance(strings, colls.BLList)
+    first, *rest = strings.elems
+    assert all(s is first for s in rest)
+    assert not first.vars
+    assert interpret("attr_error()", example_interp) == essentials.TRUE
+    # Thrown string literals are shared, and left as they were
+    res = interpret(
+        'throw_literal("fizz"); throw_literal("fizz")', example_interp
+    )
+    assert res == essentials.String("caught fizz")
+    assert not first.vars
+
+
+def test_compact_values(example_interp: ASTInterpreter):
+    """Test for slotted values and lazily allocated instance attributes"""
+    lst = interpret("[1, 2.5, 'a', null, true]", example_interp)
+    assert isinstance(lst, colls.BLList)
+    for value in [lst, *lst.elems]:
+        assert not hasattr(value, "__dict__")
+    assert lst._slots == ()  # pylint: disable=protected-access
+    interpret(
+        """
+        class Point {
+            fun __init__(x) { this.x = x; }
+        }
+        p = new Point(3);
+        """,
+        example_interp,
+    )
+    point = example_interp.globals.get_var("p", meta=None)
+    assert isinstance(point, essentials.Instance)
+    assert point.vars == {"x": Int(3)}
+
+
+def test_lookup_misses(example_interp: ASTInterpreter):
+    """Test for variable and attribute lookups that miss"""
+    interpret(
+        """
+        count = 0;
+        fun bump() {
+            count += 1;
+        }
+        bump();
+        bump();
+        class Broken {
+            fun __add__(other) { return this.missing; }
+        }
+        try {
+            new Broken() + 1;
+        } catch e {
+            error = e;
+        }
+        """,
+        example_interp,
+    )
+    assert example_interp.globals.get_var("count", meta=None) == Int(2)
+    error = example_interp.globals.get_var("error", meta=None)
+    assert isinstance(error, essentials.Instance)
+    assert error.class_ is essentials.AttrNotFoundException
+
+
+def test_constructor_cache(example_interp: ASTInterpreter):
+    """Test for cached constructors and learned instance shapes"""
+    interpret(
+        """
+        class Node {
+            fun __init__(value, tagged) {
+                this.value = value;
+                if tagged {
+                    this.tag = "tagged";
+                }
+            }
+        }
+        tagged = new Node(1, true);
+        plain = new Node(2, false);
+        class Early {
+            fun __init__() {
+                try {
+                    this.x;
+                } catch e {
+                    this.missing = true;
+                }
+                this.x = 1;
+            }
+        }
+        first = new Early();
+        second = new Early();
+        """,
+        example_interp,
+    )
+    tagged = example_interp.globals.get_var("tagged", meta=None)
+    plain = example_interp.globals.get_var("plain", meta=None)
+    second = example_interp.globals.get_var("second", meta=None)
+    assert isinstance(tagged, essentials.Instance)
+    assert isinstance(plain, essentials.Instance)
+    assert isinstance(second, essentials.Instance)
+    assert list(tagged.vars) == ["value", "tag"]
+    assert list(plain.vars) == ["value"]
+    assert second.vars == {"missing": essentials.TRUE, "x": Int(1)}
+
+
+def test_instance_shapes(example_interp: ASTInterpreter):
+    """Test for instances sharing shapes, and for dictionary mode"""
+    # pylint: disable=protected-access
+    interpret(
+        """
+        class Point {
+            fun __init__(x, y) { this.x = x; this.y = y; }
+        }
+        a = new Point(1, 2);
+        b = new Point(3, 4);
+        c = new Point(5, 6);
+        c.z = 7;
+        """,
+        example_interp,
+    )
+    a, b, c = (
+        example_interp.globals.get_var(name, meta=None) for name in "abc"
+    )
+    assert isinstance(a, essentials.Instance)
+    assert isinstance(b, essentials.Instance)
+    assert isinstance(c, essentials.Instance)
+    assert a._shape is b._shape
+    assert a._shape is not None and a._shape.names == ("x", "y")
+    assert c.vars == {"x": Int(5), "y": Int(6), "z": Int(7)}
+    # Objects used like maps fall back to a dict
+    for i in range(shapes.MAX_ATTRS + 1):
+        c.vars[f"attr{i}"] = Int(i)
+    assert c._shape is None
+    assert c.get_attr("attr3", example_interp, None) == Int(3)
+    del a.vars["x"]
+    assert a._shape is None and a.vars == {"y": Int(2)}
+    assert b.get_attr("x", example_interp, None) == Int(3)
+
+
+def test_declared_fields(example_interp: ASTInterpreter):
+    """Test for classes declaring their fields"""
+    # pylint: disable=protected-access
+    interpret(
+        """
+        class Pair {
+            fields first, second;
+            fun __init__(first) { this.first = first; }
+        }
+        class Triple extends Pair { fields third; }
+        p = new Pair(1);
+        t = new Triple(2);
+        t.third = 3;
+        fun undeclared() {
+            try {
+                p.third = 3;
+            } catch e {
+                return true;
+            }
+            return false;
+        }
+        """,
+        example_interp,
+    )
+    p = example_interp.globals.get_var("p", meta=None)
+    t = example_interp.globals.get_var("t", meta=None)
+    assert isinstance(p, essentials.Record)
+    assert isinstance(t, essentials.Record)
+    assert p.vars == {"first": Int(1), "second": essentials.NULL}
+    assert list(t.vars) == ["first", "second", "third"]
+    assert t._slots == [Int(2), essentials.NULL, Int(3)]
+    assert interpret("undeclared()", example_interp) == essentials.TRUE
+    # Built-in classes can still set their own attributes
+    interpret(
+        """
+        class Failure extends Exception { fields code; }
+        fun catch_failure(with_msg) {
+            try {
+                if with_msg { throw new Failure("x"); }
+                throw new Failure();
+            } catch e {
+                e.code = 1;
+                return e;
+            }
+        }
+        """,
+        example_interp,
+    )
+    res = interpret(
+        "[catch_failure(true), catch_failure(false)].map(dump)",
+        example_interp,
+    )
+    assert isinstance(res, colls.BLList)
+    assert res.elems == [
+        essentials.String("Failure: 'x'"), essentials.String("Failure"),
+    ]
+    error = interpret("catch_failure(true).other = 2;", example_interp)
+    assert isinstance(error, essentials.BLError)
+    assert error.value.class_ is essentials.AttrNotFoundException
+    # fields is only a keyword where class entries start
+    res = interpret(
+        """
+        fields = 2;
+        class Holder { fields fields; }
+        h = new Holder();
+        h.fields = fields + 1;
+        [fields, h.fields]
+        """,
+        example_interp,
+    )
+    assert isinstance(res, colls.BLList)
+    assert res.elems == [Int(2), Int(3)]
+
+
+def test_global_cache(example_interp: ASTInterpreter):
+    """Test for cached global variable lookups"""
+    interpret(
+        """
+        fun get() { return value; }
+        value = 1;
+        a = get();
+        value = 2;
+        b = get();
+        class C {
+            first = get();
+            value = 3;
+            second = get();
+        }
+        c = get();
+        """,
+        example_interp,
+    )
+    res = interpret("[a, b, C.first, C.second, c]", example_interp)
+    assert isinstance(res, colls.BLList)
+    assert res.elems == [Int(1), Int(2), Int(2), Int(3), Int(2)]
+    globals_ = example_interp.globals
+    version = globals_.version
+    interpret("value = 4;", example_interp)
+    assert globals_.version == version
+    interpret("other = 5;", example_interp)
+    assert globals_.version == version + 1
+
+
+def test_shared_builtins():
+    """Test for the built-in variables shared between interpreters"""
+    first = ASTInterpreter()
+    second = ASTInterpreter()
+    assert first.globals.parent is second.globals.parent
+    assert not first.globals.vars
+    interpret("to_int = fun (x) -> 42;", first)
+    assert first.globals.set_var("Exception", Int(1), None) is None
+    res = interpret("[to_int('7'), Exception]", first)
+    assert isinstance(res, colls.BLList)
+    assert res.elems == [Int(42), Int(1)]
+    assert interpret("to_int('7')", second) == Int(7)
+    assert interpret("Exception", second) is essentials.ExceptionClass
+
+
+def test_traceback_unwinding(example_interp: ASTInterpreter):
+    """Test for the call stack being unwound by caught errors"""
+    res = interpret(
+        """
+        fun inner(x) { return x.missing; }
+        fun outer(x) { return inner(x); }
+        caught = 0;
+        while caught < 100 {
+            try {
+                outer(caught);
+            } catch e {
+                caught += 1;
+            }
+            try {
+                class Broken { value = outer(caught); }
+            } catch e {
+                caught += 1;
+            }
+        }
+        outer(0);
+        """,
+        example_interp,
+    )
+    assert len(example_interp.traceback) == 1
+    assert example_interp.globals.root is example_interp.globals
+    assert isinstance(res, essentials.BLError) and res.traceback is not None
+    assert [type(frame).__name__ for frame in res.traceback] == [
+        "Script", "Call", "Call"
+    ]
+
+
+def test_stackless():
+    """Test for deep recursion, in stackless mode and out of it"""
+    src = """
+    fun down(n) {
+        if n == 0 {
+            return 0;
+        }
+        return 1 + down(n - 1);
+    }
+    fun too_deep(n) {
+        try {
+            down(n);
+        } catch e {
+            return e;
+        }
+        return null;
+    }
+    """
+    stackless = ASTInterpreter(max_depth=2000, stackless=True)
+    interpret(src, stackless)
+    assert interpret("down(1500)", stackless) == Int(1500)
+    error = interpret("too_deep(2500)", stackless)
+    assert isinstance(error, essentials.Instance)
+    assert error.class_ is essentials.RecursionDepthException
+    assert len(stackless.traceback) == 1
+    normal = ASTInterpreter()
+    interpret(src, normal)
+    error = interpret("too_deep(1500)", normal)
+    assert isinstance(error, essentials.Instance)
+    assert error.class_ is essentials.RecursionDepthException
+    assert interpret("down(50)", normal) == Int(50)
+
+
+def test_deep_chains(example_interp: ASTInterpreter):
+    """Test for long chains of operators and else ifs, as in generated
+    code, and for deeply nested expressions"""
+    # pylint: disable=import-outside-toplevel
+    from static_checker import StaticError
+    n = 1500
+    interpret(
+        f"""
+        total = {" + ".join(["1"] * n)};
+        text = {" + ".join(["'ab'"] * n)};
+        mixed = to_string(10 - 2 - 3 * 2 + 1) + 'x' + 'y';
+        calls = [];
+        fun called(x) {{ calls.push(x); return x; }}
+        found = {" || ".join(["called(0)"] * 3 + ["called(5)", "called(6)"])};
+        all = {" && ".join(["called(1)", "called(0)", "called(7)"])};
+        x = {n // 2};
+        {" else ".join(f"if x == {i} {{ branch = {i}; }}" for i in range(n))}
+        """,
+        example_interp,
+    )
+    res = interpret("[total, text, mixed, found, all, branch]", example_interp)
+    assert isinstance(res, colls.BLList)
+    assert res.elems == [
+        Int(n), essentials.String("ab" * n), essentials.String("3xy"),
+        Int(5), Int(0), Int(n // 2),
+    ]
+    calls = interpret("calls", example_interp)
+    assert isinstance(calls, colls.BLList)
+    assert calls.elems == [Int(0)] * 3 + [Int(5), Int(1), Int(0)]
+    # Nested expressions are checked and run as deep as the stack allows,
+    # and rejected statically beyond that
+    depth = 400
+    res = interpret(
+        f"""[
+            {" ** ".join(["1"] * depth)},
+            {"1 + (" * depth}1{")" * depth},
+            {"-" * depth}1,
+            {"[" * depth}{"]" * depth}.length()
+        ]""",
+        example_interp,
+    )
+    assert isinstance(res, colls.BLList)
+    assert res.elems == [Int(1), Int(depth + 1), Int(1), Int(1)]
+    try:
+        interpret(f"x = {'-' * n}1;", example_interp)
+    except StaticError as e:
+        assert e.meta.line == 1
+    else:
+        assert False, "nesting not rejected"
+
+
+def test_tiered_execution():
+    """Test for compiling hot functions and loops"""
+    src = """
+    fun classify(n) {
+        if n % 15 == 0 { return "fizzbuzz"; }
+        else if n % 5 == 0 { return "buzz"; }
+        else if n % 3 == 0 { return "fizz"; }
+        return to_string(n);
+    }
+    fun run(n) {
+        out = [];
+        i = 1;
+        while i <= n {
+            out.push(classify(i) + "/" + to_string(i * 2 - 1 > 4 && i));
+            i += 1;
+        }
+        return out;
+    }
+    fun fail(n) {
+        if n > 3 { throw new Exception("too big"); }
+        return n;
+    }
+    """
+    results = []
+    for threshold in (0, 3):
+        interp = ASTInterpreter(tier_threshold=threshold)
+        interpret(src, interp)
+        res = interpret("run(20)", interp)
+        assert isinstance(res, colls.BLList)
+        results.append(res.elems)
+        error = interpret("fail(1); fail(4);", interp)
+        assert isinstance(error, essentials.BLError)
+        assert len(interp.traceback) == 1
+    assert results[0] == results[1]
+    assert results[0][:3] == [
+        essentials.String("1/false"), essentials.String("2/false"),
+        essentials.String("fizz/3"),
+    ]
+    # Counters are shared by all functions made from one definition
+    classify = interpret("classify", interp)
+    assert isinstance(classify, essentials.BLFunction)
+    assert classify.code.calls == 3
+    assert classify.code.compiled is not None
+    # Cold functions stay interpreted
+    fail = interpret("fail", interp)
+    assert isinstance(fail, essentials.BLFunction)
+    assert fail.code.compiled is None
+
+
+def test_profile_guided(tmp_path):
+    """Test for recording profiles and starting from them"""
+    src = """
+    fun sign(x) {
+        if x > 0.0 { return 1; } else { return -1; }
+    }
+    fun run(n) {
+        total = 0;
+        i = 0;
+        while i < n {
+            total += sign(to_float(i) - 2.5);
+            i += 1;
+        }
+        return total;
+    }
+    res = run(20);
+    """
+    path = tmp_path / "profile.json"
+    recording = ASTInterpreter(profile=Profile(recording=True))
+    interpret(src, recording)
+    assert recording.tier_threshold == 0
+    recording.profile.save(path)
+    profile = Profile.load(path)
+    assert len(profile.sites) > 0
+    # Hot code is compiled before it runs
+    interp = ASTInterpreter(tier_threshold=10, profile=profile)
+    interpret(src, interp)
+    assert interpret("res", interp) == Int(14)
+    sign = interpret("sign", interp)
+    assert isinstance(sign, essentials.BLFunction)
+    assert sign.code.compiled is not None and sign.code.calls == 0
+    run = interpret("run", interp)
+    assert isinstance(run, essentials.BLFunction)
+    assert run.code.compiled is None
+    # Changed sources, and other versions of the format, are ignored
+    changed = ASTInterpreter(tier_threshold=10, profile=profile)
+    interpret(src.replace("run(20)", "run(21)"), changed)
+    sign = interpret("sign", changed)
+    assert isinstance(sign, essentials.BLFunction)
+    assert sign.code.calls == 10
+    path.write_text('{"version": 0, "scripts": {}, "sites": {}}')
+    assert Profile.load(path).sites == {}
+    path.write_text('not json')
+    assert Profile.load(path).sites == {}
+    for scripts, sites in [
+        ('{"x": 1}', '{}'), ('{}', '{"x": 5}'), ('{}', '{"x": {"a": "b"}}'),
+        ('{}', '{"x": {"a": true}}'), ('{}', '{"x": {"a": 1}, "y": []}'),
+    ]:
+        path.write_text(
+            f'{{"version": 1, "scripts": {scripts}, "sites": {sites}}}'
+        )
+        profile = Profile.load(path)
+        assert profile.scripts == {} and profile.sites == {}
+
+
+def test_type_inference():
+    """Test for running numeric expressions on raw numbers"""
+    # pylint: disable=import-outside-toplevel
+    from bl_ast import parse_to_ast, nodes
+    from bl_ast.base import _AstNode
+    from static_checker import StaticChecker
+    from static_checker.optimizer import _walk
+    src = """
+    fun kernel(n, d) {
+        total = 0;
+        mean = 0.0;
+        i = to_int(n);
+        while i > 0 {
+            total += i * i - 1;
+            if total % 7 == 0 { mean = mean / 2.0; }
+            mean += to_float(i) / 3;
+            i -= 1;
+        }
+        return [total, mean, total % 5, to_int(d) %/% to_int(d)];
+    }
+    fun mixed(x) {
+        y = 1;
+        if x { y = "one"; }
+        return y + y;
+    }
+    """
+    ast_ = StaticChecker().visit(parse_to_ast(src))
+    assert isinstance(ast_, _AstNode)
+    numeric = [
+        child for child in _walk(ast_)
+        if isinstance(child, nodes.NumericExpr)
+    ]
+    assert {child.type_ for child in numeric} == {"Int", "Float", "Bool"}
+    results = []
+    for threshold in (0, 1):
+        interp = ASTInterpreter(tier_threshold=threshold)
+        interpret(src, interp)
+        res = interpret("kernel(50, 3); kernel(50, 3)", interp)
+        assert isinstance(res, colls.BLList)
+        results.append(res.elems)
+        # Errors inside numeric expressions are the usual ones
+        error = interpret("kernel(5, 0); kernel(5, 0)", interp)
+        assert isinstance(error, essentials.BLError)
+        assert interpret("mixed(true); mixed(false)", interp) == Int(2)
+        assert interpret("mixed(true)", interp) == essentials.String("oneone")
+    assert results[0] == results[1]
+    assert isinstance(results[0][0], Int)
+    # Int % Int gives a Float, as when boxed
+    assert isinstance(results[0][2], numbers.Float)
+
+
+def test_type_annotations():
+    """Test for checking type annotations, and using them to infer types"""
+    # pylint: disable=import-outside-toplevel
+    from static_checker import StaticError
+    src = """
+    fun fib(n: Int) -> Int {
+        if n < 2 { return n; }
+        return fib(n - 1) + fib(n - 2);
+    }
+    fun first(xs: List) -> Int {
+        x: Int = xs[0];
+        return x;
+    }
+    fun sign(x: Float) -> Int {
+        if x > 0.0 { return 1; }
+    }
+    """
+    for threshold in (0, 1):
+        interp = ASTInterpreter(tier_threshold=threshold)
+        interpret(src, interp)
+        assert interpret("fib(15); fib(15)", interp) == Int(610)
+        assert interpret("first([3]); first([3])", interp) == Int(3)
+        for call in ("fib(1.5)", "first(['a'])", "sign(-1.0)"):
+            error = interpret(f"{call}; {call}", interp)
+            assert isinstance(error, essentials.BLError)
+            assert error.value.class_ == essentials.IncorrectTypeException
+        # Arguments are checked at the call
+        error = interpret("\nfib(true)", interp)
+        assert isinstance(error, essentials.BLError)
+        assert error.meta is not None and error.meta.line == 2
+    for bad_src, line, column in [
+        ("fun f() {\n  x: Int = 1.5;\n}", 2, 12),
+        ("fun f(n: Integer) {}", 1, 10),
+        ("fun f(n: Int) { n: Float = 1.0; }", 1, 20),
+        ("fun f() -> String { return 1; }", 1, 28),
+        ("fun f(xs) { i: Int = 0; for i in xs {} }", 1, 25),
+    ]:
+        try:
+            interpret(bad_src)
+        except StaticError as e:
+            assert (e.meta.line, e.meta.column) == (line, column)
+        else:
+            assert False, bad_src